@@ -0,0 +1,105 @@
+"""
+Offline classification benchmark against the provider simulator
+
+Runs the full classification service (cascade, caches, single-flight, token
+budgets) with every provider answered by SimulatedProviderTransport, so no
+API keys are needed. Redis is used when reachable, like in production, and
+the in-memory cache backend otherwise or with --memory-cache.
+
+    python benchmarks/bench_classification.py --columns 200 --uploads 1 5 20
+    python benchmarks/bench_classification.py --memory-cache
+    SIMULATOR_ERROR_RATE=0.2 python benchmarks/bench_classification.py --lean
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("MOCK_AI_RESPONSES", "true")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prometheus_client import REGISTRY  # noqa: E402
+
+from core.cache import CacheManager  # noqa: E402
+from core.config import settings  # noqa: E402
+from services.classification_service import EnhancedClassificationService, ClassificationOptions  # noqa: E402
+
+COLUMN_TEMPLATES = [
+    ("national_id", lambda r: str(r.choice([1, 2])) + "".join(r.choices("0123456789", k=9))),
+    ("email", lambda r: f"user{r.randint(1, 99999)}@example.com"),
+    ("mobile", lambda r: "05" + "".join(r.choices("0123456789", k=8))),
+    ("full_name", lambda r: r.choice(["Ahmed", "Sara", "Omar", "Lina"]) + " " + r.choice(["Ali", "Saleh", "Nasser"])),
+    ("salary", lambda r: str(r.randint(4000, 40000))),
+    ("diagnosis", lambda r: r.choice(["J45", "E11", "I10", "K21"])),
+    ("order_status", lambda r: r.choice(["new", "shipped", "returned"])),
+]
+
+def make_upload(columns, seed):
+    """Synthetic upload; names repeat across uploads so caches and coalescing get exercised"""
+    rng = random.Random(seed)
+    data = {}
+    for i in range(columns):
+        name, generate = COLUMN_TEMPLATES[i % len(COLUMN_TEMPLATES)]
+        data[f"{name}_{i // len(COLUMN_TEMPLATES)}"] = [generate(rng) for _ in range(20)]
+    return data
+
+def tier_counts():
+    counts = {}
+    for metric in REGISTRY.collect():
+        if metric.name == "classification_tier_decisions":
+            for sample in metric.samples:
+                if sample.name.endswith("_total"):
+                    counts[sample.labels["tier"]] = sample.value
+    return counts
+
+async def run_level(service, uploads, columns, options):
+    before = tier_counts()
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        service.classify_columns_enhanced(make_upload(columns, seed), {}, f"bench-user-{seed}", options)
+        for seed in range(uploads)
+    ])
+    elapsed = time.perf_counter() - started
+    after = tier_counts()
+    return elapsed, {tier: int(after[tier] - before.get(tier, 0)) for tier in after if after[tier] != before.get(tier, 0)}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--columns", type=int, default=100, help="columns per upload")
+    parser.add_argument("--uploads", type=int, nargs="+", default=[1, 5, 20], help="concurrent uploads per level")
+    parser.add_argument("--lean", action="store_true", help="disable explanation, risk scoring and recommendations")
+    parser.add_argument("--flush", action="store_true", help="clear the cache before each level")
+    parser.add_argument("--memory-cache", action="store_true", help="use the in-process cache backend")
+    args = parser.parse_args()
+
+    if args.memory_cache:
+        settings.CACHE_BACKEND = "memory"
+
+    cache_manager = CacheManager()
+    await cache_manager.initialize()
+    options = ClassificationOptions(
+        enable_ml_enhancement=False,
+        enable_explanation=not args.lean,
+        enable_risk_scoring=not args.lean,
+        enable_recommendations=not args.lean
+    )
+
+    async with EnhancedClassificationService(cache_manager) as service:
+        print(f"{'uploads':>8} {'columns':>8} {'seconds':>8} {'cols/s':>8}  decisions by tier")
+        for uploads in args.uploads:
+            if args.flush:
+                await cache_manager.delete_pattern("classification:*")
+            elapsed, decisions = await run_level(service, uploads, args.columns, options)
+            total = uploads * args.columns
+            print(f"{uploads:>8} {total:>8} {elapsed:>8.2f} {total / elapsed:>8.1f}  {decisions}")
+
+        print(f"simulator: {service.simulator.stats}")
+        print(f"single-flight: {service.singleflight.stats}")
+        print(f"cache: {cache_manager.get_stats()}")
+
+    await cache_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Column profiler benchmark on a synthetic wide table
+
+Builds a table of mixed column types (IDs, emails, phones, amounts, dates,
+categories, free text) and profiles every column, sequentially and
+column-parallel. Columns of the same kind share buffers to keep memory low;
+each column is still profiled in full.
+
+    python benchmarks/bench_profiler.py
+    python benchmarks/bench_profiler.py --rows 100000 --columns 50 --workers 1 8
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_processing import TextProcessor  # noqa: E402
+
+def with_nulls(array, rng, rate=0.02):
+    return pa.array(array, mask=rng.random(len(array)) < rate)
+
+def make_columns(rows, seed):
+    """One array per column kind"""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(1_000_000_000, 2_999_999_999, rows)
+    return {
+        "national_id": with_nulls(ids.astype(str), rng),
+        "email": with_nulls(np.char.add(np.char.add("user", ids.astype(str)), "@example.com"), rng),
+        "mobile": with_nulls(np.char.add("05", rng.integers(10_000_000, 99_999_999, rows).astype(str)), rng),
+        "amount": with_nulls(np.round(rng.lognormal(8, 1, rows), 2), rng),
+        "quantity": pa.array(rng.integers(0, 1000, rows)),
+        "created": with_nulls(np.datetime_as_string(
+            np.datetime64("2020-01-01") + rng.integers(0, 1500, rows).astype("timedelta64[D]")
+        ), rng),
+        "status": with_nulls(rng.choice(["new", "active", "closed", "suspended"], rows), rng),
+        "notes": with_nulls(rng.choice([
+            "customer asked for a callback regarding the last invoice",
+            "ملاحظة: تم التواصل مع العميل",
+            "no further action required"
+        ], rows), rng, rate=0.3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    kinds = make_columns(args.rows, args.seed)
+    names = list(kinds)
+    table = pa.table({
+        f"{names[i % len(names)]}_{i // len(names)}": kinds[names[i % len(names)]]
+        for i in range(args.columns)
+    })
+    print(f"built {args.rows:,} x {args.columns} table in {time.perf_counter() - started:.1f}s "
+          f"({table.nbytes / 2**20:,.0f} MiB logical)")
+
+    print(f"{'workers':>8} {'seconds':>8} {'cells/s':>14}")
+    for workers in args.workers:
+        processor = TextProcessor(max_workers=workers)
+        started = time.perf_counter()
+        profiles = processor.profile_table(table)
+        elapsed = time.perf_counter() - started
+        print(f"{workers:>8} {elapsed:>8.2f} {args.rows * args.columns / elapsed:>14,.0f}")
+
+    print(f"types: {dict(Counter(profile['data_type'] for profile in profiles.values()))}")
+    for name in names:
+        profile = profiles[f"{name}_0"]
+        print(f"  {name:<12} {profile['data_type']:<12} quality={profile['quality_score']:.3f} "
+              f"{profile['statistics']}")
+
+if __name__ == "__main__":
+    main()
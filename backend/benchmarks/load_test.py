@@ -0,0 +1,91 @@
+"""
+Load test comparing API throughput across concurrency levels
+
+Run against a live server, optionally a second one for comparison
+(e.g. a build still on the sync session):
+
+    python benchmarks/load_test.py --token $TOKEN
+    python benchmarks/load_test.py --token $TOKEN --compare-url http://localhost:8001
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_ENDPOINTS = ["/dashboard/stats?time_range=7d", "/info"]
+DEFAULT_CONCURRENCY = [1, 10, 50, 100]
+
+async def run_level(base_url, endpoint, token, concurrency, requests_per_worker):
+    """Fire concurrency x requests_per_worker requests and collect latencies"""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    latencies = []
+    errors = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal errors
+            for _ in range(requests_per_worker):
+                start = time.perf_counter()
+                try:
+                    response = await client.get(endpoint)
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+async def sweep(base_url, endpoint, token, levels, requests_per_worker):
+    results = []
+    for concurrency in levels:
+        results.append(await run_level(base_url, endpoint, token, concurrency, requests_per_worker))
+    return results
+
+def print_results(endpoint, runs):
+    print(f"\n📊 {endpoint}")
+    header = f"{'server':<28}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for base_url, results in runs:
+        for r in results:
+            print(
+                f"{base_url:<28}{r['concurrency']:>6}{r['throughput']:>10.1f}"
+                f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['errors']:>8}"
+            )
+
+async def main(args):
+    servers = [args.url] + ([args.compare_url] if args.compare_url else [])
+    for endpoint in args.endpoints:
+        runs = []
+        for base_url in servers:
+            runs.append((base_url, await sweep(base_url, endpoint, args.token, args.concurrency, args.requests)))
+        print_results(endpoint, runs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API throughput under concurrency")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--compare-url", default=None, help="second server to run the same sweep against")
+    parser.add_argument("--token", default=None, help="bearer token for authenticated endpoints")
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrent worker")
+
+    print("🧪 Running load test...")
+    asyncio.run(main(parser.parse_args()))
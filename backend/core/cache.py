@@ -3,38 +3,74 @@ Enhanced caching system with Redis backend and intelligent caching strategies
 """
 
 import json
+import math
 import pickle
+import random
 import asyncio
 import logging
-from typing import Any, Optional, Dict, List, Union
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Union
 from datetime import datetime, timedelta
 import redis.asyncio as redis
 from redis.asyncio import ConnectionPool
 
 from core.config import settings
+from core.memory_cache import MemoryCacheBackend
+from core.metrics import CACHE_OPERATIONS, CACHE_OPERATION_DURATION, CACHE_VALUE_BYTES
 
 logger = logging.getLogger(__name__)
 
+def cache_namespace(key: str) -> str:
+    """Metrics label for a key: its prefix up to the first colon, e.g. 'classification'"""
+    return key.split(":", 1)[0] if ":" in key else "other"
+
 class CacheManager:
-    """Enhanced cache manager with Redis backend and intelligent caching"""
+    """Enhanced cache manager with Redis backend and intelligent caching
+    
+    redis_client is the active backend: a redis.asyncio.Redis, or a
+    MemoryCacheBackend implementing the same calls. The in-memory backend is used
+    when CACHE_BACKEND is "memory", and in degraded mode while Redis is
+    unreachable, until a background monitor reattaches Redis.
+    """
     
     def __init__(self):
         self.redis_pool = None
         self.redis_client = None
+        self._redis = None  # the Redis client, kept while degraded so it can be reattached
+        self._monitor_task: Optional[asyncio.Task] = None
+        self.degraded = False
         self.default_ttl = settings.CACHE_TTL
         self.max_size = settings.CACHE_MAX_SIZE
         
+        # Cold misses of get_or_compute are coalesced per key
+        from core.singleflight import SingleFlight
+        self.singleflight = SingleFlight(self)
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        
+        # Concurrent single-key gets and sets share Redis round-trips
+        from core.cache_batcher import CacheBatcher
+        self.batcher = CacheBatcher(self) if settings.ENABLE_CACHE_BATCHING else None
+        
         # Cache statistics
         self.stats = {
             "hits": 0,
             "misses": 0,
             "sets": 0,
             "deletes": 0,
-            "errors": 0
+            "errors": 0,
+            "stale_hits": 0,
+            "early_refreshes": 0,
+            "refreshes": 0
         }
     
     async def initialize(self):
         """Initialize Redis connection pool"""
+        if settings.CACHE_BACKEND == "memory":
+            self.redis_client = MemoryCacheBackend()
+            logger.info("In-memory cache initialized")
+            return
+        
         try:
             self.redis_pool = ConnectionPool.from_url(
                 settings.get_redis_url(),
@@ -45,7 +81,8 @@ class CacheManager:
                 health_check_interval=30
             )
             
-            self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+            self._redis = redis.Redis(connection_pool=self.redis_pool)
+            self.redis_client = self._redis
             
             # Test connection
             await self.redis_client.ping()
@@ -54,26 +91,70 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Failed to initialize Redis cache: {str(e)}")
             self.redis_client = None
+            if settings.CACHE_MEMORY_FALLBACK:
+                self._enter_degraded_mode()
+        
+        if self._redis is not None and settings.CACHE_MEMORY_FALLBACK:
+            self._monitor_task = asyncio.create_task(self._monitor_redis())
+    
+    @property
+    def in_memory(self) -> bool:
+        return isinstance(self.redis_client, MemoryCacheBackend)
+    
+    def _enter_degraded_mode(self):
+        """Serve from a process-local cache instead of missing on every call"""
+        self.degraded = True
+        self.redis_client = MemoryCacheBackend()
+        logger.warning("Redis unavailable, cache running in degraded in-memory mode")
+    
+    async def _monitor_redis(self):
+        """Switch to the in-memory backend when Redis stops answering and back once it recovers"""
+        while True:
+            await asyncio.sleep(settings.CACHE_REATTACH_INTERVAL)
+            try:
+                await asyncio.wait_for(self._redis.ping(), timeout=settings.CACHE_REATTACH_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.degraded:
+                    logger.error(f"Redis health check failed: {str(e)}")
+                    self._enter_degraded_mode()
+                continue
+            
+            if self.degraded:
+                # Entries written while degraded are dropped: Redis is the source of truth again
+                self.redis_client = self._redis
+                self.degraded = False
+                logger.info("Redis reachable again, cache reattached")
     
     async def get(self, key: str, default: Any = None) -> Any:
         """Get value from cache with automatic deserialization"""
+        started = time.perf_counter()
         try:
             if not self.redis_client:
                 return default
             
+            if self.batcher is not None and not self.in_memory:
+                return await self.batcher.get(key, default)
+            
             value = await self.redis_client.get(self._format_key(key))
             
             if value is None:
                 self.stats["misses"] += 1
+                self._count(key, "get", "miss")
                 return default
             
             self.stats["hits"] += 1
+            self._count(key, "get", "hit", size=len(value))
             return self._deserialize(value)
             
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {str(e)}")
             self.stats["errors"] += 1
+            self._count(key, "get", "error")
             return default
+        finally:
+            self._time(key, "get", started)
     
     async def set(
         self, 
@@ -83,12 +164,16 @@ class CacheManager:
         nx: bool = False
     ) -> bool:
         """Set value in cache with automatic serialization"""
+        started = time.perf_counter()
         try:
             if not self.redis_client:
                 return False
             
-            serialized_value = self._serialize(value)
             ttl = expire or self.default_ttl
+            if self.batcher is not None and not self.in_memory:
+                return await self.batcher.set(key, value, ttl, nx=nx)
+            
+            serialized_value = self._serialize(value)
             
             result = await self.redis_client.set(
                 self._format_key(key),
@@ -99,16 +184,21 @@ class CacheManager:
             
             if result:
                 self.stats["sets"] += 1
+            self._count(key, "set", "ok" if result else "not_set", size=len(serialized_value))
             
             return bool(result)
             
         except Exception as e:
             logger.error(f"Cache set error for key {key}: {str(e)}")
             self.stats["errors"] += 1
+            self._count(key, "set", "error")
             return False
+        finally:
+            self._time(key, "set", started)
     
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        started = time.perf_counter()
         try:
             if not self.redis_client:
                 return False
@@ -117,13 +207,17 @@ class CacheManager:
             
             if result:
                 self.stats["deletes"] += 1
+            self._count(key, "delete", "deleted" if result else "absent")
             
             return bool(result)
             
         except Exception as e:
             logger.error(f"Cache delete error for key {key}: {str(e)}")
             self.stats["errors"] += 1
+            self._count(key, "delete", "error")
             return False
+        finally:
+            self._time(key, "delete", started)
     
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
@@ -175,6 +269,7 @@ class CacheManager:
     
     async def get_many(self, keys: List[str]) -> Dict[str, Any]:
         """Get multiple values from cache"""
+        started = time.perf_counter()
         try:
             if not self.redis_client or not keys:
                 return {}
@@ -187,18 +282,25 @@ class CacheManager:
                 if value is not None:
                     result[original_key] = self._deserialize(value)
                     self.stats["hits"] += 1
+                    self._count(original_key, "get_many", "hit", size=len(value))
                 else:
                     self.stats["misses"] += 1
+                    self._count(original_key, "get_many", "miss")
             
             return result
             
         except Exception as e:
             logger.error(f"Cache get_many error: {str(e)}")
             self.stats["errors"] += 1
+            for key in keys:
+                self._count(key, "get_many", "error")
             return {}
+        finally:
+            self._time_many(keys, "get_many", started)
     
     async def set_many(self, mapping: Dict[str, Any], expire: Optional[int] = None) -> bool:
         """Set multiple values in cache"""
+        started = time.perf_counter()
         try:
             if not self.redis_client or not mapping:
                 return False
@@ -206,12 +308,16 @@ class CacheManager:
             pipe = self.redis_client.pipeline()
             ttl = expire or self.default_ttl
             
+            sizes = []
             for key, value in mapping.items():
                 serialized_value = self._serialize(value)
+                sizes.append(len(serialized_value))
                 pipe.set(self._format_key(key), serialized_value, ex=ttl)
             
             results = await pipe.execute()
             success_count = sum(1 for result in results if result)
+            for key, size, result in zip(mapping, sizes, results):
+                self._count(key, "set_many", "ok" if result else "not_set", size=size)
             
             self.stats["sets"] += success_count
             return success_count == len(mapping)
@@ -219,7 +325,11 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Cache set_many error: {str(e)}")
             self.stats["errors"] += 1
+            for key in mapping:
+                self._count(key, "set_many", "error")
             return False
+        finally:
+            self._time_many(list(mapping), "set_many", started)
     
     async def delete_pattern(self, pattern: str) -> int:
         """Delete all keys matching pattern"""
@@ -233,6 +343,7 @@ class CacheManager:
             
             deleted = await self.redis_client.delete(*keys)
             self.stats["deletes"] += deleted
+            self._count(pattern, "delete_pattern", "deleted")
             
             return deleted
             
@@ -256,6 +367,128 @@ class CacheManager:
             self.stats["errors"] += 1
             return False
     
+    # Stampede-protected computed entries
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        beta: Optional[float] = None
+    ) -> Any:
+        """Cached result of compute(), without a thundering herd when it expires
+        
+        Entries record when they stop being fresh and how long they took to compute.
+        A fresh entry is refreshed early, in the background, with XFetch probability
+        (now + beta * delta * -ln(rand) past the deadline), so hot keys are usually
+        recomputed before they expire. An expired entry is still served for
+        stale_ttl seconds while a single worker recomputes it under a per-key lock.
+        Only a cold miss waits, and concurrent cold misses share one computation.
+        """
+        expire = expire or self.default_ttl
+        stale_ttl = settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        beta = settings.CACHE_XFETCH_BETA if beta is None else beta
+        started = time.perf_counter()
+        
+        entry = await self._get_entry(key)
+        if entry is not None:
+            now = time.time()
+            if now >= entry["fresh_until"]:
+                self.stats["stale_hits"] += 1
+                self._count(key, "get_or_compute", "stale")
+                self._refresh_in_background(key, compute, expire, stale_ttl)
+            elif now - beta * entry["delta"] * math.log(1.0 - random.random()) >= entry["fresh_until"]:
+                self.stats["early_refreshes"] += 1
+                self._count(key, "get_or_compute", "early_refresh")
+                self._refresh_in_background(key, compute, expire, stale_ttl)
+            else:
+                self._count(key, "get_or_compute", "fresh")
+            self._time(key, "get_or_compute", started)
+            return entry["value"]
+        
+        try:
+            return await self.singleflight.do(
+                key,
+                lambda: self._compute_entry(key, compute, expire, stale_ttl),
+                lambda: self._peek_entry(key)
+            )
+        finally:
+            self._count(key, "get_or_compute", "computed")
+            self._time(key, "get_or_compute", started)
+    
+    async def prime(
+        self,
+        key: str,
+        value: Any,
+        expire: Optional[int] = None,
+        stale_ttl: Optional[int] = None
+    ) -> bool:
+        """Store a value for get_or_compute unless the key already has one"""
+        expire = expire or self.default_ttl
+        stale_ttl = settings.CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        entry = {"value": value, "fresh_until": time.time() + expire, "delta": 0.0}
+        return await self.set(key, entry, expire=expire + stale_ttl, nx=True)
+    
+    async def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = await self.get(key)
+        return entry if isinstance(entry, dict) and "fresh_until" in entry and "value" in entry else None
+    
+    async def _peek_entry(self, key: str) -> Any:
+        entry = await self._get_entry(key)
+        return entry["value"] if entry is not None else None
+    
+    async def _compute_entry(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: int,
+        stale_ttl: int
+    ) -> Any:
+        started = time.monotonic()
+        value = await compute()
+        entry = {"value": value, "fresh_until": time.time() + expire, "delta": time.monotonic() - started}
+        await self.set(key, entry, expire=expire + stale_ttl)  # kept past freshness to be served stale
+        return value
+    
+    def _refresh_in_background(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: int,
+        stale_ttl: int
+    ) -> None:
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(key, compute, expire, stale_ttl))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+    
+    async def _refresh(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        expire: int,
+        stale_ttl: int
+    ) -> None:
+        """Recompute an entry unless another worker holds its refresh lock"""
+        lock_key = f"refresh_lock:{key}"
+        token = str(uuid.uuid4())
+        if self.redis_client and not await self.set(lock_key, token, expire=settings.CACHE_REFRESH_LOCK_TTL, nx=True):
+            self._count(key, "refresh", "locked")
+            return
+        
+        try:
+            await self._compute_entry(key, compute, expire, stale_ttl)
+            self.stats["refreshes"] += 1
+            self._count(key, "refresh", "ok")
+        except Exception as e:
+            logger.warning(f"Background refresh failed for key {key}: {str(e)}")
+            self.stats["errors"] += 1
+            self._count(key, "refresh", "error")
+        finally:
+            if self.redis_client and await self.get(lock_key) == token:
+                await self.delete(lock_key)
+    
     # User-specific caching methods
     async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get cached user data"""
@@ -314,13 +547,16 @@ class CacheManager:
             
             if current is None:
                 await self.redis_client.setex(self._format_key(key), window, 1)
+                self._count(key, "rate_limit", "allowed")
                 return False
             
             current_count = int(current)
             if current_count >= limit:
+                self._count(key, "rate_limit", "limited")
                 return True
             
             await self.redis_client.incr(self._format_key(key))
+            self._count(key, "rate_limit", "allowed")
             return False
             
         except Exception as e:
@@ -376,7 +612,8 @@ class CacheManager:
             info = await self.redis_client.info()
             
             return {
-                "status": "healthy",
+                "status": "degraded" if self.degraded else "healthy",
+                "backend": "memory" if self.in_memory else "redis",
                 "response_time": response_time,
                 "connected_clients": info.get("connected_clients", 0),
                 "used_memory": info.get("used_memory_human", "unknown"),
@@ -398,9 +635,26 @@ class CacheManager:
         return {
             **self.stats,
             "hit_rate": round(hit_rate, 2),
-            "total_requests": total_requests
+            "total_requests": total_requests,
+            "backend": "memory" if self.in_memory else "redis",
+            "degraded": self.degraded,
+            "batching": dict(self.batcher.stats) if self.batcher is not None else None
         }
     
+    # Prometheus metrics, labelled by key namespace
+    def _count(self, key: str, operation: str, result: str, size: Optional[int] = None):
+        namespace = cache_namespace(key)
+        CACHE_OPERATIONS.labels(namespace, operation, result).inc()
+        if size is not None:
+            CACHE_VALUE_BYTES.labels(namespace, operation).observe(size)
+    
+    def _time(self, key: str, operation: str, started: float):
+        CACHE_OPERATION_DURATION.labels(cache_namespace(key), operation).observe(time.perf_counter() - started)
+    
+    def _time_many(self, keys: List[str], operation: str, started: float):
+        for namespace in {cache_namespace(key) for key in keys}:
+            CACHE_OPERATION_DURATION.labels(namespace, operation).observe(time.perf_counter() - started)
+    
     def _format_key(self, key: str) -> str:
         """Format cache key with prefix"""
         return f"{settings.APP_NAME}:{key}"
@@ -429,9 +683,16 @@ class CacheManager:
     
     async def close(self):
         """Close Redis connections"""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        if self.batcher is not None:
+            await self.batcher.flush()
+        
         try:
-            if self.redis_client:
-                await self.redis_client.close()
+            if self._redis is not None:
+                await self._redis.close()
             if self.redis_pool:
                 await self.redis_pool.disconnect()
             logger.info("Redis cache connections closed")
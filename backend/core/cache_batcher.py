@@ -0,0 +1,160 @@
+"""
+Automatic micro-batching of concurrent cache reads and writes
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CacheBatcher:
+    """Coalesces get/set calls made within one batching window into single Redis round-trips
+
+    Callers keep calling CacheManager.get and CacheManager.set one key at a time.
+    Everything queued in the same window goes out as one pipeline: the SETs in
+    call order, then a single MGET of the keys read (duplicates are read once),
+    so a read sees writes queued alongside it. The first queued call
+    schedules a flush at the end of the current loop tick, or after
+    CACHE_BATCH_WINDOW_MS; a batch that reaches CACHE_BATCH_MAX_SIZE is sent at once.
+    """
+
+    def __init__(self, cache_manager, window_ms: Optional[float] = None, max_size: Optional[int] = None):
+        self.cache_manager = cache_manager
+        self.window = (settings.CACHE_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_size = max_size or settings.CACHE_BATCH_MAX_SIZE
+        self._gets: Dict[str, List[asyncio.Future]] = {}
+        self._get_count = 0
+        self._sets: List[Tuple[str, Any, int, bool, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._flushes: set = set()
+        self.stats = {"gets": 0, "sets": 0, "mgets": 0, "pipelines": 0, "round_trips_saved": 0}
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._gets.setdefault(key, []).append(future)
+        self._get_count += 1
+        self._schedule_flush()
+        value = await future
+        return default if value is None else value
+
+    async def set(self, key: str, value: Any, ttl: int, nx: bool = False) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self._sets.append((key, value, ttl, nx, future))
+        self._schedule_flush()
+        return await future
+
+    def _schedule_flush(self) -> None:
+        if self._get_count + len(self._sets) >= self.max_size:
+            self._flush_now()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.window > 0:
+                self._flush_handle = loop.call_later(self.window, self._flush_now)
+            else:
+                self._flush_handle = loop.call_soon(self._flush_now)
+
+    def _flush_now(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        gets, self._gets, self._get_count = self._gets, {}, 0
+        sets, self._sets = self._sets, []
+
+        task = asyncio.get_running_loop().create_task(self._send(gets, sets))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self) -> None:
+        """Send anything queued and wait for every batch in flight"""
+        if self._get_count or self._sets:
+            self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _send(self, gets: Dict[str, List[asyncio.Future]], sets: List[Tuple]) -> None:
+        try:
+            await self._flush(gets, sets)
+        finally:
+            # Never leave a caller waiting, even if the flush itself was cancelled
+            for futures in gets.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_result(None)
+            for *_, future in sets:
+                if not future.done():
+                    future.set_result(False)
+
+    async def _flush(self, gets: Dict[str, List[asyncio.Future]], sets: List[Tuple]) -> None:
+        """One pipeline per window: the SETs in call order, then one MGET of every key read"""
+        cache = self.cache_manager
+        get_calls = sum(len(futures) for futures in gets.values())
+        self.stats["gets"] += get_calls
+        self.stats["sets"] += len(sets)
+        self.stats["mgets"] += 1 if gets else 0
+        self.stats["pipelines"] += 1
+        self.stats["round_trips_saved"] += get_calls + len(sets) - 1
+
+        queued = []
+        pipe = cache.redis_client.pipeline(transaction=False)
+        for key, value, ttl, nx, future in sets:
+            try:
+                serialized = cache._serialize(value)
+                pipe.set(cache._format_key(key), serialized, ex=ttl, nx=nx)
+                queued.append((key, future, len(serialized)))
+            except Exception as e:
+                logger.error(f"Cache set error for key {key}: {str(e)}")
+                cache.stats["errors"] += 1
+                cache._count(key, "set", "error")
+                if not future.done():
+                    future.set_result(False)
+        keys = list(gets)
+        if keys:
+            pipe.mget([cache._format_key(key) for key in keys])
+
+        try:
+            results = await pipe.execute(raise_on_error=False) if queued or keys else []
+        except Exception as e:
+            logger.error(f"Cache batch error for {len(queued)} sets and {len(keys)} gets: {str(e)}")
+            results = [e] * (len(queued) + (1 if keys else 0))
+
+        for (key, future, size), result in zip(queued, results):
+            if isinstance(result, Exception):
+                logger.error(f"Cache set error for key {key}: {str(result)}")
+                cache.stats["errors"] += 1
+                cache._count(key, "set", "error")
+                result = False
+            else:
+                if result:
+                    cache.stats["sets"] += 1
+                cache._count(key, "set", "ok" if result else "not_set", size=size)
+            if not future.done():
+                future.set_result(bool(result))
+
+        if not keys:
+            return
+        values = results[len(queued)]
+        failed = isinstance(values, Exception)
+        if failed:
+            logger.error(f"Cache batched get error for {len(keys)} keys: {str(values)}")
+            values = [None] * len(keys)
+
+        for key, raw in zip(keys, values):
+            value, result = None, "error" if failed else "miss"
+            if raw is not None:
+                try:
+                    value, result = cache._deserialize(raw), "hit"
+                except Exception as e:
+                    logger.error(f"Cache get error for key {key}: {str(e)}")
+                    result = "error"
+            for future in gets[key]:
+                if result == "hit":
+                    cache.stats["hits"] += 1
+                    cache._count(key, "get", result, size=len(raw))
+                else:
+                    cache.stats["errors" if result == "error" else "misses"] += 1
+                    cache._count(key, "get", result)
+                if not future.done():
+                    future.set_result(value)
@@ -0,0 +1,43 @@
+"""
+Celery application for background classification jobs
+"""
+
+from celery import Celery
+from celery.schedules import crontab
+
+from core.config import settings
+
+celery = Celery(
+    "data_classifier",
+    broker=settings.CELERY_BROKER_URL,
+    backend=settings.CELERY_RESULT_BACKEND
+)
+
+celery.conf.update(
+    task_default_queue=settings.JOB_QUEUE_NAME,
+    task_time_limit=settings.CELERY_TASK_TIMEOUT,
+    # Jobs are long-running; only hand a worker the next job once it is free
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+    task_track_started=True,
+    result_expires=settings.JOB_RESULT_TTL,
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    timezone=settings.TIMEZONE
+)
+
+if settings.ENABLE_SCHEDULED_TASKS:
+    minute, hour, day_of_month, month_of_year, day_of_week = settings.BATCH_RESCAN_SCHEDULE.split()
+    celery.conf.beat_schedule = {
+        "nightly-catalog-rescan": {
+            "task": "classification.nightly_catalog_rescan",
+            "schedule": crontab(
+                minute=minute,
+                hour=hour,
+                day_of_month=day_of_month,
+                month_of_year=month_of_year,
+                day_of_week=day_of_week
+            )
+        }
+    }
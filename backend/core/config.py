@@ -37,6 +37,7 @@ class Settings(BaseSettings):
     DATABASE_MAX_OVERFLOW: int = 30
     DATABASE_POOL_TIMEOUT: int = 30
     DATABASE_POOL_RECYCLE: int = 3600
+    BULK_INSERT_BATCH_SIZE: int = 1000  # rows per multi-row INSERT
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
@@ -66,6 +67,12 @@ class Settings(BaseSettings):
     AI_MAX_RETRIES: int = 3
     AI_RATE_LIMIT: int = 100  # requests per hour
     
+    # Prompt Token Budgets
+    PROMPT_MAX_VALUE_CHARS: int = 200  # per sample value
+    PROMPT_MAX_SAMPLES_CHARS: int = 2000  # all sample values of one column
+    UPLOAD_TOKEN_BUDGET: int = 2000000  # per upload, 0 disables
+    USER_DAILY_TOKEN_BUDGET: int = 20000000  # per user per UTC day, 0 disables
+    
     # File Processing
     MAX_FILE_SIZE: int = 500 * 1024 * 1024  # 500MB
     ALLOWED_FILE_TYPES: List[str] = [".xlsx", ".xls", ".csv", ".json", ".parquet"]
@@ -80,6 +87,34 @@ class Settings(BaseSettings):
     ENABLE_ML_ENHANCEMENT: bool = True
     ENABLE_PATTERN_LEARNING: bool = True
     AUTO_APPROVAL_THRESHOLD: float = 0.95
+    PATTERN_MIN_MATCH_FRACTION: float = 0.6  # share of non-empty values a pattern must match to be reported
+    SINGLEFLIGHT_LOCK_TTL: int = 120  # seconds a worker may hold an in-flight classification lock
+    SINGLEFLIGHT_WAIT_TIMEOUT: int = 90  # seconds other workers wait before computing themselves
+    SINGLEFLIGHT_POLL_INTERVAL: float = 0.25
+    # Tiers tried in order until one reaches CONFIDENCE_THRESHOLD:
+    # "rules", "local", or "<provider>[:<model>]" for remote providers
+    CLASSIFICATION_CASCADE: List[str] = [
+        "rules",
+        "local",
+        "openrouter:meta-llama/llama-3-70b",
+        "openrouter:anthropic/claude-3-opus"
+    ]
+    
+    # Classification Knowledge Base
+    KNOWLEDGE_BASE_URL: str = ""  # empty uses DATABASE_URL; sqlite:///./knowledge_base.db for local development
+    KNOWLEDGE_BASE_VERSION: int = 1  # bump to retire all unapproved entries, e.g. after a prompt change
+    KNOWLEDGE_BASE_MIN_CONFIDENCE: float = 0.9  # model decisions at or above this are remembered
+    KNOWLEDGE_BASE_HOT_SIZE: int = 10000  # entries each worker keeps in memory in front of the store
+    KNOWLEDGE_BASE_HOT_TTL: int = 300  # seconds; bounds how long another worker's approval can go unseen
+    
+    # Column Sketches
+    ENABLE_COLUMN_SKETCHES: bool = True  # full-file distinct counts, frequent values and quantiles on upload
+    SKETCH_CHUNK_ROWS: int = 65536
+    SKETCH_HLL_PRECISION: int = 12  # 4 KiB of registers, about 1.6% distinct-count error
+    SKETCH_CMS_WIDTH: int = 1024
+    SKETCH_CMS_DEPTH: int = 4
+    SKETCH_TOP_K: int = 10
+    SKETCH_TDIGEST_COMPRESSION: int = 100
     
     # Compliance & Regulations
     SUPPORTED_REGULATIONS: List[str] = ["NDMO", "PDPL", "GDPR", "NCA", "DAMA", "CCPA", "HIPAA", "SOX"]
@@ -93,7 +128,10 @@ class Settings(BaseSettings):
     ENABLE_METRICS: bool = True
     METRICS_PORT: int = 9090
     ENABLE_TRACING: bool = True
-    JAEGER_ENDPOINT: Optional[str] = None
+    JAEGER_ENDPOINT: Optional[str] = None  # OTLP/HTTP traces URL, e.g. http://jaeger:4318/v1/traces
+    TRACE_FILE_PATH: str = ""  # local development: spans are appended here when JAEGER_ENDPOINT is unset
+    TRACE_FILE_MAX_BYTES: int = 50 * 1024 * 1024  # the trace file is rotated to <path>.1 past this size
+    TRACE_SAMPLE_RATIO: float = 1.0  # share of traces recorded
     
     # Rate Limiting
     RATE_LIMIT_ENABLED: bool = True
@@ -106,6 +144,26 @@ class Settings(BaseSettings):
     CACHE_MAX_SIZE: int = 1000
     ENABLE_QUERY_CACHE: bool = True
     ENABLE_RESULT_CACHE: bool = True
+    CACHE_STALE_TTL: int = 300  # seconds an expired entry is still served while it is recomputed
+    CACHE_XFETCH_BETA: float = 1.0  # early-refresh eagerness; 0 disables probabilistic early refresh
+    CACHE_REFRESH_LOCK_TTL: int = 120  # seconds a worker may hold a background refresh lock
+    CACHE_BACKEND: str = "redis"  # redis, memory (in-process, for tests and benchmarks)
+    CACHE_MEMORY_FALLBACK: bool = True  # serve from an in-process cache while Redis is unreachable
+    CACHE_MEMORY_MAX_KEYS: int = 100000  # least recently used keys are evicted beyond this
+    CACHE_REATTACH_INTERVAL: int = 10  # seconds between Redis health probes
+    ENABLE_CACHE_BATCHING: bool = True  # coalesce concurrent get/set calls into MGET and pipelined SET
+    CACHE_BATCH_WINDOW_MS: float = 0.0  # extra wait for more calls; 0 flushes at the end of the current loop tick
+    CACHE_BATCH_MAX_SIZE: int = 256  # calls per round-trip; a full batch is sent at once
+    RULE_SET_CACHE_TTL: int = 300  # seconds a user's active custom rules are cached
+    RULE_PATTERN_CACHE_SIZE: int = 10000  # compiled rule patterns kept per process, one per (pattern, flags)
+    
+    # Cache Warming (at startup, for recently active users)
+    ENABLE_CACHE_WARMING: bool = True
+    CACHE_WARM_READY_TIMEOUT: float = 5.0  # seconds startup waits; warming then continues in the background
+    CACHE_WARM_BUDGET: int = 60  # seconds after which unfinished warming is abandoned
+    CACHE_WARM_ACTIVE_DAYS: int = 7  # users who logged in within this many days are warmed
+    CACHE_WARM_MAX_USERS: int = 500
+    CACHE_WARM_MAX_FINGERPRINTS: int = 5000  # most-hit knowledge base entries loaded into each worker
     
     # Background Tasks
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
@@ -113,6 +171,29 @@ class Settings(BaseSettings):
     CELERY_TASK_TIMEOUT: int = 3600
     ENABLE_SCHEDULED_TASKS: bool = True
     
+    # Classification Jobs
+    JOB_BACKEND: str = "celery"  # celery, local (in-process, for tests and development)
+    JOB_QUEUE_NAME: str = "classification"
+    JOB_MAX_RETRIES: int = 3
+    JOB_RETRY_BACKOFF: int = 5  # seconds, doubled on each retry
+    JOB_RESULT_TTL: int = 86400  # seconds
+    
+    # Provider Batch Mode (overnight catalog rescans)
+    BATCH_PROVIDER: str = "anthropic"  # anthropic, openai
+    BATCH_MODEL: str = "claude-3-sonnet-20240229"
+    BATCH_MAX_REQUESTS: int = 10000  # per submitted provider batch
+    BATCH_POLL_INTERVAL: int = 60  # seconds
+    BATCH_MAX_WAIT: int = 21600  # seconds before unfinished batches are cancelled
+    BATCH_PRICE_DISCOUNT: float = 0.5  # batch price as a fraction of the interactive price
+    BATCH_RESCAN_SCHEDULE: str = "0 1 * * *"  # cron: minute hour day month weekday
+    BATCH_RESCAN_INTERVAL_HOURS: int = 20  # minimum age of the last scan
+    BATCH_RESCAN_MAX_SOURCES: int = 500
+    
+    # Rule Reclassification (re-scoring history after custom rule changes)
+    ENABLE_RULE_RECLASSIFICATION: bool = True
+    RECLASSIFICATION_BATCH_SIZE: int = 500  # affected columns re-scored and committed per batch
+    RECLASSIFICATION_CONCURRENCY: int = 4  # data sources classified in parallel within a batch
+    
     # Notifications
     SMTP_HOST: Optional[str] = None
     SMTP_PORT: int = 587
@@ -173,6 +254,10 @@ class Settings(BaseSettings):
     # Data Retention
     AUDIT_LOG_RETENTION_DAYS: int = 2555  # 7 years
     CLASSIFICATION_RESULT_RETENTION_DAYS: int = 2555
+    CLASSIFICATION_RESULTS_PARTITIONED: bool = False  # monthly range partitions, see migration 0002
+    PARTITION_PRECREATE_MONTHS: int = 3
+    RETENTION_PURGE_INTERVAL: int = 86400  # seconds
+    RETENTION_DELETE_BATCH_SIZE: int = 10000
     TEMP_FILE_RETENTION_HOURS: int = 24
     SESSION_RETENTION_DAYS: int = 30
     
@@ -186,6 +271,15 @@ class Settings(BaseSettings):
     MODEL_TRAINING_SCHEDULE: str = "0 3 * * 0"  # Weekly on Sunday at 3 AM
     MIN_TRAINING_SAMPLES: int = 1000
     MODEL_ACCURACY_THRESHOLD: float = 0.85
+    LOCAL_MODEL_PATH: str = "models/local_classifier.npz"
+    LOCAL_MODEL_HASH_DIM: int = 65536
+    
+    # Nearest-Neighbour Reuse
+    ENABLE_NEIGHBOUR_REUSE: bool = True  # close matches to approved columns skip the AI providers
+    NEIGHBOUR_INDEX_PATH: str = "models/neighbour_index.npz"
+    NEIGHBOUR_EMBEDDING_DIM: int = 256  # half for name features, half for value-shape features
+    NEIGHBOUR_NAME_WEIGHT: float = 0.5
+    NEIGHBOUR_MAX_DISTANCE: float = 0.15  # cosine distance
     
     # Data Quality
     ENABLE_DATA_QUALITY_CHECKS: bool = True
@@ -201,8 +295,17 @@ class Settings(BaseSettings):
     
     # Development & Testing
     ENABLE_TEST_MODE: bool = False
-    MOCK_AI_RESPONSES: bool = False
+    MOCK_AI_RESPONSES: bool = False  # with ENABLE_TEST_MODE, AI calls go to the provider simulator
     ENABLE_PROFILING: bool = False
+    SIMULATOR_LATENCY_DISTRIBUTION: str = "lognormal"  # lognormal, exponential, fixed
+    SIMULATOR_LATENCY_MEDIAN: float = 0.8  # seconds before the first output token
+    SIMULATOR_LATENCY_SIGMA: float = 0.5  # lognormal shape
+    SIMULATOR_SECONDS_PER_OUTPUT_TOKEN: float = 0.01
+    SIMULATOR_ERROR_RATE: float = 0.01
+    SIMULATOR_RATE_LIMIT_RATE: float = 0.02
+    SIMULATOR_MALFORMED_RATE: float = 0.01
+    SIMULATOR_SEED: Optional[int] = None
+    SIMULATOR_BATCH_LATENCY: float = 5.0  # seconds until a simulated batch ends
     
     class Config:
         env_file = ".env"
@@ -212,6 +315,13 @@ class Settings(BaseSettings):
         """Get database URL with proper encoding"""
         return self.DATABASE_URL
     
+    def get_async_database_url(self) -> str:
+        """Get database URL for the async driver"""
+        url = self.get_database_url()
+        if url.startswith("postgresql://") or url.startswith("postgres://"):
+            return "postgresql+asyncpg://" + url.split("://", 1)[1]
+        return url
+    
     def get_redis_url(self) -> str:
         """Get Redis URL with authentication"""
         if self.REDIS_PASSWORD:
@@ -0,0 +1,57 @@
+"""
+Database engines and session dependencies
+"""
+
+from typing import AsyncGenerator, Generator
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from core.config import settings
+
+# Shared pool options; pre-ping drops connections killed by the server,
+# LIFO reuse keeps a small hot set so idle overflow connections get recycled.
+_pool_options = {
+    "pool_size": settings.DATABASE_POOL_SIZE,
+    "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+    "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+    "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    "pool_pre_ping": True,
+    "pool_use_lifo": True,
+}
+
+# Sync engine, used by handlers not yet migrated; it gets a quarter of the
+# pool budget so the two engines together stay within the connection limit
+engine = create_engine(settings.get_database_url(), **{
+    **_pool_options,
+    "pool_size": max(2, settings.DATABASE_POOL_SIZE // 4),
+    "max_overflow": max(2, settings.DATABASE_MAX_OVERFLOW // 4),
+})
+SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+# Async engine (asyncpg) for request handlers
+async_engine = create_async_engine(settings.get_async_database_url(), **_pool_options)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # returned ORM objects stay usable after commit
+)
+
+def get_db() -> Generator[Session, None, None]:
+    """FastAPI dependency providing a sync session"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """FastAPI dependency providing an async session"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def close_async_engine() -> None:
+    """Dispose of async pool connections on shutdown"""
+    await async_engine.dispose()
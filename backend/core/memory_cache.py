@@ -0,0 +1,190 @@
+"""
+Bounded in-process cache backend with the subset of the Redis client API CacheManager uses
+"""
+
+import fnmatch
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from core.config import settings
+
+def _encode(value: Any) -> bytes:
+    # Redis stores every value as bytes; numbers are stored as their decimal string
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, bool):
+        value = int(value)
+    return str(value).encode("utf-8")
+
+class MemoryCacheBackend:
+    """Least-recently-used key/value store honouring TTLs, nx, counters, pipelines and patterns
+
+    Stands in for redis.asyncio.Redis when CACHE_BACKEND is "memory" (tests and
+    benchmarks) and while Redis is unreachable. Entries are private to the
+    process, so cross-worker guarantees (single-flight and refresh locks, rate
+    limits, token budgets) hold per worker only.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or settings.CACHE_MEMORY_MAX_KEYS
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self.evictions = 0
+
+    def _key(self, name: Union[str, bytes]) -> str:
+        return name.decode("utf-8") if isinstance(name, bytes) else name
+
+    def _live(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value: Any, ex: Optional[float] = None, keep_ttl: bool = False) -> None:
+        expires_at = time.monotonic() + ex if ex else None
+        if keep_ttl and key in self._data:
+            expires_at = self._data[key][1]
+        self._data[key] = (_encode(value), expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # Connection
+    async def ping(self) -> bool:
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    async def info(self) -> Dict[str, Any]:
+        used = sum(len(key) + len(value) for key, (value, _) in self._data.items())
+        return {
+            "connected_clients": 0,
+            "used_memory": used,
+            "used_memory_human": f"{used / 2**20:.2f}M",
+            "keys": len(self._data),
+            "max_keys": self.max_keys,
+            "evicted_keys": self.evictions
+        }
+
+    # Strings
+    async def get(self, name: str) -> Optional[bytes]:
+        entry = self._live(self._key(name))
+        return entry[0] if entry else None
+
+    async def mget(self, keys: List[str], *args: str) -> List[Optional[bytes]]:
+        names = ([keys] if isinstance(keys, (str, bytes)) else list(keys)) + list(args)
+        return [await self.get(name) for name in names]
+
+    async def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+        xx: bool = False
+    ) -> Optional[bool]:
+        key = self._key(name)
+        exists = self._live(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._store(key, value, ex if ex else (px / 1000 if px else None))
+        return True
+
+    async def setex(self, name: str, time_seconds: int, value: Any) -> bool:
+        return await self.set(name, value, ex=time_seconds)
+
+    async def incrby(self, name: str, amount: int = 1) -> int:
+        key = self._key(name)
+        entry = self._live(key)
+        try:
+            current = int(entry[0]) if entry else 0
+        except ValueError:
+            raise ValueError("value is not an integer or out of range")
+        self._store(key, current + amount, keep_ttl=True)
+        return current + amount
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        return await self.incrby(name, amount)
+
+    # Keys
+    async def delete(self, *names: str) -> int:
+        deleted = 0
+        for name in names:
+            if self._live(self._key(name)) is not None:
+                del self._data[self._key(name)]
+                deleted += 1
+        return deleted
+
+    async def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._live(self._key(name)) is not None)
+
+    async def expire(self, name: str, time_seconds: int) -> bool:
+        key = self._key(name)
+        entry = self._live(key)
+        if entry is None:
+            return False
+        self._data[key] = (entry[0], time.monotonic() + time_seconds)
+        return True
+
+    async def ttl(self, name: str) -> int:
+        entry = self._live(self._key(name))
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, round(entry[1] - time.monotonic()))
+
+    async def keys(self, pattern: str = "*") -> List[bytes]:
+        now = time.monotonic()
+        return [
+            key.encode("utf-8") for key, (_, expires_at) in list(self._data.items())
+            if (expires_at is None or expires_at > now) and fnmatch.fnmatchcase(key, pattern)
+        ]
+
+    async def flushdb(self) -> bool:
+        self._data.clear()
+        return True
+
+    def pipeline(self, transaction: bool = True) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+class MemoryPipeline:
+    """Queues commands and runs them in order on execute(), like a Redis pipeline"""
+
+    def __init__(self, backend: MemoryCacheBackend):
+        self.backend = backend
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, command: str):
+        if not hasattr(MemoryCacheBackend, command) or command.startswith("_") or command == "pipeline":
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs) -> "MemoryPipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        commands, self._commands = self._commands, []
+        results = []
+        for command, args, kwargs in commands:
+            try:
+                results.append(await getattr(self.backend, command)(*args, **kwargs))
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                results.append(e)
+        return results
+
+    async def __aenter__(self) -> "MemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._commands = []
@@ -0,0 +1,116 @@
+"""
+Prometheus metrics shared by services
+
+Under gunicorn every worker is a separate process. When PROMETHEUS_MULTIPROC_DIR
+is set, prometheus_client writes each worker's samples there and
+render_metrics() aggregates all of them.
+"""
+
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# HTTP requests, labelled by route template (/jobs/{job_id}) rather than raw path
+REQUEST_COUNT = Counter(
+    'http_requests_total',
+    'HTTP requests by method, route template and status code',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by method and route template',
+    ['method', 'endpoint'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress',
+    'HTTP requests currently being handled, summed over live workers',
+    ['method', 'endpoint'],
+    multiprocess_mode='livesum'
+)
+
+# Classification cascade
+CLASSIFICATION_TIER_DECISIONS = Counter(
+    'classification_tier_decisions_total',
+    'Columns whose classification was decided by each cascade tier',
+    ['tier']
+)
+CLASSIFICATION_TIER_ESCALATIONS = Counter(
+    'classification_tier_escalations_total',
+    'Columns escalated past a cascade tier because confidence was below threshold',
+    ['tier']
+)
+CLASSIFICATION_TIER_DURATION = Histogram(
+    'classification_tier_duration_seconds',
+    'Time spent in each cascade tier per column',
+    ['tier']
+)
+
+# AI provider usage
+AI_TOKENS = Counter(
+    'ai_tokens_total',
+    'Tokens sent to and generated by AI providers',
+    ['provider', 'model', 'direction']
+)
+AI_ESTIMATED_COST = Counter(
+    'ai_estimated_cost_usd_total',
+    'Estimated AI provider spend in USD',
+    ['provider', 'model']
+)
+PROMPT_VALUE_TRUNCATIONS = Counter(
+    'prompt_sample_truncations_total',
+    'Sample values truncated or dropped to fit prompt size limits'
+)
+TOKEN_BUDGET_REJECTIONS = Counter(
+    'token_budget_rejections_total',
+    'AI provider calls refused because a token budget was exhausted',
+    ['scope']
+)
+
+# Provider batch mode
+CLASSIFICATION_BATCH_ITEMS = Counter(
+    'classification_batch_items_total',
+    'Columns submitted through provider batch APIs, by outcome',
+    ['provider', 'outcome']
+)
+
+# Cache, labelled by key namespace (the prefix before the first colon)
+CACHE_OPERATIONS = Counter(
+    'cache_operations_total',
+    'Cache operations by key namespace, operation and outcome',
+    ['namespace', 'operation', 'result']
+)
+CACHE_OPERATION_DURATION = Histogram(
+    'cache_operation_duration_seconds',
+    'Cache operation latency as seen by callers, including batching waits',
+    ['namespace', 'operation'],
+    buckets=(0.0002, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0, 30.0)
+)
+CACHE_VALUE_BYTES = Histogram(
+    'cache_value_bytes',
+    'Serialized size of values written to and read from the cache',
+    ['namespace', 'operation'],
+    buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+)
+
+# Pipeline stages and provider calls (spans with the same names are in core.tracing)
+PIPELINE_STAGE_DURATION = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Time spent in each stage of the upload pipeline, by outcome',
+    ['pipeline', 'stage', 'outcome'],
+    buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+)
+AI_PROVIDER_CALL_DURATION = Histogram(
+    'ai_provider_call_duration_seconds',
+    'Latency of AI provider API calls, by outcome',
+    ['provider', 'model', 'outcome'],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+)
+
+def render_metrics() -> bytes:
+    """Exposition of this process's metrics, or of every worker's in multiprocess mode"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
@@ -9,12 +9,14 @@ from typing import Callable, Dict, Any
 from datetime import datetime, timedelta
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.routing import Match
 from starlette.responses import Response, JSONResponse
 from starlette.status import HTTP_429_TOO_MANY_REQUESTS, HTTP_403_FORBIDDEN
 import structlog
 
 from core.config import settings
 from core.cache import CacheManager
+from core.metrics import REQUEST_COUNT, REQUEST_DURATION, REQUESTS_IN_PROGRESS
 
 logger = structlog.get_logger()
 
@@ -202,13 +204,36 @@ class ErrorHandlingMiddleware(BaseHTTPMiddleware):
                 )
 
 class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
-    """Performance monitoring and metrics collection"""
+    """Performance monitoring and metrics collection
+    
+    Requests are labelled by route template, so /jobs/{job_id} is one series
+    however many jobs exist; paths matching no route share the "unmatched" label.
+    """
     
     def __init__(self, app):
         super().__init__(app)
         self.slow_request_threshold = 5.0  # seconds
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        if not settings.ENABLE_METRICS:
+            return await self._timed(request, call_next)
+        
+        method = request.method
+        endpoint = self._route_template(request)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method=method, endpoint=endpoint)
+        in_progress.inc()
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await self._timed(request, call_next)
+            status_code = response.status_code
+            return response
+        finally:
+            in_progress.dec()
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=status_code).inc()
+            REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(time.perf_counter() - start_time)
+    
+    async def _timed(self, request: Request, call_next: Callable) -> Response:
         start_time = time.time()
         
         response = await call_next(request)
@@ -225,17 +250,19 @@ class PerformanceMonitoringMiddleware(BaseHTTPMiddleware):
                 status_code=response.status_code
             )
         
-        # Update metrics (if Prometheus is enabled)
-        if settings.ENABLE_METRICS:
-            from main import REQUEST_COUNT, REQUEST_DURATION
-            REQUEST_COUNT.labels(
-                method=request.method,
-                endpoint=request.url.path,
-                status=response.status_code
-            ).inc()
-            REQUEST_DURATION.observe(duration)
-        
         return response
+    
+    @staticmethod
+    def _route_template(request: Request) -> str:
+        """Path template of the route serving the request; a wrong method still names the route"""
+        partial = None
+        for route in request.app.router.routes:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
 
 class CORSMiddleware(BaseHTTPMiddleware):
     """Enhanced CORS middleware with security considerations"""
@@ -2,7 +2,7 @@
 SQLAlchemy models for the AI Data Classification System
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Date, Boolean, Text, Float, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -35,6 +35,8 @@ class DataSource(Base):
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)  # file, database
     file_path = Column(String)
+    file_hash = Column(String)
+    file_size = Column(Integer)
     connection_string = Column(String)
     metadata = Column(JSON)
     user_id = Column(String, ForeignKey("users.id"))
@@ -44,6 +46,10 @@ class DataSource(Base):
     # Relationships
     user = relationship("User", back_populates="data_sources")
     classification_results = relationship("ClassificationResult", back_populates="data_source")
+    
+    __table_args__ = (
+        Index("ix_data_sources_user_created", "user_id", "created_at"),
+    )
 
 class ClassificationResult(Base):
     __tablename__ = "classification_results"
@@ -56,6 +62,11 @@ class ClassificationResult(Base):
     justification = Column(Text)
     confidence_score = Column(Float)
     sample_values = Column(JSON)
+    fingerprint = Column(String(64))  # utils.fingerprint.column_fingerprint of the name and plaintext samples
+    compliance_mapping = Column(JSON)
+    risk_score = Column(Float)
+    decided_by_tier = Column(String)  # cascade tier: rules, local, <provider>:<model>, fallback
+    neighbour = Column(JSON)  # approved column inherited from: result_id, column_name, distance
     is_approved = Column(Boolean, default=False)
     approved_by = Column(String)
     approved_at = Column(DateTime)
@@ -66,6 +77,49 @@ class ClassificationResult(Base):
     # Relationships
     data_source = relationship("DataSource", back_populates="classification_results")
     user = relationship("User", back_populates="classification_results")
+    
+    # Dashboard and search access paths (see migrations/versions/0001)
+    __table_args__ = (
+        Index("ix_classification_results_user_created", "user_id", "created_at"),
+        Index("ix_classification_results_user_level_created", "user_id", "classification_level", "created_at"),
+        Index("ix_classification_results_user_regulation_created", "user_id", "regulation", "created_at"),
+        Index("ix_classification_results_source_column", "data_source_id", "column_name"),
+    )
+
+class ClassificationKnowledge(Base):
+    """Durable fingerprint -> classification entries consulted before any AI provider call"""
+    __tablename__ = "classification_knowledge"
+    
+    fingerprint = Column(String(64), primary_key=True)  # utils.fingerprint.column_shape_fingerprint
+    kb_version = Column(String, primary_key=True)
+    classification_level = Column(String, nullable=False)
+    regulation = Column(String, nullable=False)
+    justification = Column(Text)
+    confidence_score = Column(Float)
+    risk_score = Column(Float)
+    patterns_detected = Column(JSON)
+    source = Column(String, nullable=False)  # approved, high_confidence
+    decided_by_tier = Column(String)
+    model_used = Column(String)
+    owner = Column(String, index=True)  # user the entry was classified for; their rule changes retire it
+    approved_by = Column(String)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_used_at = Column(DateTime)
+
+class DashboardStatsRollup(Base):
+    """Per user/day/level/regulation counters maintained as results are written"""
+    __tablename__ = "dashboard_stats_daily"
+    
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    classification_level = Column(String, primary_key=True)
+    regulation = Column(String, primary_key=True)
+    column_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+    risk_sum = Column(Float, nullable=False, default=0.0)
+    last_classified_at = Column(DateTime)
 
 class CustomRule(Base):
     __tablename__ = "custom_rules"
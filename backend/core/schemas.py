@@ -89,6 +89,8 @@ class ClassificationResultSchema(BaseModel):
     justification: str
     confidence_score: float
     sample_values: List[Any]
+    decided_by_tier: Optional[str] = None
+    neighbour: Optional[Dict[str, Any]] = None
 
 class ClassificationResponse(BaseModel):
     data_source_id: int
@@ -104,6 +106,14 @@ class CustomRuleCreate(BaseModel):
     regulation: Regulation
     description: Optional[str] = None
 
+class CustomRuleUpdate(BaseModel):
+    name: Optional[str] = None
+    pattern: Optional[str] = None
+    classification_level: Optional[ClassificationLevel] = None
+    regulation: Optional[Regulation] = None
+    description: Optional[str] = None
+    is_active: Optional[bool] = None
+
 class CustomRuleResponse(BaseModel):
     id: int
     name: str
@@ -126,6 +136,14 @@ class DashboardStats(BaseModel):
     classification_distribution: Dict[str, int]
     weekly_trend: List[Dict[str, Any]]
 
+class EnhancedDashboardStats(DashboardStats):
+    average_confidence: float
+    risk_assessment: Dict[str, Any]
+    trend_analysis: Dict[str, Any]
+    compliance_status: Optional[Dict[str, Any]] = None
+    real_time_alerts: List[Any] = []
+    recommendations: List[Any] = []
+
 # Access policy schemas
 class AccessPolicyCreate(BaseModel):
     classification_result_id: int
@@ -140,3 +158,53 @@ class AccessPolicyResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+# Background job schemas
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    RETRYING = "retrying"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    status_url: str
+    result_url: str
+
+class JobStatusResponse(BaseModel):
+    id: str
+    type: str
+    status: JobStatus
+    progress: int
+    stage: str
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class CatalogRescanSummary(BaseModel):
+    data_sources: int
+    columns: int
+    skipped: int
+    changed: int
+    failed: int = 0
+    decided_by_tier: Dict[str, int]
+    duration_seconds: Optional[float] = None
+
+class RuleReclassificationSummary(BaseModel):
+    rule_id: int
+    candidates: int
+    skipped_approved: int
+    affected: int
+    decrypted: int
+    changed: int
+    data_sources: int
+    duration_seconds: Optional[float] = None
+
+class CustomRuleChangeResponse(BaseModel):
+    rule: CustomRuleResponse
+    reclassification: Optional[JobResponse] = None  # job re-scoring stored results the change affects
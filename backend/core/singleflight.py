@@ -0,0 +1,103 @@
+"""
+Single-flight coalescing of identical concurrent computations
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.config import settings
+from core.cache import CacheManager
+
+logger = logging.getLogger(__name__)
+
+class _LeaderCancelled(Exception):
+    """Set on the shared future when the leader's caller is cancelled"""
+
+class SingleFlight:
+    """Runs one computation per key at a time and hands its result to every concurrent caller
+
+    Callers in the same process await the leader's future. Callers in other
+    processes see the leader's Redis lock and poll the result cache instead of
+    computing; if the leader fails or the wait times out they compute themselves.
+    A cancelled leader hands the computation to one of its local waiters.
+    """
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.cache_manager = cache_manager or CacheManager()
+        self.lock_ttl = settings.SINGLEFLIGHT_LOCK_TTL
+        self.wait_timeout = settings.SINGLEFLIGHT_WAIT_TIMEOUT
+        self.poll_interval = settings.SINGLEFLIGHT_POLL_INTERVAL
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "local_waiters": 0, "remote_waiters": 0}
+
+    async def do(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return compute()'s result, sharing it with concurrent callers for the same key
+
+        lookup reads the result from the shared cache; compute must store it there.
+        """
+        while key in self._inflight:
+            self.stats["local_waiters"] += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _LeaderCancelled:
+                continue  # wait for, or become, the next leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._run_across_workers(key, compute, lookup)
+        except BaseException as e:
+            # Waiters are not cancelled with the leader; they retry instead
+            future.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _run_across_workers(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        lookup: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        if self.cache_manager.redis_client is None:
+            self.stats["leaders"] += 1
+            return await compute()
+
+        lock_key = f"singleflight:{key}"
+        token = str(uuid.uuid4())
+        deadline = time.monotonic() + self.wait_timeout
+
+        waited = False
+        while not await self.cache_manager.set(lock_key, token, expire=self.lock_ttl, nx=True):
+            # Another worker holds the lock: wait for its result to land in the cache
+            if not waited:
+                self.stats["remote_waiters"] += 1
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+
+            result = await lookup()
+            if result is not None:
+                return result
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for in-flight computation of {key}, computing locally")
+                break
+            # Lock released without a cached result means the leader failed; loop to take over
+
+        self.stats["leaders"] += 1
+        try:
+            return await compute()
+        finally:
+            if await self.cache_manager.get(lock_key) == token:
+                await self.cache_manager.delete(lock_key)
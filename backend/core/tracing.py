@@ -0,0 +1,159 @@
+"""
+OpenTelemetry tracing of the upload pipeline and AI provider calls
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+from core.config import settings
+from core.metrics import AI_PROVIDER_CALL_DURATION, PIPELINE_STAGE_DURATION
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("data_classification")
+
+_provider: Optional[TracerProvider] = None
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON object per line
+
+    A stand-in for a collector: each batch is a single append, so several worker
+    processes can share the file. Past max_bytes the file is moved to <path>.1,
+    so at most about twice that is kept on disk.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(self._to_dict(span), default=str) + "\n" for span in spans)
+        try:
+            with self._lock:
+                self._rotate_if_full()
+                with open(self.path, "a", encoding="utf-8") as trace_file:
+                    trace_file.write(lines)
+        except OSError as e:
+            logger.warning(f"Failed to write {len(spans)} spans to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+    def _rotate_if_full(self) -> None:
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+            os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass  # not written yet, or another worker rotated it first
+
+    @staticmethod
+    def _to_dict(span: ReadableSpan) -> Dict[str, Any]:
+        return {
+            "trace_id": format(span.context.trace_id, "032x"),
+            "span_id": format(span.context.span_id, "016x"),
+            "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+            "name": span.name,
+            "start": span.start_time / 1e9,
+            "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+            "status": span.status.status_code.name,
+            "attributes": dict(span.attributes or {}),
+            "events": [
+                {"name": event.name, "attributes": dict(event.attributes or {})} for event in span.events
+            ],
+            "pid": os.getpid()
+        }
+
+def configure_tracing(service_name: str = "data-classification-api") -> None:
+    """Install the tracer provider and exporter for this process (idempotent)
+
+    Spans go to the OTLP/HTTP endpoint in JAEGER_ENDPOINT when set, otherwise to
+    TRACE_FILE_PATH when that is set. With neither, or with ENABLE_TRACING off,
+    spans are no-ops; stage histograms are still recorded.
+    """
+    global _provider
+    if _provider is not None or not settings.ENABLE_TRACING:
+        return
+
+    if settings.JAEGER_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter(endpoint=settings.JAEGER_ENDPOINT)
+    elif settings.TRACE_FILE_PATH:
+        exporter = JsonLinesSpanExporter(settings.TRACE_FILE_PATH, settings.TRACE_FILE_MAX_BYTES)
+    else:
+        return
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name, "deployment.environment": settings.ENVIRONMENT}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO))
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    logger.info(f"Tracing enabled, exporting to {settings.JAEGER_ENDPOINT or settings.TRACE_FILE_PATH}")
+
+def shutdown_tracing() -> None:
+    """Flush spans still queued for export"""
+    if _provider is not None:
+        _provider.shutdown()
+
+def current_trace_context() -> Dict[str, str]:
+    """W3C trace headers for the active span, for work that continues in another process"""
+    carrier: Dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+@contextmanager
+def _timed_span(name: str, attributes: Dict[str, Any], histogram, labels: Dict[str, str], parent=None) -> Iterator[trace.Span]:
+    context = propagate.extract(parent) if parent else None
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    started = time.perf_counter()
+    outcome = "ok"
+    with tracer.start_as_current_span(name, context=context, attributes=attributes) as span:
+        try:
+            yield span
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            histogram.labels(**labels, outcome=outcome).observe(time.perf_counter() - started)
+
+def traced_stage(pipeline: str, stage: str, parent: Optional[Dict[str, str]] = None, **attributes: Any):
+    """Span '<pipeline>.<stage>' plus a pipeline_stage_duration_seconds sample
+
+    parent continues a trace from current_trace_context() of another process.
+    """
+    return _timed_span(
+        f"{pipeline}.{stage}",
+        {"pipeline": pipeline, "stage": stage, **attributes},
+        PIPELINE_STAGE_DURATION,
+        {"pipeline": pipeline, "stage": stage},
+        parent
+    )
+
+def traced_provider_call(provider: str, model: str, **attributes: Any):
+    """Span 'ai_provider.call' plus an ai_provider_call_duration_seconds sample"""
+    return _timed_span(
+        "ai_provider.call",
+        {"ai.provider": provider, "ai.model": model, **attributes},
+        AI_PROVIDER_CALL_DURATION,
+        {"provider": provider, "model": model}
+    )
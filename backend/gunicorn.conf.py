@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the production image
+
+Workers write Prometheus samples to PROMETHEUS_MULTIPROC_DIR, which
+core.metrics.render_metrics() aggregates for /metrics.
+"""
+
+import glob
+import os
+
+from prometheus_client import multiprocess
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+accesslog = "-"
+errorlog = "-"
+
+def on_starting(server):
+    """Drop samples left by a previous run before any worker starts"""
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, "*.db")):
+            os.remove(path)
+
+def child_exit(server, worker):
+    """Stop counting a dead worker's live gauges, such as in-flight requests"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -8,27 +8,31 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, func
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any, Union
 import logging
 import os
 import time
 from datetime import datetime, timedelta
 import uuid
 import asyncio
+from types import SimpleNamespace
 from contextlib import asynccontextmanager
 
 # Monitoring and observability
 import sentry_sdk
 from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
-from prometheus_client import Counter, Histogram, Gauge, generate_latest
+from prometheus_client import Counter, Gauge, CONTENT_TYPE_LATEST
 import structlog
 
 # Internal imports
 from core.config import settings
-from core.database import get_db, engine
+from core.database import get_db, get_async_db, engine, SessionLocal, AsyncSessionLocal, close_async_engine
 from core.security import (
     verify_token, create_access_token, get_password_hash, 
     verify_password, encrypt_sensitive_data, decrypt_sensitive_data
@@ -37,9 +41,12 @@ from core.models import Base, User, ClassificationResult, DataSource, AuditLog,
 from core.schemas import *
 from core.middleware import (
     SecurityHeadersMiddleware, RateLimitMiddleware, 
-    RequestLoggingMiddleware, ErrorHandlingMiddleware
+    RequestLoggingMiddleware, ErrorHandlingMiddleware, PerformanceMonitoringMiddleware
 )
 from core.cache import CacheManager
+from core.metrics import render_metrics
+from core.tracing import configure_tracing, shutdown_tracing, current_trace_context, traced_stage
+from core.celery_app import celery
 from core.exceptions import (
     ClassificationError, DatabaseConnectionError, 
     ValidationError, AuthenticationError
@@ -49,13 +56,26 @@ from core.exceptions import (
 from services.classification_service import EnhancedClassificationService
 from services.file_service import EnhancedFileService
 from services.database_service import EnhancedDatabaseService
-from services.rules_engine import EnhancedRulesEngine
+from services.rules_engine import EnhancedRulesEngine, load_active_rules, rule_set_cache_key
 from services.audit_service import EnhancedAuditService
 from services.notification_service import NotificationService
 from services.compliance_service import ComplianceService
 from services.ml_service import MLClassificationService
 from services.search_service import SearchService
 from services.backup_service import BackupService
+from services.job_service import JobCancelledError, JobNotRetryableError, JobRetryError, JobService
+from services.persistence_service import ClassificationPersistenceService
+from services.retention_service import RetentionService
+from services.rollup_service import DashboardRollupService
+from services.batch_classification_service import BatchClassificationService
+from services.catalog_rescan_service import CatalogRescanService
+from services.reclassification_service import RuleReclassificationService, rule_state
+from services.local_classifier import train_local_classifier
+from services.neighbour_index import neighbour_scope, rebuild_neighbour_index, seed_neighbour_index
+from services.cache_warmer import CacheWarmer
+from services.knowledge_base import knowledge_key
+from utils.fingerprint import column_shape_fingerprint
+from utils.sketches import sketch_file
 
 # Initialize Sentry for error tracking
 if settings.SENTRY_DSN:
@@ -91,11 +111,9 @@ structlog.configure(
 logger = structlog.get_logger()
 
 # Prometheus metrics
-REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request duration')
 CLASSIFICATION_COUNT = Counter('classifications_total', 'Total classifications performed', ['type', 'status'])
-ACTIVE_USERS = Gauge('active_users_total', 'Number of active users')
-DATABASE_CONNECTIONS = Gauge('database_connections_active', 'Active database connections')
+ACTIVE_USERS = Gauge('active_users_total', 'Number of active users', multiprocess_mode='livesum')
+DATABASE_CONNECTIONS = Gauge('database_connections_active', 'Active database connections', multiprocess_mode='livesum')
 
 # Application lifespan management
 @asynccontextmanager
@@ -103,6 +121,7 @@ async def lifespan(app: FastAPI):
     """Manage application startup and shutdown"""
     # Startup
     logger.info("Starting AI Data Classification System")
+    configure_tracing()
     
     # Initialize database
     Base.metadata.create_all(bind=engine)
@@ -111,9 +130,22 @@ async def lifespan(app: FastAPI):
     await cache_manager.initialize()
     await search_service.initialize()
     
+    # Seed the neighbour index from approved results when there is no usable one, in the background and once per host
+    neighbour_index = classification_service.neighbour_index
+    if settings.ENABLE_NEIGHBOUR_REUSE and not len(neighbour_index):
+        asyncio.create_task(seed_neighbour_index(neighbour_index))
+    
+    # Warm caches for recently active users; readiness waits only up to the timeout
+    if settings.ENABLE_CACHE_WARMING:
+        warming = asyncio.create_task(cache_warmer.warm())
+        done, _ = await asyncio.wait({warming}, timeout=settings.CACHE_WARM_READY_TIMEOUT)
+        if not done:
+            logger.info("Cache warming continues in the background", timeout=settings.CACHE_WARM_READY_TIMEOUT)
+    
     # Start background tasks
     asyncio.create_task(periodic_health_check())
     asyncio.create_task(cleanup_expired_sessions())
+    asyncio.create_task(retention_maintenance())
     
     logger.info("Application startup complete")
     
@@ -123,6 +155,9 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down application")
     await cache_manager.close()
     await search_service.close()
+    await batch_classification_service.close()
+    await close_async_engine()
+    shutdown_tracing()
     logger.info("Application shutdown complete")
 
 # Initialize FastAPI app with enhanced configuration
@@ -136,6 +171,7 @@ app = FastAPI(
     openapi_tags=[
         {"name": "Authentication", "description": "User authentication and authorization"},
         {"name": "Classification", "description": "Data classification operations"},
+        {"name": "Jobs", "description": "Asynchronous classification jobs"},
         {"name": "Dashboard", "description": "Analytics and monitoring"},
         {"name": "Rules", "description": "Custom classification rules"},
         {"name": "Compliance", "description": "Compliance and audit features"},
@@ -150,6 +186,8 @@ app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(RateLimitMiddleware)
 app.add_middleware(RequestLoggingMiddleware)
 app.add_middleware(ErrorHandlingMiddleware)
+# Added after error handling so it wraps it and counts unhandled errors as 500s
+app.add_middleware(PerformanceMonitoringMiddleware)
 
 # CORS middleware with enhanced security
 app.add_middleware(
@@ -166,7 +204,7 @@ security = HTTPBearer()
 
 # Initialize enhanced services
 cache_manager = CacheManager()
-classification_service = EnhancedClassificationService()
+classification_service = EnhancedClassificationService(cache_manager)
 file_service = EnhancedFileService()
 database_service = EnhancedDatabaseService()
 rules_engine = EnhancedRulesEngine()
@@ -176,12 +214,25 @@ compliance_service = ComplianceService()
 ml_service = MLClassificationService()
 search_service = SearchService()
 backup_service = BackupService()
+job_service = JobService(cache_manager)
+rollup_service = DashboardRollupService()
+persistence_service = ClassificationPersistenceService(compliance_service, rollup_service)
+retention_service = RetentionService()
+batch_classification_service = BatchClassificationService(classification_service)
+catalog_rescan_service = CatalogRescanService(batch_classification_service, persistence_service)
+rule_reclassification_service = RuleReclassificationService(classification_service, rules_engine, persistence_service)
+cache_warmer = CacheWarmer(cache_manager, classification_service.knowledge_base, rules_engine)
+
+async def _log_action(*args, **kwargs) -> None:
+    """Audit log entry for handlers on async sessions; the audit service still runs on a sync session"""
+    with SessionLocal() as sync_db:
+        await audit_service.log_action(sync_db, *args, **kwargs)
 
 # Enhanced dependency to get current user with caching
 async def get_current_user(
     request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user with enhanced security"""
     try:
@@ -205,20 +256,22 @@ async def get_current_user(
             return cached_user
         
         # Get from database
-        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        user = (await db.execute(
+            select(User).where(User.id == user_id, User.is_active == True)
+        )).scalars().first()
         if user is None:
             raise AuthenticationError("User not found or inactive")
         
         # Update last activity
         user.last_activity = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         # Cache user
         await cache_manager.set_user(user_id, user)
         
         # Log access
-        await audit_service.log_action(
-            db, user.id, "USER_ACCESS", 
+        await _log_action(
+            user.id, "USER_ACCESS", 
             f"User {user.email} accessed system",
             request.client.host
         )
@@ -300,8 +353,8 @@ async def health_check():
 
 @app.get("/metrics", tags=["Monitoring"])
 async def get_metrics():
-    """Prometheus metrics endpoint"""
-    return generate_latest()
+    """Prometheus metrics endpoint, aggregated over all workers"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/info", tags=["Monitoring"])
 async def get_system_info(current_user: User = Depends(get_current_user)):
@@ -327,13 +380,15 @@ async def get_system_info(current_user: User = Depends(get_current_user)):
 async def register(
     user_data: UserCreate, 
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new user with enhanced validation"""
     try:
         # Check if registration is allowed
         if not settings.ALLOW_REGISTRATION and user_data.role == "admin":
-            existing_admins = db.query(User).filter(User.role == "admin").count()
+            existing_admins = await db.scalar(
+                select(func.count()).select_from(User).where(User.role == "admin")
+            )
             if existing_admins > 0:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -350,7 +405,9 @@ async def register(
                 )
         
         # Check if user already exists
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
+        existing_user = (await db.execute(
+            select(User).where(User.email == user_data.email)
+        )).scalars().first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -372,15 +429,15 @@ async def register(
         )
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         # Send welcome notification
         await notification_service.send_welcome_email(user.email, user.full_name)
         
         # Log the registration
-        await audit_service.log_action(
-            db, user.id, "USER_REGISTERED", 
+        await _log_action(
+            user.id, "USER_REGISTERED", 
             f"User {user.email} registered with role {user.role}",
             request.client.host
         )
@@ -403,16 +460,18 @@ async def register(
 async def login(
     user_data: UserLogin, 
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Enhanced user authentication with security features"""
     try:
-        user = db.query(User).filter(User.email == user_data.email).first()
+        user = (await db.execute(
+            select(User).where(User.email == user_data.email)
+        )).scalars().first()
         
         # Check if user exists
         if not user:
-            await audit_service.log_action(
-                db, None, "LOGIN_FAILED", 
+            await _log_action(
+                None, "LOGIN_FAILED", 
                 f"Login attempt with non-existent email: {user_data.email}",
                 request.client.host
             )
@@ -438,10 +497,10 @@ async def login(
                 user.account_locked_until = datetime.utcnow() + timedelta(minutes=30)
                 await notification_service.send_account_locked_email(user.email)
             
-            db.commit()
+            await db.commit()
             
-            await audit_service.log_action(
-                db, user.id, "LOGIN_FAILED", 
+            await _log_action(
+                user.id, "LOGIN_FAILED", 
                 f"Failed login attempt for {user.email}",
                 request.client.host
             )
@@ -463,7 +522,7 @@ async def login(
         user.account_locked_until = None
         user.last_login = datetime.utcnow()
         user.last_activity = datetime.utcnow()
-        db.commit()
+        await db.commit()
         
         # Create access token with enhanced claims
         token_data = {
@@ -479,8 +538,8 @@ async def login(
         await cache_manager.set_user_session(user.id, token_data["session_id"])
         
         # Log successful login
-        await audit_service.log_action(
-            db, user.id, "USER_LOGIN", 
+        await _log_action(
+            user.id, "USER_LOGIN", 
             f"User {user.email} logged in successfully",
             request.client.host
         )
@@ -502,176 +561,659 @@ async def login(
         )
 
 # Enhanced file upload and classification
-@app.post("/upload", response_model=ClassificationResponse, tags=["Classification"])
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    classification_options: Optional[ClassificationOptions] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Enhanced file upload with advanced classification options"""
-    try:
-        # Validate file
-        validation_result = await file_service.validate_file(file)
-        if not validation_result.is_valid:
-            raise ValidationError(validation_result.error_message)
-        
-        # Check user quota
-        user_quota = await compliance_service.check_user_quota(current_user.id, db)
-        if not user_quota.can_upload:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Upload quota exceeded. Limit: {user_quota.limit}"
-            )
-        
-        # Save file securely
-        file_info = await file_service.save_upload_secure(file, current_user.id)
-        
-        # Extract data with enhanced parsing
+async def _no_progress(progress: int, stage: str) -> None:
+    """Progress callback used for synchronous uploads"""
+    return None
+
+async def _load_active_rules(user_id: str) -> List[CustomRule]:
+    """Rule set loader for the rule-set cache; uses its own session as it may refresh in the background"""
+    async with AsyncSessionLocal() as db:
+        return await load_active_rules(db, user_id)
+
+async def _classify_uploaded_file(
+    filename: str,
+    file_info: Any,
+    classification_options: Optional[ClassificationOptions],
+    current_user: User,
+    db: AsyncSession,
+    report_progress=_no_progress,
+    on_persisted=None
+) -> ClassificationResponse:
+    """Run the classification pipeline for a saved upload
+    
+    on_persisted is awaited with the data source id once results are committed.
+    """
+    # Extract data with enhanced parsing
+    await report_progress(10, "extracting")
+    with traced_stage("upload", "extract"):
         extraction_result = await file_service.extract_columns_enhanced(
             file_info.file_path, 
             classification_options
         )
-        
-        # Apply custom rules first
-        rules = db.query(CustomRule).filter(
-            CustomRule.user_id == current_user.id,
-            CustomRule.is_active == True
-        ).all()
+    metadata = dict(extraction_result.metadata or {})
+    
+    # Full-file column statistics, streamed through mergeable sketches at constant memory
+    if settings.ENABLE_COLUMN_SKETCHES:
+        await report_progress(15, "sketching")
+        try:
+            with traced_stage("upload", "sketch"):
+                column_sketches = await asyncio.to_thread(sketch_file, file_info.file_path)
+        except Exception as e:
+            column_sketches = None
+            logger.warning("Column sketching failed", filename=filename, error=str(e))
+        if column_sketches is not None:
+            # Frequent values are column contents, so only counts are stored in the clear
+            metadata["column_statistics"] = column_sketches.summary(include_values=False)
+            metadata["column_sketches"] = encrypt_sensitive_data(column_sketches.to_dict())
+    
+    # Apply custom rules first
+    await report_progress(20, "applying_rules")
+    with traced_stage("upload", "rules"):
+        rules = await cache_manager.get_or_compute(
+            rule_set_cache_key(current_user.id),
+            lambda: _load_active_rules(current_user.id),
+            expire=settings.RULE_SET_CACHE_TTL,
+            stale_ttl=0
+        )
         
         pre_classified = await rules_engine.apply_rules_enhanced(
             extraction_result.columns_data, 
             rules
         )
-        
-        # Enhanced AI classification with multiple models
+    
+    # Enhanced AI classification with multiple models
+    await report_progress(30, "classifying")
+    with traced_stage("upload", "classify", columns=len(extraction_result.columns_data)):
         classification_results = await classification_service.classify_columns_enhanced(
             extraction_result.columns_data,
             pre_classified,
             current_user.id,
             classification_options
         )
-        
-        # ML-based enhancement
-        if settings.ENABLE_ML_ENHANCEMENT:
+    
+    # ML-based enhancement
+    if settings.ENABLE_ML_ENHANCEMENT:
+        await report_progress(70, "ml_enhancement")
+        with traced_stage("upload", "ml_enhancement"):
             classification_results = await ml_service.enhance_classifications(
                 classification_results,
                 extraction_result.metadata
             )
-        
-        # Store data source with encryption
-        data_source = DataSource(
-            name=file.filename,
-            type="file",
-            file_path=encrypt_sensitive_data(file_info.file_path),
-            file_hash=file_info.file_hash,
-            file_size=file_info.file_size,
-            metadata=extraction_result.metadata,
-            user_id=current_user.id,
-            created_at=datetime.utcnow()
+    
+    # Store data source and results in a single transaction
+    await report_progress(80, "persisting")
+    with traced_stage("upload", "persist"):
+        data_source = await persistence_service.persist_classification_results(
+            db,
+            {
+                "name": filename,
+                "type": "file",
+                "file_path": encrypt_sensitive_data(file_info.file_path),
+                "file_hash": file_info.file_hash,
+                "file_size": file_info.file_size,
+                "metadata": metadata,
+                "user_id": current_user.id,
+                "created_at": datetime.utcnow()
+            },
+            classification_results,
+            current_user.id,
+            current_user.organization_id if hasattr(current_user, 'organization_id') else None
         )
-        db.add(data_source)
-        db.commit()
-        db.refresh(data_source)
-        
-        # Store classification results with compliance mapping
-        for result in classification_results:
-            # Generate compliance mapping
-            compliance_mapping = await compliance_service.generate_compliance_mapping(
-                result, current_user.organization_id if hasattr(current_user, 'organization_id') else None
-            )
-            
-            db_result = ClassificationResult(
-                data_source_id=data_source.id,
-                column_name=result["column_name"],
-                classification_level=result["classification_level"],
-                regulation=result["regulation"],
-                justification=result["justification"],
-                confidence_score=result["confidence_score"],
-                sample_values=encrypt_sensitive_data(result["sample_values"]),
-                compliance_mapping=compliance_mapping,
-                risk_score=result.get("risk_score", 0.0),
-                user_id=current_user.id,
-                created_at=datetime.utcnow()
-            )
-            db.add(db_result)
-        
-        db.commit()
-        
-        # Index for search
+    if on_persisted is not None:
+        await on_persisted(data_source.id)
+    
+    # Index for search
+    await report_progress(88, "indexing")
+    with traced_stage("upload", "index"):
         await search_service.index_classification_results(
             data_source.id, 
             classification_results
         )
-        
-        # Generate compliance report
+    
+    # Generate compliance report
+    await report_progress(92, "reporting")
+    with traced_stage("upload", "report"):
         compliance_report = await compliance_service.generate_report(
             classification_results,
             current_user.id
         )
-        
-        # Send notifications for high-risk classifications
-        high_risk_count = sum(
-            1 for result in classification_results 
-            if result["classification_level"] in ["Top Secret", "Confidential"]
-        )
-        
-        if high_risk_count > 0:
+    
+    # Send notifications for high-risk classifications
+    await report_progress(96, "notifying")
+    high_risk_count = sum(
+        1 for result in classification_results 
+        if result["classification_level"] in ["Top Secret", "Confidential"]
+    )
+    
+    if high_risk_count > 0:
+        with traced_stage("upload", "notify", high_risk_columns=high_risk_count):
             await notification_service.send_high_risk_alert(
                 current_user.email,
-                file.filename,
+                filename,
                 high_risk_count
             )
-        
-        # Log the classification
-        await audit_service.log_action(
-            db, current_user.id, "FILE_CLASSIFIED",
-            f"File {file.filename} classified with {len(classification_results)} columns, {high_risk_count} high-risk"
+    
+    # Log the classification
+    with traced_stage("upload", "audit"):
+        await _log_action(
+            current_user.id, "FILE_CLASSIFIED",
+            f"File {filename} classified with {len(classification_results)} columns, {high_risk_count} high-risk"
         )
+    
+    return ClassificationResponse(
+        data_source_id=data_source.id,
+        results=classification_results,
+        total_columns=len(classification_results),
+        high_risk_columns=high_risk_count,
+        compliance_report=compliance_report,
+        processing_time=extraction_result.processing_time,
+        timestamp=datetime.utcnow()
+    )
+
+@app.post("/upload", response_model=Union[ClassificationResponse, JobResponse], tags=["Classification"])
+async def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    classification_options: Optional[ClassificationOptions] = None,
+    async_mode: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Enhanced file upload with advanced classification options
+    
+    With async_mode the file is queued for a background worker and a job id is returned immediately.
+    """
+    with traced_stage("upload", "request", filename=file.filename, async_mode=async_mode):
+        try:
+            # Validate file
+            with traced_stage("upload", "validate"):
+                validation_result = await file_service.validate_file(file)
+            if not validation_result.is_valid:
+                raise ValidationError(validation_result.error_message)
+            
+            # Check user quota
+            with traced_stage("upload", "quota"):
+                # The compliance service still runs on a sync session
+                with SessionLocal() as sync_db:
+                    user_quota = await compliance_service.check_user_quota(current_user.id, sync_db)
+            if not user_quota.can_upload:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"Upload quota exceeded. Limit: {user_quota.limit}"
+                )
+            
+            if async_mode and await job_service.is_queue_full():
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Classification queue is full, try again later"
+                )
+            
+            # Save file securely
+            with traced_stage("upload", "save"):
+                file_info = await file_service.save_upload_secure(file, current_user.id)
+            
+            if async_mode:
+                job = await job_service.create_job(current_user.id, "file_classification", {
+                    "filename": file.filename,
+                    "file_info": {
+                        "file_path": file_info.file_path,
+                        "file_hash": file_info.file_hash,
+                        "file_size": file_info.file_size
+                    },
+                    "classification_options": classification_options.dict() if classification_options else None,
+                    "trace_context": current_trace_context()
+                })
+                with traced_stage("upload", "enqueue", job_id=job["id"]):
+                    await job_service.enqueue(job, _run_upload_job, celery_task=process_upload_job)
+                
+                CLASSIFICATION_COUNT.labels(type="file_job", status="queued").inc()
+                
+                return JobResponse(
+                    job_id=job["id"],
+                    status=job["status"],
+                    status_url=f"/jobs/{job['id']}",
+                    result_url=f"/jobs/{job['id']}/result"
+                )
+            
+            response = await _classify_uploaded_file(
+                file.filename, file_info, classification_options, current_user, db
+            )
+            
+            # Update metrics
+            CLASSIFICATION_COUNT.labels(type="file", status="success").inc()
+            
+            # Schedule background tasks
+            background_tasks.add_task(file_service.cleanup_file, file_info.file_path, delay=3600)
+            background_tasks.add_task(backup_service.backup_classification_results, response.data_source_id)
+            
+            return response
+            
+        except (ValidationError, HTTPException):
+            raise
+        except Exception as e:
+            logger.error("File upload error", error=str(e), filename=file.filename, user_id=current_user.id)
+            CLASSIFICATION_COUNT.labels(type="file", status="error").inc()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"File processing failed: {str(e)}"
+            )
+
+# Background classification jobs
+async def _run_upload_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    """Job handler that classifies a previously saved upload"""
+    payload = job["payload"]
+    
+    # Queued uploads continue the trace of the request that saved them
+    with traced_stage("upload", "job", parent=payload.get("trace_context"), job_id=job["id"]):
+        # Persisting is not idempotent, so an attempt after the commit must not run the pipeline again
+        if job.get("data_source_id") is not None:
+            raise JobNotRetryableError(
+                f"Results were already stored as data source {job['data_source_id']} by an earlier attempt"
+            )
         
-        # Update metrics
-        CLASSIFICATION_COUNT.labels(type="file", status="success").inc()
+        async def record_persisted(data_source_id: int) -> None:
+            job["data_source_id"] = data_source_id
+            await job_service.update_job(job["id"], data_source_id=data_source_id)
         
-        # Schedule background tasks
-        background_tasks.add_task(file_service.cleanup_file, file_info.file_path, delay=3600)
-        background_tasks.add_task(backup_service.backup_classification_results, data_source.id)
+        try:
+            async with AsyncSessionLocal() as db:
+                current_user = (await db.execute(
+                    select(User).where(User.id == job["user_id"], User.is_active == True)
+                )).scalars().first()
+                if current_user is None:
+                    raise PermissionError("User not found or inactive")
+                
+                classification_options = None
+                if payload.get("classification_options"):
+                    classification_options = ClassificationOptions(**payload["classification_options"])
+                
+                response = await _classify_uploaded_file(
+                    payload["filename"],
+                    SimpleNamespace(**payload["file_info"]),
+                    classification_options,
+                    current_user,
+                    db,
+                    report_progress,
+                    on_persisted=record_persisted
+                )
+            
+            CLASSIFICATION_COUNT.labels(type="file_job", status="success").inc()
+            
+            await backup_service.backup_classification_results(response.data_source_id)
+            await file_service.cleanup_file(payload["file_info"]["file_path"], delay=0)
+            
+            return jsonable_encoder(response)
+            
+        except Exception as e:
+            CLASSIFICATION_COUNT.labels(type="file_job", status="error").inc()
+            if job.get("data_source_id") is not None and not isinstance(e, (JobNotRetryableError, JobCancelledError)):
+                raise JobNotRetryableError(
+                    f"Post-processing of data source {job['data_source_id']} failed: {str(e)}"
+                ) from e
+            raise
+
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_worker_loop() -> asyncio.AbstractEventLoop:
+    """Persistent event loop for a Celery worker process"""
+    global _worker_loop
+    if _worker_loop is None:
+        configure_tracing("data-classification-worker")
+        _worker_loop = asyncio.new_event_loop()
+        _worker_loop.run_until_complete(cache_manager.initialize())
+    return _worker_loop
+
+@celery.task(bind=True, name="classification.process_upload_job", max_retries=settings.JOB_MAX_RETRIES)
+def process_upload_job(self, job_id: str):
+    """Celery entry point for queued upload jobs"""
+    loop = _get_worker_loop()
+    try:
+        loop.run_until_complete(job_service.execute(job_id, _run_upload_job))
+    except JobRetryError as e:
+        raise self.retry(exc=e.error, countdown=job_service.retry_delay(e.attempt))
+
+async def _run_catalog_rescan_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    """Job handler that reclassifies stale data sources through provider batch APIs"""
+    try:
+        async with AsyncSessionLocal() as db:
+            summary = await catalog_rescan_service.rescan(db, report_progress)
         
-        return ClassificationResponse(
-            data_source_id=data_source.id,
-            results=classification_results,
-            total_columns=len(classification_results),
-            high_risk_columns=high_risk_count,
-            compliance_report=compliance_report,
-            processing_time=extraction_result.processing_time,
-            timestamp=datetime.utcnow()
-        )
+        CLASSIFICATION_COUNT.labels(type="catalog_rescan", status="success").inc()
+        logger.info("Catalog rescan complete", **summary)
+        return summary
+        
+    except Exception:
+        CLASSIFICATION_COUNT.labels(type="catalog_rescan", status="error").inc()
+        raise
+
+# Provider batches may take up to BATCH_MAX_WAIT; the default task limit leaves time for the per-column retries
+@celery.task(
+    bind=True,
+    name="classification.process_catalog_rescan_job",
+    max_retries=settings.JOB_MAX_RETRIES,
+    soft_time_limit=settings.BATCH_MAX_WAIT + settings.CELERY_TASK_TIMEOUT,
+    time_limit=settings.BATCH_MAX_WAIT + settings.CELERY_TASK_TIMEOUT + 60
+)
+def process_catalog_rescan_job(self, job_id: str):
+    """Celery entry point for queued catalog rescans"""
+    loop = _get_worker_loop()
+    try:
+        loop.run_until_complete(job_service.execute(job_id, _run_catalog_rescan_job))
+    except JobRetryError as e:
+        raise self.retry(exc=e.error, countdown=job_service.retry_delay(e.attempt))
+
+async def _enqueue_catalog_rescan(user_id: str) -> Dict[str, Any]:
+    job = await job_service.create_job(user_id, "catalog_rescan", {})
+    await job_service.enqueue(job, _run_catalog_rescan_job, celery_task=process_catalog_rescan_job)
+    return job
+
+@celery.task(name="classification.nightly_catalog_rescan")
+def nightly_catalog_rescan():
+    """Beat entry point: queue the nightly catalog rescan as a regular job"""
+    job = _get_worker_loop().run_until_complete(_enqueue_catalog_rescan("system"))
+    return job["id"]
+
+async def _run_rule_reclassification_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    """Job handler that re-scores stored results affected by a custom rule change"""
+    payload = job["payload"]
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            summary = await rule_reclassification_service.reclassify(
+                db, job["user_id"], payload["previous"], payload["current"], report_progress
+            )
+        
+        CLASSIFICATION_COUNT.labels(type="rule_reclassification", status="success").inc()
+        logger.info("Rule reclassification complete", rule_id=payload["rule_id"], **summary)
+        return {"rule_id": payload["rule_id"], **summary}
         
-    except (ValidationError, HTTPException):
+    except Exception:
+        CLASSIFICATION_COUNT.labels(type="rule_reclassification", status="error").inc()
         raise
+
+@celery.task(bind=True, name="classification.process_rule_reclassification_job", max_retries=settings.JOB_MAX_RETRIES)
+def process_rule_reclassification_job(self, job_id: str):
+    """Celery entry point for queued rule reclassifications"""
+    loop = _get_worker_loop()
+    try:
+        loop.run_until_complete(job_service.execute(job_id, _run_rule_reclassification_job))
+    except JobRetryError as e:
+        raise self.retry(exc=e.error, countdown=job_service.retry_delay(e.attempt))
+
+async def _run_local_model_training_job(job: Dict[str, Any], report_progress) -> Dict[str, Any]:
+    """Job handler that retrains the local classifier; workers pick up the new model file on their next reload check"""
+    await report_progress(5, "training")
+    async with AsyncSessionLocal() as db:
+        summary = await train_local_classifier(db, classification_service.local_classifier)
+    logger.info("Local classifier training finished", status=summary["status"])
+    
+    # Decisions of the replaced model are no longer what the cascade would answer
+    if summary["status"] == "trained":
+        await report_progress(95, "retiring_knowledge")
+        summary["knowledge_retired"] = await classification_service.knowledge_base.invalidate(decided_by_tier="local")
+    return summary
+
+@celery.task(bind=True, name="classification.process_local_model_training_job", max_retries=settings.JOB_MAX_RETRIES)
+def process_local_model_training_job(self, job_id: str):
+    """Celery entry point for queued local classifier training"""
+    loop = _get_worker_loop()
+    try:
+        loop.run_until_complete(job_service.execute(job_id, _run_local_model_training_job))
+    except JobRetryError as e:
+        raise self.retry(exc=e.error, countdown=job_service.retry_delay(e.attempt))
+
+async def _retire_rule_knowledge(user_id: str) -> None:
+    """Drop the user's remembered model decisions, which were made under the previous rule set"""
+    try:
+        await classification_service.knowledge_base.invalidate(owner=user_id)
     except Exception as e:
-        logger.error("File upload error", error=str(e), filename=file.filename, user_id=current_user.id)
-        CLASSIFICATION_COUNT.labels(type="file", status="error").inc()
+        logger.warning("Knowledge base invalidation failed", user_id=user_id, error=str(e))
+
+async def _enqueue_rule_reclassification(
+    user_id: str,
+    rule_id: int,
+    previous: Optional[Dict[str, Any]],
+    current: Dict[str, Any]
+) -> Optional[JobResponse]:
+    """Queue re-scoring of stored results when a rule change can affect them"""
+    if not settings.ENABLE_RULE_RECLASSIFICATION or previous == current:
+        return None
+    if previous is None and not current["is_active"]:
+        return None
+    
+    job = await job_service.create_job(user_id, "rule_reclassification", {
+        "rule_id": rule_id,
+        "previous": previous,
+        "current": current
+    })
+    await job_service.enqueue(job, _run_rule_reclassification_job, celery_task=process_rule_reclassification_job)
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        status_url=f"/jobs/{job['id']}",
+        result_url=f"/jobs/{job['id']}/result"
+    )
+
+async def _get_user_job(job_id: str, current_user: User) -> Dict[str, Any]:
+    """Load a job, enforcing ownership"""
+    job = await job_service.get_job(job_id)
+    if job is None or (job["user_id"] != current_user.id and current_user.role != "admin"):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"File processing failed: {str(e)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
+    return job
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+async def get_job_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get job status and progress"""
+    job = await _get_user_job(job_id, current_user)
+    return JobStatusResponse(**job)
+
+# Result schema of each job type; jobs that only change stored results return a summary
+JOB_RESULT_MODELS = {
+    "file_classification": ClassificationResponse,
+    "catalog_rescan": CatalogRescanSummary,
+    "rule_reclassification": RuleReclassificationSummary,
+    "local_model_training": dict  # status plus the training metadata
+}
+
+@app.get(
+    "/jobs/{job_id}/result",
+    response_model=Union[ClassificationResponse, CatalogRescanSummary, RuleReclassificationSummary, Dict[str, Any]],
+    tags=["Jobs"]
+)
+async def get_job_result(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Get the result of a completed job"""
+    job = await _get_user_job(job_id, current_user)
+    
+    if job["status"] != JobStatus.COMPLETED.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"status": job["status"], "progress": job["progress"], "error": job["error"]}
+        )
+    
+    return JOB_RESULT_MODELS[job["type"]](**job["result"])
+
+@app.delete("/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+async def cancel_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Cancel a queued or running job"""
+    await _get_user_job(job_id, current_user)
+    job = await job_service.cancel_job(job_id)
+    return JobStatusResponse(**job)
+
+@app.post("/classifications/{result_id}/approve", tags=["Classification"])
+async def approve_classification(
+    result_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Approve a classification result and add it to the knowledge base"""
+    if current_user.role not in ["admin", "data_steward"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions"
+        )
+    
+    result = (await db.execute(
+        select(ClassificationResult).where(ClassificationResult.id == result_id)
+    )).scalar_one_or_none()
+    
+    if result is None or (result.user_id != current_user.id and current_user.role != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Classification result not found"
+        )
+    
+    result.is_approved = True
+    result.approved_by = current_user.id
+    result.approved_at = datetime.utcnow()
+    await db.commit()
+    
+    sample_values = decrypt_sensitive_data(result.sample_values) if result.sample_values else []
+    entry = {
+        "classification_level": result.classification_level,
+        "regulation": result.regulation,
+        "justification": result.justification,
+        "confidence_score": result.confidence_score,
+        "risk_score": result.risk_score,
+        "decided_by_tier": result.decided_by_tier,
+        "model_used": "approved",
+        "owner": result.user_id
+    }
+    # The options a result was classified under are not stored, so approvals apply to the owner's default profile
+    await classification_service.knowledge_base.approve(
+        knowledge_key(column_shape_fingerprint(result.column_name, sample_values), result.user_id),
+        entry,
+        current_user.id
+    )
+    if settings.ENABLE_NEIGHBOUR_REUSE:
+        await classification_service.neighbour_index.add(
+            result.id, result.column_name, sample_values, entry, neighbour_scope(result.user_id)
+        )
+    
+    await _log_action(
+        current_user.id, "CLASSIFICATION_APPROVED",
+        f"Approved classification {result.id} ({result.column_name}: {result.classification_level})"
+    )
+    
+    return {
+        "id": result.id,
+        "is_approved": result.is_approved,
+        "approved_by": result.approved_by,
+        "approved_at": result.approved_at
+    }
+
+# Custom rules
+@app.post("/rules", response_model=CustomRuleChangeResponse, tags=["Rules"])
+async def create_rule(
+    rule_data: CustomRuleCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create a custom rule and re-score stored results it now matches"""
+    if not rules_engine.validate_rule(rule_data.pattern):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid rule pattern"
+        )
+    
+    rule = CustomRule(
+        name=rule_data.name,
+        pattern=rule_data.pattern,
+        classification_level=rule_data.classification_level.value,
+        regulation=rule_data.regulation.value,
+        description=rule_data.description,
+        is_active=True,
+        user_id=current_user.id,
+        created_at=datetime.utcnow()
+    )
+    db.add(rule)
+    await db.commit()
+    await db.refresh(rule)
+    await cache_manager.delete(rule_set_cache_key(current_user.id))
+    await _retire_rule_knowledge(current_user.id)
+    
+    job = await _enqueue_rule_reclassification(current_user.id, rule.id, None, rule_state(rule))
+    
+    await _log_action(
+        current_user.id, "RULE_CREATED",
+        f"Created rule {rule.id} ({rule.name})" + (f", reclassification job {job.job_id}" if job else "")
+    )
+    
+    return CustomRuleChangeResponse(rule=CustomRuleResponse.from_orm(rule), reclassification=job)
+
+@app.put("/rules/{rule_id}", response_model=CustomRuleChangeResponse, tags=["Rules"])
+async def update_rule(
+    rule_id: int,
+    rule_data: CustomRuleUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Edit a custom rule and re-score only the stored results the change can affect"""
+    rule = (await db.execute(
+        select(CustomRule).where(CustomRule.id == rule_id, CustomRule.user_id == current_user.id)
+    )).scalar_one_or_none()
+    
+    if rule is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rule not found"
+        )
+    
+    if rule_data.pattern is not None and not rules_engine.validate_rule(rule_data.pattern):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid rule pattern"
+        )
+    
+    previous = rule_state(rule)
+    for field, value in rule_data.dict(exclude_unset=True).items():
+        if value is not None:
+            setattr(rule, field, getattr(value, "value", value))  # enums are stored by value
+    await db.commit()
+    await db.refresh(rule)
+    await cache_manager.delete(rule_set_cache_key(current_user.id))
+    await _retire_rule_knowledge(current_user.id)
+    
+    job = await _enqueue_rule_reclassification(current_user.id, rule.id, previous, rule_state(rule))
+    
+    await _log_action(
+        current_user.id, "RULE_UPDATED",
+        f"Updated rule {rule.id} ({rule.name})" + (f", reclassification job {job.job_id}" if job else "")
+    )
+    
+    return CustomRuleChangeResponse(rule=CustomRuleResponse.from_orm(rule), reclassification=job)
 
 # Enhanced dashboard with real-time analytics
+async def _compute_dashboard_extras(user_id: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard sections that are not rollup counts; may run after the request has finished"""
+    # The compliance service still runs on a sync session
+    with SessionLocal() as db:
+        compliance_status = await compliance_service.get_real_time_status(user_id, db)
+    return {
+        "compliance_status": compliance_status,
+        "real_time_alerts": await notification_service.get_active_alerts(user_id),
+        "recommendations": await ml_service.get_recommendations(user_id, stats)
+    }
+
 @app.get("/dashboard/stats", response_model=EnhancedDashboardStats, tags=["Dashboard"])
 async def get_enhanced_dashboard_stats(
     time_range: Optional[str] = "7d",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get enhanced dashboard statistics with real-time analytics"""
     try:
-        # Check cache first
-        cache_key = f"dashboard_stats:{current_user.id}:{time_range}"
-        cached_stats = await cache_manager.get(cache_key)
-        if cached_stats:
-            return cached_stats
-        
         # Calculate time range
         end_date = datetime.utcnow()
         if time_range == "24h":
@@ -683,46 +1225,28 @@ async def get_enhanced_dashboard_stats(
         else:
             start_date = end_date - timedelta(days=7)
         
-        # Get user's classification results
-        results = db.query(ClassificationResult).filter(
-            ClassificationResult.user_id == current_user.id,
-            ClassificationResult.created_at >= start_date
-        ).all()
-        
-        # Enhanced analytics
-        stats = await analytics_service.calculate_enhanced_stats(
-            results, start_date, end_date, current_user.id, db
-        )
-        
-        # Real-time compliance monitoring
-        compliance_status = await compliance_service.get_real_time_status(
-            current_user.id, db
-        )
-        
-        # Risk assessment
-        risk_assessment = await compliance_service.calculate_risk_score(
-            results, current_user.id
+        # Counts come from the rollup tables: exact, and independent of history size
+        stats = await rollup_service.get_dashboard_stats(
+            db, current_user.id, start_date, end_date
         )
-        
-        # Trend analysis
-        trend_analysis = await analytics_service.calculate_trends(
-            current_user.id, start_date, end_date, db
+        risk_assessment = stats.pop("risk_assessment")
+        trend_analysis = {"daily": stats.pop("daily_trend")}
+        
+        # Compliance status, alerts and recommendations are not counts and stay cached briefly;
+        # expiry serves the previous value while one worker recomputes it
+        extras = await cache_manager.get_or_compute(
+            f"dashboard_extras:{current_user.id}:{time_range}",
+            lambda: _compute_dashboard_extras(current_user.id, stats),
+            expire=300  # 5 minutes
         )
         
-        enhanced_stats = EnhancedDashboardStats(
+        return EnhancedDashboardStats(
             **stats,
-            compliance_status=compliance_status,
             risk_assessment=risk_assessment,
             trend_analysis=trend_analysis,
-            real_time_alerts=await notification_service.get_active_alerts(current_user.id),
-            recommendations=await ml_service.get_recommendations(current_user.id, results)
+            **extras
         )
         
-        # Cache results
-        await cache_manager.set(cache_key, enhanced_stats, expire=300)  # 5 minutes
-        
-        return enhanced_stats
-        
     except Exception as e:
         logger.error("Dashboard stats error", error=str(e), user_id=current_user.id)
         raise HTTPException(
@@ -805,6 +1329,79 @@ async def generate_compliance_report(
             detail="Failed to generate compliance report"
         )
 
+# Administrative operations
+@app.post("/admin/local-model/train", response_model=JobResponse, tags=["Admin"])
+async def train_local_model(
+    current_user: User = Depends(get_current_user)
+):
+    """Queue retraining of the local classifier from approved classification results"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions"
+        )
+    
+    job = await job_service.create_job(current_user.id, "local_model_training", {})
+    await job_service.enqueue(job, _run_local_model_training_job, celery_task=process_local_model_training_job)
+    
+    await _log_action(
+        current_user.id, "LOCAL_MODEL_TRAINING_QUEUED",
+        f"Queued local classifier training job {job['id']}"
+    )
+    
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        status_url=f"/jobs/{job['id']}",
+        result_url=f"/jobs/{job['id']}/result"
+    )
+
+@app.post("/admin/neighbour-index/rebuild", tags=["Admin"])
+async def rebuild_neighbour_index_endpoint(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Rebuild the nearest-neighbour index from approved classification results"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions"
+        )
+    
+    summary = await rebuild_neighbour_index(db, classification_service.neighbour_index)
+    
+    await _log_action(
+        current_user.id, "NEIGHBOUR_INDEX_REBUILT",
+        f"Neighbour index rebuilt with {summary['columns']} approved columns"
+    )
+    
+    return summary
+
+@app.post("/admin/catalog/rescan", response_model=JobResponse, tags=["Admin"])
+async def rescan_catalog(
+    current_user: User = Depends(get_current_user)
+):
+    """Queue a batch-mode rescan of data sources not scanned recently"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions"
+        )
+    
+    job = await _enqueue_catalog_rescan(current_user.id)
+    
+    await _log_action(
+        current_user.id, "CATALOG_RESCAN_QUEUED",
+        f"Queued catalog rescan job {job['id']}"
+    )
+    
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        status_url=f"/jobs/{job['id']}",
+        result_url=f"/jobs/{job['id']}/result"
+    )
+
 # Background tasks and monitoring
 async def periodic_health_check():
     """Periodic health check for all services"""
@@ -839,6 +1436,18 @@ async def cleanup_expired_sessions():
         except Exception as e:
             logger.error("Session cleanup error", error=str(e))
 
+async def retention_maintenance():
+    """Pre-create result partitions and purge expired classification results"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                summary = await retention_service.run_maintenance(db)
+            logger.info("Retention maintenance complete", **summary)
+        except Exception as e:
+            logger.error("Retention maintenance error", error=str(e))
+        
+        await asyncio.sleep(settings.RETENTION_PURGE_INTERVAL)
+
 # Error handlers
 @app.exception_handler(ValidationError)
 async def validation_error_handler(request: Request, exc: ValidationError):
@@ -0,0 +1,40 @@
+"""Composite indexes for dashboard and search access paths
+
+Tables themselves are created by the application at startup
+(Base.metadata.create_all); this revision only adds indexes. They are
+built CONCURRENTLY so existing multi-year tables stay writable.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    # Dashboard: WHERE user_id = ? AND created_at >= ?
+    ("ix_classification_results_user_created", "classification_results", "user_id, created_at"),
+    # Search filters on level/regulation within a user's results, newest first
+    ("ix_classification_results_user_level_created", "classification_results",
+     "user_id, classification_level, created_at"),
+    ("ix_classification_results_user_regulation_created", "classification_results",
+     "user_id, regulation, created_at"),
+    # Results of a data source, looked up by column
+    ("ix_classification_results_source_column", "classification_results", "data_source_id, column_name"),
+    ("ix_data_sources_user_created", "data_sources", "user_id, created_at"),
+]
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,116 @@
+"""Optional monthly range partitioning of classification_results
+
+Only applied when CLASSIFICATION_RESULTS_PARTITIONED is enabled; otherwise
+this revision is a no-op. To switch an existing deployment later, run
+`alembic downgrade 0001 && alembic upgrade head` with the flag set.
+
+Partitioning requires the partition key in the primary key, so the key
+becomes (id, created_at) and the access_policies foreign key to
+classification_results.id is dropped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from core.config import settings
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TABLE = "classification_results"
+INDEXES = [
+    ("ix_classification_results_user_created", "user_id, created_at"),
+    ("ix_classification_results_user_level_created", "user_id, classification_level, created_at"),
+    ("ix_classification_results_user_regulation_created", "user_id, regulation, created_at"),
+    ("ix_classification_results_source_column", "data_source_id, column_name"),
+]
+
+def _is_partitioned(bind) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table"
+    ), {"table": TABLE}).scalar())
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} ({columns})")
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not settings.CLASSIFICATION_RESULTS_PARTITIONED:
+        return
+    if _is_partitioned(bind):
+        return
+
+    op.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+    op.execute(f"UPDATE {TABLE} SET created_at = COALESCE(updated_at, now()) WHERE created_at IS NULL")
+
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy")
+    op.execute("ALTER TABLE access_policies DROP CONSTRAINT IF EXISTS access_policies_classification_result_id_fkey")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE")
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute(
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (created_at)"
+    )
+    op.execute(f"ALTER TABLE {TABLE} ALTER COLUMN created_at SET NOT NULL")
+    op.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)")
+    op.execute(f"ALTER TABLE {TABLE} ADD FOREIGN KEY (data_source_id) REFERENCES data_sources (id)")
+    op.execute(f"ALTER TABLE {TABLE} ADD FOREIGN KEY (user_id) REFERENCES users (id)")
+
+    # One partition per month from the oldest row up to a few months ahead
+    oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {TABLE}_legacy")).scalar()
+    today = datetime.utcnow().date()
+    month = (oldest.date() if oldest else today).replace(day=1)
+    last = _add_months(today.replace(day=1), settings.PARTITION_PRECREATE_MONTHS)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE}_y{month.year:04d}m{month.month:02d} "
+            f"PARTITION OF {TABLE} FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_legacy")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    op.execute(f"DROP TABLE {TABLE}_legacy")
+
+    _create_indexes()
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _is_partitioned(bind):
+        return
+
+    op.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE")
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute(f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER TABLE {TABLE} ADD FOREIGN KEY (data_source_id) REFERENCES data_sources (id)")
+    op.execute(f"ALTER TABLE {TABLE} ADD FOREIGN KEY (user_id) REFERENCES users (id)")
+    op.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned")
+    op.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    op.execute(f"DROP TABLE {TABLE}_partitioned CASCADE")
+
+    op.execute(
+        "ALTER TABLE access_policies ADD CONSTRAINT access_policies_classification_result_id_fkey "
+        f"FOREIGN KEY (classification_result_id) REFERENCES {TABLE} (id)"
+    )
+    _create_indexes()
@@ -0,0 +1,45 @@
+"""Dashboard statistics rollup table, backfilled from existing results
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # The application may already have created the table via create_all;
+    # in that case rebuild its contents from scratch
+    if sa.inspect(op.get_bind()).has_table("dashboard_stats_daily"):
+        op.execute("DELETE FROM dashboard_stats_daily")
+    else:
+        op.create_table(
+            "dashboard_stats_daily",
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("day", sa.Date(), primary_key=True),
+            sa.Column("classification_level", sa.String(), primary_key=True),
+            sa.Column("regulation", sa.String(), primary_key=True),
+            sa.Column("column_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("confidence_sum", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("risk_sum", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("last_classified_at", sa.DateTime()),
+        )
+
+    op.execute(
+        "INSERT INTO dashboard_stats_daily "
+        "(user_id, day, classification_level, regulation, column_count, confidence_sum, risk_sum, last_classified_at) "
+        "SELECT user_id, CAST(created_at AS DATE), classification_level, regulation, count(*), "
+        "COALESCE(sum(confidence_score), 0), COALESCE(sum(risk_score), 0), max(created_at) "
+        "FROM classification_results "
+        "WHERE user_id IS NOT NULL AND created_at IS NOT NULL "
+        "GROUP BY user_id, CAST(created_at AS DATE), classification_level, regulation"
+    )
+
+def downgrade() -> None:
+    op.drop_table("dashboard_stats_daily")
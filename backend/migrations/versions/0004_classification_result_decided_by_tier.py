@@ -0,0 +1,21 @@
+"""Record which classification cascade tier decided each result
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # On a partitioned table the column is added to every partition
+    op.add_column("classification_results", sa.Column("decided_by_tier", sa.String(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column("classification_results", "decided_by_tier")
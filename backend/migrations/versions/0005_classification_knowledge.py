@@ -0,0 +1,42 @@
+"""Durable classification knowledge base
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # The application may already have created the table via create_all
+    if sa.inspect(op.get_bind()).has_table("classification_knowledge"):
+        return
+
+    op.create_table(
+        "classification_knowledge",
+        sa.Column("fingerprint", sa.String(64), primary_key=True),
+        sa.Column("kb_version", sa.String(), primary_key=True),
+        sa.Column("classification_level", sa.String(), nullable=False),
+        sa.Column("regulation", sa.String(), nullable=False),
+        sa.Column("justification", sa.Text()),
+        sa.Column("confidence_score", sa.Float()),
+        sa.Column("risk_score", sa.Float()),
+        sa.Column("patterns_detected", sa.JSON()),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("decided_by_tier", sa.String()),
+        sa.Column("model_used", sa.String()),
+        sa.Column("approved_by", sa.String()),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.Column("last_used_at", sa.DateTime()),
+    )
+
+def downgrade() -> None:
+    op.drop_table("classification_knowledge")
@@ -0,0 +1,21 @@
+"""Record the approved neighbour a classification result was inherited from
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # On a partitioned table the column is added to every partition
+    op.add_column("classification_results", sa.Column("neighbour", sa.JSON(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column("classification_results", "neighbour")
@@ -0,0 +1,21 @@
+"""Store column fingerprints so rule changes can find affected results
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Existing rows keep a NULL fingerprint; reclassification falls back to their samples
+    op.add_column("classification_results", sa.Column("fingerprint", sa.String(64), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column("classification_results", "fingerprint")
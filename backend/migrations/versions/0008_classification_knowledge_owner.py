@@ -0,0 +1,28 @@
+"""Record the owner of knowledge base entries so rule changes can retire them
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # The application may already have created the column via create_all
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("classification_knowledge")}
+    if "owner" in columns:
+        return
+
+    # Existing entries keep a NULL owner; only the KNOWLEDGE_BASE_VERSION bump retires them
+    op.add_column("classification_knowledge", sa.Column("owner", sa.String(), nullable=True))
+    op.create_index("ix_classification_knowledge_owner", "classification_knowledge", ["owner"])
+
+def downgrade() -> None:
+    op.drop_index("ix_classification_knowledge_owner", table_name="classification_knowledge")
+    op.drop_column("classification_knowledge", "owner")
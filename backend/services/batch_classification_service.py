@@ -0,0 +1,447 @@
+"""
+Bulk column classification through provider batch APIs for non-interactive scans
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from core.config import settings
+from core.exceptions import AIServiceError
+from core.metrics import CLASSIFICATION_BATCH_ITEMS, CLASSIFICATION_TIER_DECISIONS
+from services.classification_service import (
+    AIProvider, ClassificationOptions, ClassificationResult, EnhancedClassificationService
+)
+from services.job_service import ProgressCallback
+from services.knowledge_base import knowledge_key
+from services.neighbour_index import neighbour_scope
+from services.token_budget import estimate_tokens
+from utils.fingerprint import column_shape_fingerprint
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_BATCHES_URL = "https://api.anthropic.com/v1/messages/batches"
+OPENAI_API_URL = "https://api.openai.com/v1"
+
+# OpenAI batch states after which no more results will appear
+OPENAI_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Failed status polls back off up to 2**4 poll intervals between attempts
+POLL_BACKOFF_MAX_DOUBLINGS = 4
+
+@dataclass
+class BulkItem:
+    """One column to classify; key is the caller's handle for the result, owner the user whose data it is"""
+    key: str
+    column_name: str
+    sample_values: List[Any]
+    owner: str = "system"
+
+@dataclass
+class _PreparedItem:
+    item: BulkItem
+    custom_id: str
+    prompt: str
+    patterns: List[str]
+    processed_data: Dict[str, Any]
+
+async def _no_progress(progress: int, stage: str) -> None:
+    pass
+
+class BatchClassificationService:
+    """Submits column prompts as provider batch jobs and polls them to completion
+
+    Batch endpoints trade latency (minutes to hours) for a lower price and much
+    higher throughput. Items that fail, come back malformed or fall below the
+    confidence threshold are reclassified one by one through the interactive cascade.
+    """
+
+    def __init__(self, classification_service: EnhancedClassificationService):
+        self.classification_service = classification_service
+        self.provider = AIProvider(settings.BATCH_PROVIDER)
+        if self.provider not in (AIProvider.ANTHROPIC, AIProvider.OPENAI):
+            raise ValueError(f"BATCH_PROVIDER must be anthropic or openai, not {settings.BATCH_PROVIDER}")
+        self.model = settings.BATCH_MODEL
+        self.tier = f"batch:{self.provider.value}:{self.model}"
+        self.max_requests = settings.BATCH_MAX_REQUESTS
+        self.poll_interval = settings.BATCH_POLL_INTERVAL
+        self.max_wait = settings.BATCH_MAX_WAIT
+        self.client = httpx.AsyncClient(
+            timeout=settings.AI_REQUEST_TIMEOUT, transport=classification_service.simulator
+        )
+
+    async def classify_bulk(
+        self,
+        items: List[BulkItem],
+        options: Optional[ClassificationOptions] = None,
+        report_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, ClassificationResult]:
+        """Classify many columns; returns results by item key"""
+        cs = self.classification_service
+        report_progress = report_progress or _no_progress
+        if options is None:
+            # Bulk rescans only need the decision itself
+            options = ClassificationOptions(
+                enable_ml_enhancement=False,
+                enable_explanation=False,
+                enable_recommendations=False
+            )
+
+        results: Dict[str, ClassificationResult] = {}
+
+        # Recurring columns are answered by the knowledge base or an approved neighbour, as in interactive scans
+        fingerprints = {
+            item.key: knowledge_key(
+                column_shape_fingerprint(item.column_name, item.sample_values[:options.sample_size]),
+                item.owner, options.regulation_focus, options.language
+            )
+            for item in items
+        }
+        known = await cs._lookup_knowledge(list(set(fingerprints.values())))
+        unknown = [item for item in items if fingerprints[item.key] not in known]
+        neighbours = cs._lookup_neighbours([
+            (
+                item.column_name,
+                item.sample_values[:options.sample_size],
+                neighbour_scope(item.owner, options.regulation_focus, options.language)
+            )
+            for item in unknown
+        ], options.confidence_threshold)
+        neighbours = {item.key: neighbour for item, neighbour in zip(unknown, neighbours)}
+        pending = []
+        for item in items:
+            entry = known.get(fingerprints[item.key])
+            neighbour = neighbours.get(item.key)
+            if entry:
+                CLASSIFICATION_TIER_DECISIONS.labels(tier="knowledge_base").inc()
+                results[item.key] = cs._convert_knowledge_entry(entry, item.column_name, item.sample_values, options)
+            elif neighbour:
+                CLASSIFICATION_TIER_DECISIONS.labels(tier="neighbour").inc()
+                results[item.key] = cs._convert_neighbour_entry(neighbour, item.column_name, item.sample_values, options)
+            else:
+                pending.append(item)
+
+        await report_progress(5, "preparing_prompts")
+        prepared = await asyncio.gather(*[
+            self._prepare(item, f"c{index}", options) for index, item in enumerate(pending)
+        ])
+
+        retry: List[BulkItem] = []
+        chunks = [prepared[i:i + self.max_requests] for i in range(0, len(prepared), self.max_requests)]
+        finished_chunks = 0
+
+        async def run_chunk(chunk: List[_PreparedItem]) -> Tuple[List[_PreparedItem], Dict[str, Dict[str, Any]], float]:
+            nonlocal finished_chunks
+            started = time.time()
+            outputs = await self._run_batch(
+                chunk, options, lambda stage: report_progress(10 + 75 * finished_chunks // len(chunks), stage)
+            )
+            finished_chunks += 1
+            return chunk, outputs, time.time() - started
+
+        # All chunks are submitted at once and polled side by side, so the scan waits
+        # BATCH_MAX_WAIT at most rather than once per chunk
+        await report_progress(10, f"submitting_{len(chunks)}_batches")
+        tasks = [asyncio.create_task(run_chunk(chunk)) for chunk in chunks]
+        try:
+            finished = await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed or cancelled job cancels every provider batch still running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        for chunk, outputs, elapsed in finished:
+            for prepared_item in chunk:
+                result = await self._parse_output(
+                    prepared_item, outputs.get(prepared_item.custom_id), options, elapsed / len(chunk)
+                )
+                if result is None:
+                    retry.append(prepared_item.item)
+                else:
+                    CLASSIFICATION_TIER_DECISIONS.labels(tier=self.tier).inc()
+                    results[prepared_item.item.key] = result
+
+        if retry:
+            await report_progress(85, "reclassifying_failed_items")
+            logger.info(f"Reclassifying {len(retry)} batch items through the interactive cascade")
+            semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_CLASSIFICATIONS)
+
+            async def classify_one(item: BulkItem) -> Tuple[str, ClassificationResult]:
+                async with semaphore:
+                    return item.key, await cs._classify_single_column_enhanced(
+                        item.column_name, item.sample_values, item.owner, options
+                    )
+
+            results.update(await asyncio.gather(*[classify_one(item) for item in retry]))
+
+        owners = {item.key: item.owner for item in items}
+        await cs._record_knowledge([(fingerprints[key], owners[key], result) for key, result in results.items()])
+        await report_progress(95, "classified")
+
+        return results
+
+    async def _prepare(self, item: BulkItem, custom_id: str, options: ClassificationOptions) -> _PreparedItem:
+        cs = self.classification_service
+        patterns = []
+        if options.enable_pattern_detection:
+            patterns = await cs.pattern_detector.detect_patterns(item.column_name, item.sample_values)
+        processed_data = await cs.text_processor.process_column_data(
+            item.column_name, item.sample_values, options.language
+        )
+        prompt = cs._build_enhanced_prompt(item.column_name, item.sample_values, processed_data, patterns, options)
+        return _PreparedItem(item, custom_id, prompt, patterns, processed_data)
+
+    async def _parse_output(
+        self,
+        prepared: _PreparedItem,
+        completion: Optional[Dict[str, Any]],
+        options: ClassificationOptions,
+        processing_time: float
+    ) -> Optional[ClassificationResult]:
+        """Result for one batch item, or None when it has to be reclassified"""
+        cs = self.classification_service
+        item = prepared.item
+        provider = self.provider.value
+
+        if completion is None:
+            CLASSIFICATION_BATCH_ITEMS.labels(provider=provider, outcome="errored").inc()
+            return None
+
+        try:
+            if self.provider == AIProvider.ANTHROPIC:
+                content = completion["content"][0]["text"]
+            else:
+                content = completion["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            content = None
+
+        usage = completion.get("usage") or {}
+        cs.token_budget.record_usage(
+            provider,
+            self.model,
+            usage.get("input_tokens", usage.get("prompt_tokens", estimate_tokens(prepared.prompt))),
+            usage.get("output_tokens", usage.get("completion_tokens", estimate_tokens(content or ""))),
+            batch=True
+        )
+
+        try:
+            if not isinstance(content, str):
+                raise AIServiceError("completion has no text content")
+            classification = json.loads(content)
+            classification["model"] = self.model
+            ai_result = cs._validate_ai_response(classification, item.column_name, item.sample_values)
+        except (json.JSONDecodeError, AIServiceError) as e:
+            logger.warning(f"Malformed batch output for {item.column_name}: {str(e)}")
+            CLASSIFICATION_BATCH_ITEMS.labels(provider=provider, outcome="malformed").inc()
+            return None
+
+        if ai_result["confidence_score"] < options.confidence_threshold:
+            CLASSIFICATION_BATCH_ITEMS.labels(provider=provider, outcome="low_confidence").inc()
+            return None
+
+        CLASSIFICATION_BATCH_ITEMS.labels(provider=provider, outcome="succeeded").inc()
+
+        risk_score = 0.0
+        if options.enable_risk_scoring:
+            risk_score = await cs._calculate_risk_score(ai_result, prepared.patterns, prepared.processed_data)
+
+        return ClassificationResult(
+            column_name=item.column_name,
+            classification_level=ai_result["classification_level"],
+            regulation=ai_result["regulation"],
+            justification=ai_result["justification"],
+            confidence_score=ai_result["confidence_score"],
+            risk_score=risk_score,
+            sample_values=item.sample_values[:options.sample_size],
+            patterns_detected=prepared.patterns,
+            ai_provider=provider,
+            model_used=self.model,
+            processing_time=processing_time,
+            explanation=ai_result.get("explanation"),
+            recommendations=ai_result.get("recommendations", []),
+            compliance_notes=ai_result.get("compliance_notes", []),
+            decided_by_tier=self.tier
+        )
+
+    # Provider batch lifecycle
+    async def _run_batch(
+        self,
+        chunk: List[_PreparedItem],
+        options: ClassificationOptions,
+        report_stage: Callable[[str], Awaitable[None]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Submit one batch and wait for it; returns completions by custom_id
+
+        Unfinished batches are cancelled after BATCH_MAX_WAIT (or when the job is
+        cancelled); whatever finished by then is still used. Failed status polls are
+        retried until then.
+        """
+        max_tokens = self.classification_service._max_output_tokens(
+            self.classification_service._response_fields(options)
+        )
+        try:
+            batch_id = await self._submit(chunk, max_tokens)
+        except Exception as e:
+            logger.error(f"Batch submission of {len(chunk)} items failed: {str(e)}")
+            return {}
+
+        logger.info(f"Submitted {self.provider.value} batch {batch_id} with {len(chunk)} items")
+        deadline = time.monotonic() + self.max_wait
+        failed_polls = 0
+        try:
+            while True:
+                try:
+                    status = await self._status(batch_id)
+                except Exception as e:
+                    # The batch keeps running on the provider side, so a failed poll
+                    # (5xx, 429, network error) is retried with backoff until the deadline
+                    if time.monotonic() >= deadline:
+                        raise
+                    failed_polls += 1
+                    delay = min(
+                        self.poll_interval * 2 ** min(failed_polls, POLL_BACKOFF_MAX_DOUBLINGS),
+                        deadline - time.monotonic()
+                    )
+                    logger.warning(
+                        f"Polling batch {batch_id} failed ({failed_polls} in a row), "
+                        f"retrying in {delay:.0f}s: {str(e)}"
+                    )
+                    await asyncio.sleep(max(0.0, delay))
+                    continue
+                failed_polls = 0
+                if self._is_finished(status):
+                    break
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Batch {batch_id} did not finish in {self.max_wait}s, cancelling")
+                    status = await self._cancel(batch_id)
+                    break
+                await report_stage(f"waiting_for_batch_{batch_id}")
+                await asyncio.sleep(self.poll_interval)
+        except BaseException:
+            await self._cancel(batch_id)
+            raise
+
+        try:
+            return await self._fetch_results(status)
+        except Exception as e:
+            logger.error(f"Fetching results of batch {batch_id} failed: {str(e)}")
+            return {}
+
+    async def _submit(self, chunk: List[_PreparedItem], max_tokens: int) -> str:
+        headers = self._headers()
+
+        if self.provider == AIProvider.ANTHROPIC:
+            response = await self.client.post(ANTHROPIC_BATCHES_URL, headers=headers, json={
+                "requests": [
+                    {
+                        "custom_id": prepared.custom_id,
+                        "params": {
+                            "model": self.model,
+                            "max_tokens": max_tokens,
+                            "messages": [{"role": "user", "content": prepared.prompt}],
+                            "temperature": 0.1
+                        }
+                    }
+                    for prepared in chunk
+                ]
+            })
+            return self._json(response)["id"]
+
+        # OpenAI: upload the requests as a JSONL file, then create a batch over it
+        lines = "\n".join(
+            json.dumps({
+                "custom_id": prepared.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": prepared.prompt}],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0.1,
+                    "max_tokens": max_tokens
+                }
+            })
+            for prepared in chunk
+        )
+        upload = await self.client.post(
+            f"{OPENAI_API_URL}/files",
+            headers=headers,
+            data={"purpose": "batch"},
+            files={"file": ("classification_batch.jsonl", lines.encode("utf-8"), "application/jsonl")}
+        )
+        response = await self.client.post(f"{OPENAI_API_URL}/batches", headers=headers, json={
+            "input_file_id": self._json(upload)["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h"
+        })
+        return self._json(response)["id"]
+
+    async def _status(self, batch_id: str) -> Dict[str, Any]:
+        if self.provider == AIProvider.ANTHROPIC:
+            url = f"{ANTHROPIC_BATCHES_URL}/{batch_id}"
+        else:
+            url = f"{OPENAI_API_URL}/batches/{batch_id}"
+        return self._json(await self.client.get(url, headers=self._headers()))
+
+    async def _cancel(self, batch_id: str) -> Dict[str, Any]:
+        if self.provider == AIProvider.ANTHROPIC:
+            url = f"{ANTHROPIC_BATCHES_URL}/{batch_id}/cancel"
+        else:
+            url = f"{OPENAI_API_URL}/batches/{batch_id}/cancel"
+        try:
+            return self._json(await self.client.post(url, headers=self._headers()))
+        except Exception as e:
+            logger.warning(f"Cancelling batch {batch_id} failed: {str(e)}")
+            return {}
+
+    def _is_finished(self, status: Dict[str, Any]) -> bool:
+        if self.provider == AIProvider.ANTHROPIC:
+            return status.get("processing_status") == "ended"
+        return status.get("status") in OPENAI_FINAL_STATUSES
+
+    async def _fetch_results(self, status: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Successful completions by custom_id; errored, expired and cancelled items are left out"""
+        outputs = {}
+
+        if self.provider == AIProvider.ANTHROPIC:
+            if not status.get("results_url"):
+                return outputs
+            response = await self.client.get(status["results_url"], headers=self._headers())
+            for line in self._jsonl(response):
+                if line["result"]["type"] == "succeeded":
+                    outputs[line["custom_id"]] = line["result"]["message"]
+            return outputs
+
+        if not status.get("output_file_id"):
+            return outputs
+        response = await self.client.get(
+            f"{OPENAI_API_URL}/files/{status['output_file_id']}/content", headers=self._headers()
+        )
+        for line in self._jsonl(response):
+            result = line.get("response") or {}
+            if not line.get("error") and result.get("status_code") == 200:
+                outputs[line["custom_id"]] = result["body"]
+        return outputs
+
+    def _headers(self) -> Dict[str, str]:
+        return self.classification_service.model_configs[self.provider]["headers"]()
+
+    def _json(self, response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise AIServiceError(f"Batch API error: {response.status_code} - {response.text}")
+        return response.json()
+
+    def _jsonl(self, response: httpx.Response) -> List[Dict[str, Any]]:
+        if response.status_code != 200:
+            raise AIServiceError(f"Batch API error: {response.status_code} - {response.text}")
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    async def close(self) -> None:
+        await self.client.aclose()
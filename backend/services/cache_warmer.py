@@ -0,0 +1,103 @@
+"""
+Startup cache warming for recently active users
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+
+from core.cache import CacheManager
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.models import User, CustomRule
+from services.knowledge_base import KnowledgeBaseService
+from services.rules_engine import compile_rule_patterns, rule_set_cache_key
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmer:
+    """Preloads what the first requests after a deploy would otherwise fetch one by one
+
+    Three phases run within CACHE_WARM_BUDGET seconds:
+    - the principals of users who logged in recently go into the user cache
+    - their active custom rule sets go into the rule-set cache, and the rule
+      patterns are compiled in this process
+    - the most-hit knowledge base entries are loaded into this process
+    Shared Redis entries are written by one worker per deploy, and rule sets only
+    where no entry exists yet. Per-process state is warmed by every worker.
+    """
+
+    def __init__(self, cache_manager: CacheManager, knowledge_base: KnowledgeBaseService, rules_engine=None):
+        self.cache_manager = cache_manager
+        self.knowledge_base = knowledge_base
+        self.rules_engine = rules_engine
+
+    async def warm(self) -> Dict[str, Any]:
+        """Run every phase; stops at the budget and never raises"""
+        started = time.monotonic()
+        summary: Dict[str, Any] = {"users": 0, "rule_sets": 0, "patterns": 0, "knowledge_entries": 0}
+        try:
+            await asyncio.wait_for(self._warm(summary), timeout=settings.CACHE_WARM_BUDGET)
+        except asyncio.TimeoutError:
+            summary["timed_out"] = True
+            logger.warning(f"Cache warming stopped after its {settings.CACHE_WARM_BUDGET}s budget")
+        except Exception as e:
+            summary["error"] = str(e)
+            logger.warning(f"Cache warming failed: {str(e)}")
+
+        summary["duration_seconds"] = round(time.monotonic() - started, 2)
+        logger.info(f"Cache warming finished: {summary}")
+        return summary
+
+    async def _warm(self, summary: Dict[str, Any]) -> None:
+        # The knowledge base has its own engine, so it loads while users and rules are fetched
+        await asyncio.gather(self._warm_users_and_rules(summary), self._warm_knowledge(summary))
+
+    async def _warm_users_and_rules(self, summary: Dict[str, Any]) -> None:
+        since = datetime.utcnow() - timedelta(days=settings.CACHE_WARM_ACTIVE_DAYS)
+        async with AsyncSessionLocal() as db:
+            users = (await db.execute(
+                select(User)
+                .where(User.is_active == True, User.last_login >= since)
+                .order_by(User.last_login.desc())
+                .limit(settings.CACHE_WARM_MAX_USERS)
+            )).scalars().all()
+            rules = (await db.execute(
+                select(CustomRule).where(
+                    CustomRule.user_id.in_([user.id for user in users]),
+                    CustomRule.is_active == True
+                )
+            )).scalars().all() if users else []
+
+        rule_sets: Dict[str, List[CustomRule]] = {user.id: [] for user in users}
+        for rule in rules:
+            rule_sets[rule.user_id].append(rule)
+
+        # Patterns are compiled per process; built-in rules first, since every upload uses them
+        patterns = [rule["pattern"] for rule in getattr(self.rules_engine, "built_in_rules", [])]
+        patterns += list(dict.fromkeys(rule.pattern for rule in rules))
+        summary["patterns"] = compile_rule_patterns(patterns)
+
+        if not users or not await self._claim_shared_warming():
+            return
+        await asyncio.gather(*[self.cache_manager.set_user(user.id, user) for user in users])
+        summary["users"] = len(users)
+        primed = await asyncio.gather(*[
+            self.cache_manager.prime(rule_set_cache_key(user_id), user_rules, expire=settings.RULE_SET_CACHE_TTL, stale_ttl=0)
+            for user_id, user_rules in rule_sets.items()
+        ])
+        summary["rule_sets"] = sum(1 for written in primed if written)
+
+    async def _claim_shared_warming(self) -> bool:
+        # One worker per deploy writes the shared entries; in degraded mode the claim is per process
+        return await self.cache_manager.set(
+            "cache_warm:shared", str(uuid.uuid4()), expire=settings.CACHE_WARM_BUDGET, nx=True
+        )
+
+    async def _warm_knowledge(self, summary: Dict[str, Any]) -> None:
+        summary["knowledge_entries"] = await self.knowledge_base.preload_hot(settings.CACHE_WARM_MAX_FINGERPRINTS)
@@ -0,0 +1,126 @@
+"""
+Scheduled reclassification of the data catalog through provider batch APIs
+"""
+
+import asyncio
+import logging
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import DataSource, ClassificationResult
+from core.security import decrypt_sensitive_data
+from services.batch_classification_service import BatchClassificationService, BulkItem
+from services.job_service import ProgressCallback
+from services.persistence_service import ClassificationPersistenceService
+
+logger = logging.getLogger(__name__)
+
+async def _no_progress(progress: int, stage: str) -> None:
+    pass
+
+class CatalogRescanService:
+    """Reclassifies stale data sources from the samples stored with their latest results
+
+    Uploaded files are deleted an hour after classification, so a rescan works from
+    the encrypted samples in ClassificationResult. Approved and rule-decided columns
+    are left alone; everything else goes through one bulk batch classification and
+    the new results are appended to each data source. Columns that only got a
+    fallback result keep their previous classification.
+    """
+
+    def __init__(
+        self,
+        batch_service: BatchClassificationService,
+        persistence_service: ClassificationPersistenceService
+    ):
+        self.batch_service = batch_service
+        self.persistence_service = persistence_service
+
+    async def rescan(self, db: AsyncSession, report_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Rescan up to BATCH_RESCAN_MAX_SOURCES data sources not scanned within the interval"""
+        report_progress = report_progress or _no_progress
+        started = datetime.utcnow()
+        cutoff = started - timedelta(hours=settings.BATCH_RESCAN_INTERVAL_HOURS)
+        scanned_at = func.coalesce(DataSource.last_scanned, DataSource.created_at)
+
+        sources = (await db.execute(
+            select(DataSource)
+            .where(scanned_at < cutoff)
+            .order_by(scanned_at)
+            .limit(settings.BATCH_RESCAN_MAX_SOURCES)
+        )).scalars().all()
+
+        summary = {
+            "data_sources": len(sources), "columns": 0, "skipped": 0, "changed": 0, "failed": 0,
+            "decided_by_tier": {}
+        }
+        if not sources:
+            return summary
+
+        # Latest result per column of each source
+        rows = (await db.execute(
+            select(ClassificationResult)
+            .where(ClassificationResult.data_source_id.in_([source.id for source in sources]))
+            .order_by(ClassificationResult.created_at.desc(), ClassificationResult.id.desc())
+        )).scalars().all()
+        latest: Dict[str, ClassificationResult] = {}
+        for row in rows:
+            latest.setdefault(f"{row.data_source_id}:{row.column_name}", row)
+
+        to_rescan = {}
+        for key, row in latest.items():
+            if row.is_approved or row.decided_by_tier == "rules":
+                summary["skipped"] += 1
+            else:
+                to_rescan[key] = row
+
+        await report_progress(2, "loading_samples")
+        samples = await asyncio.to_thread(self._decrypt_batch, [row.sample_values for row in to_rescan.values()])
+        items = [
+            BulkItem(key=key, column_name=row.column_name, sample_values=sample_values, owner=row.user_id)
+            for (key, row), sample_values in zip(to_rescan.items(), samples)
+        ]
+
+        results = await self.batch_service.classify_bulk(items, report_progress=report_progress)
+
+        await report_progress(97, "persisting")
+        by_source: Dict[int, List[Dict[str, Any]]] = {source.id: [] for source in sources}
+        for key, result in results.items():
+            # A fallback means the column could not be classified; its previous result stays current
+            if result.decided_by_tier == "fallback":
+                summary["failed"] += 1
+                continue
+            previous = to_rescan[key]
+            by_source[previous.data_source_id].append(asdict(result))
+            if result.classification_level != previous.classification_level:
+                summary["changed"] += 1
+            tiers = summary["decided_by_tier"]
+            tiers[result.decided_by_tier] = tiers.get(result.decided_by_tier, 0) + 1
+
+        for source in sources:
+            summary["columns"] += await self.persistence_service.append_results(
+                db, source, by_source[source.id], source.user_id
+            )
+
+        summary["duration_seconds"] = round((datetime.utcnow() - started).total_seconds(), 1)
+        logger.info(
+            f"Rescanned {summary['columns']} columns in {len(sources)} data sources, "
+            f"{summary['changed']} changed level, {summary['failed']} failed"
+        )
+        return summary
+
+    def _decrypt_batch(self, encrypted_samples: List[Any]) -> List[List[Any]]:
+        """Decrypt stored sample values; unreadable samples become empty lists"""
+        decrypted = []
+        for encrypted in encrypted_samples:
+            try:
+                samples = decrypt_sensitive_data(encrypted) if encrypted else []
+            except Exception:
+                samples = []
+            decrypted.append(samples if isinstance(samples, list) else [samples])
+        return decrypted
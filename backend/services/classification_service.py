@@ -9,15 +9,27 @@ import logging
 import time
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 
 from core.config import settings
 from core.cache import CacheManager
 from core.exceptions import ClassificationError, AIServiceError
+from core.metrics import (
+    CLASSIFICATION_TIER_DECISIONS, CLASSIFICATION_TIER_ESCALATIONS, CLASSIFICATION_TIER_DURATION
+)
+from core.tracing import traced_provider_call
 from services.ml_service import MLClassificationService
+from services.local_classifier import LocalColumnClassifier, MODEL_NAME as LOCAL_MODEL_NAME
+from services.knowledge_base import KnowledgeBaseService, knowledge_key
+from services.neighbour_index import ColumnNeighbourIndex, neighbour_scope
+from services.provider_simulator import SimulatedProviderTransport
+from services.token_budget import (
+    TokenBudgetService, UploadTokenBudget, estimate_tokens, format_sample_values, truncate_value
+)
 from utils.text_processing import TextProcessor
 from utils.pattern_detection import PatternDetector
+from utils.fingerprint import column_fingerprint, column_shape_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +44,7 @@ class ClassificationOptions:
     """Enhanced classification options"""
     ai_provider: AIProvider = AIProvider.OPENROUTER
     model_name: Optional[str] = None
-    confidence_threshold: float = 0.7
+    confidence_threshold: float = settings.CONFIDENCE_THRESHOLD
     enable_ml_enhancement: bool = True
     enable_pattern_detection: bool = True
     sample_size: int = 10
@@ -41,6 +53,7 @@ class ClassificationOptions:
     custom_rules_only: bool = False
     enable_explanation: bool = True
     enable_risk_scoring: bool = True
+    enable_recommendations: bool = True
 
 @dataclass
 class ClassificationResult:
@@ -59,21 +72,58 @@ class ClassificationResult:
     explanation: Optional[str] = None
     recommendations: List[str] = None
     compliance_notes: List[str] = None
+    decided_by_tier: Optional[str] = None
+    neighbour: Optional[Dict[str, Any]] = None  # approved column the result was inherited from
+
+# Response schema fields: (name, example value, output-token allowance)
+CORE_RESPONSE_FIELDS = [
+    ("classification_level", '"Top Secret|Confidential|Internal|Public"', 8),
+    ("regulation", '"NDMO|PDPL|GDPR|NCA|DAMA|CCPA|HIPAA"', 6),
+    ("justification", '"One or two sentences citing the regulation article"', 70),
+    ("confidence_score", "0.95", 5),
+]
+EXPLANATION_RESPONSE_FIELDS = [
+    ("patterns_identified", '["pattern1", "pattern2"]', 40),
+    ("explanation", '"Step-by-step reasoning for the classification decision"', 250),
+]
+RISK_RESPONSE_FIELDS = [
+    ("risk_score", "0.85", 5),
+]
+RECOMMENDATION_RESPONSE_FIELDS = [
+    ("compliance_requirements", '["requirement1", "requirement2"]', 80),
+    ("recommendations", '["recommendation1", "recommendation2"]', 80),
+    ("compliance_notes", '["note1", "note2"]', 80),
+    ("data_handling_requirements", '["requirement1", "requirement2"]', 80),
+]
+RESPONSE_FIELD_OVERHEAD = 8  # key, quotes and separators per field
+RESPONSE_TOKEN_SLACK = 32
 
 class EnhancedClassificationService:
     """Enhanced classification service with multiple AI providers and advanced features"""
     
-    def __init__(self):
-        self.cache_manager = CacheManager()
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.cache_manager = cache_manager or CacheManager()
+        self.token_budget = TokenBudgetService(self.cache_manager)
+        self.singleflight = self.cache_manager.singleflight
+        self.knowledge_base = KnowledgeBaseService()
+        self.neighbour_index = ColumnNeighbourIndex()
+        self.neighbour_index.load()
         self.ml_service = MLClassificationService()
         self.text_processor = TextProcessor()
         self.pattern_detector = PatternDetector()
+        self.local_classifier = LocalColumnClassifier()
+        self.local_classifier.load()
+        
+        # Initialize AI clients; test mode routes every provider to the offline simulator
+        self.simulator = None
+        if settings.MOCK_AI_RESPONSES or settings.ENABLE_TEST_MODE:
+            self.simulator = SimulatedProviderTransport()
+            logger.warning("AI providers are simulated; no external API calls will be made")
         
-        # Initialize AI clients
         self.clients = {
-            AIProvider.OPENROUTER: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT),
-            AIProvider.ANTHROPIC: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT),
-            AIProvider.OPENAI: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT),
+            AIProvider.OPENROUTER: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT, transport=self.simulator),
+            AIProvider.ANTHROPIC: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT, transport=self.simulator),
+            AIProvider.OPENAI: httpx.AsyncClient(timeout=settings.AI_REQUEST_TIMEOUT, transport=self.simulator),
         }
         
         # Rate limiting
@@ -101,8 +151,15 @@ class EnhancedClassificationService:
                 "url": "https://api.openai.com/v1/chat/completions",
                 "models": ["gpt-4-turbo", "gpt-4", "gpt-3.5-turbo"],
                 "headers": lambda: {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
+            },
+            AIProvider.LOCAL_MODEL: {
+                "url": None,
+                "models": [LOCAL_MODEL_NAME],
+                "headers": lambda: {}
             }
         }
+        
+        self.cascade_tiers = self._parse_cascade(settings.CLASSIFICATION_CASCADE)
     
     async def classify_columns_enhanced(
         self,
@@ -118,48 +175,114 @@ class EnhancedClassificationService:
         
         results = []
         start_time = time.time()
+        budget = self.token_budget.for_upload(user_id)
+        
+        rules_tier_enabled = any(tier == "rules" for tier, _, _ in self.cascade_tiers)
+        
+        # Columns with the same fingerprint (and rule match) are classified once
+        representatives: Dict[Tuple[str, Optional[str]], str] = {}
+        duplicates: Dict[str, str] = {}
+        column_items = []
+        for column_name, sample_values in columns_data.items():
+            rule_match = pre_classified.get(column_name) if rules_tier_enabled else None
+            group = (
+                column_fingerprint(column_name, sample_values[:options.sample_size]),
+                rule_match.get("rule_applied") if rule_match else None
+            )
+            if group in representatives:
+                duplicates[column_name] = representatives[group]
+            else:
+                representatives[group] = column_name
+                column_items.append((column_name, sample_values))
+        
+        # Recurring columns are answered by the knowledge base without any provider call;
+        # an explicitly requested model always runs
+        kb_fingerprints = {
+            column_name: knowledge_key(
+                column_shape_fingerprint(column_name, sample_values[:options.sample_size]),
+                user_id, options.regulation_focus, options.language
+            )
+            for column_name, sample_values in column_items
+        }
+        known = {}
+        neighbours = {}
+        if not options.model_name:
+            known = await self._lookup_knowledge(list(set(kb_fingerprints.values())))
+            # Columns close enough to an approved column inherit its classification
+            scope = neighbour_scope(user_id, options.regulation_focus, options.language)
+            unknown = [
+                (column_name, sample_values[:options.sample_size], scope)
+                for column_name, sample_values in column_items
+                if kb_fingerprints[column_name] not in known
+            ]
+            neighbours = dict(zip(
+                [name for name, _, _ in unknown], self._lookup_neighbours(unknown, options.confidence_threshold)
+            ))
         
         # Process columns in batches for better performance
         batch_size = min(10, settings.MAX_CONCURRENT_CLASSIFICATIONS)
-        column_items = list(columns_data.items())
         
         for i in range(0, len(column_items), batch_size):
             batch = column_items[i:i + batch_size]
             batch_tasks = []
+            batch_columns = []
             
             for column_name, sample_values in batch:
-                # Skip if already classified by rules
-                if column_name in pre_classified:
-                    result = self._convert_pre_classified_result(
-                        pre_classified[column_name], options
-                    )
+                rule_match = pre_classified.get(column_name) if rules_tier_enabled else None
+                
+                # Confident rule matches end the cascade at the first tier
+                if rule_match and rule_match.get("confidence_score", 0.95) >= options.confidence_threshold:
+                    result = self._convert_pre_classified_result(rule_match, options)
+                    CLASSIFICATION_TIER_DECISIONS.labels(tier="rules").inc()
                     results.append(result)
                     continue
                 
+                if rule_match:
+                    CLASSIFICATION_TIER_ESCALATIONS.labels(tier="rules").inc()
+                
+                entry = known.get(kb_fingerprints[column_name])
+                if entry:
+                    CLASSIFICATION_TIER_DECISIONS.labels(tier="knowledge_base").inc()
+                    results.append(self._convert_knowledge_entry(entry, column_name, sample_values, options))
+                    continue
+                
+                neighbour = neighbours.get(column_name)
+                if neighbour:
+                    CLASSIFICATION_TIER_DECISIONS.labels(tier="neighbour").inc()
+                    results.append(self._convert_neighbour_entry(neighbour, column_name, sample_values, options))
+                    continue
+                
                 # Create classification task
                 task = self._classify_single_column_enhanced(
-                    column_name, sample_values, user_id, options
+                    column_name, sample_values, user_id, options, rule_match, budget
                 )
                 batch_tasks.append(task)
+                batch_columns.append((column_name, sample_values))
             
             # Execute batch
             if batch_tasks:
                 batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
                 
-                for result in batch_results:
+                for (column_name, sample_values), result in zip(batch_columns, batch_results):
                     if isinstance(result, Exception):
                         logger.error(f"Classification error: {result}")
                         # Add fallback result
                         results.append(self._create_fallback_result(
-                            column_items[len(results)][0], 
-                            column_items[len(results)][1], 
-                            options
+                            column_name, sample_values, options
                         ))
                     else:
                         results.append(result)
         
+        await self._record_knowledge([
+            (kb_fingerprints[result.column_name], user_id, result)
+            for result in results if result.column_name in kb_fingerprints
+        ])
+        
+        if duplicates:
+            results = self._expand_duplicates(results, columns_data, duplicates, options)
+        
         total_time = time.time() - start_time
-        logger.info(f"Classified {len(results)} columns in {total_time:.2f}s")
+        logger.info(f"Classified {len(results)} columns in {total_time:.2f}s using {budget.used} AI tokens")
         
         # ML enhancement if enabled
         if options.enable_ml_enhancement and settings.ENABLE_ML_ENHANCEMENT:
@@ -172,69 +295,156 @@ class EnhancedClassificationService:
         column_name: str,
         sample_values: List[Any],
         user_id: str,
-        options: ClassificationOptions
+        options: ClassificationOptions,
+        rule_match: Optional[Dict[str, Any]] = None,
+        budget: Optional[UploadTokenBudget] = None
     ) -> ClassificationResult:
         """Classify a single column with enhanced AI analysis"""
         
-        start_time = time.time()
-        
         try:
-            # Check cache first
-            cache_key = self._generate_cache_key(column_name, sample_values, options)
-            cached_result = await self.cache_manager.get(cache_key)
-            if cached_result:
-                return cached_result
+            # Hot keys are refreshed ahead of expiry, and identical classifications in
+            # flight here or on another worker share one result
+            cache_key = self._generate_cache_key(column_name, sample_values, options, rule_match)
+            computed = False
             
-            # Pattern detection
-            detected_patterns = []
-            if options.enable_pattern_detection:
-                detected_patterns = await self.pattern_detector.detect_patterns(
-                    column_name, sample_values
-                )
+            async def compute() -> ClassificationResult:
+                nonlocal computed
+                computed = True
+                return await self._classify_uncached(column_name, sample_values, options, rule_match, budget)
             
-            # Text processing and feature extraction
-            processed_data = await self.text_processor.process_column_data(
-                column_name, sample_values, options.language
-            )
+            result = await self.cache_manager.get_or_compute(cache_key, compute, expire=3600)
+            if not computed:
+                CLASSIFICATION_TIER_DECISIONS.labels(tier="cache").inc()
+            return result
             
-            # AI classification with fallback providers
+        except Exception as e:
+            logger.error(f"Enhanced classification failed for {column_name}: {str(e)}")
+            return self._create_fallback_result(column_name, sample_values, options)
+    
+    async def _classify_uncached(
+        self,
+        column_name: str,
+        sample_values: List[Any],
+        options: ClassificationOptions,
+        rule_match: Optional[Dict[str, Any]],
+        budget: Optional[UploadTokenBudget]
+    ) -> ClassificationResult:
+        """Run detection and the provider cascade for one column"""
+        
+        start_time = time.time()
+        
+        # Pattern detection
+        detected_patterns = []
+        if options.enable_pattern_detection:
+            detected_patterns = await self.pattern_detector.detect_patterns(
+                column_name, sample_values
+            )
+        
+        # Text processing and feature extraction
+        processed_data = await self.text_processor.process_column_data(
+            column_name, sample_values, options.language
+        )
+        
+        # An explicitly requested model bypasses the cascade
+        if options.model_name:
             ai_result = await self._classify_with_ai_fallback(
-                column_name, sample_values, processed_data, detected_patterns, options
+                column_name, sample_values, processed_data, detected_patterns, options, budget
             )
-            
-            # Risk scoring
-            risk_score = 0.0
-            if options.enable_risk_scoring:
-                risk_score = await self._calculate_risk_score(
-                    ai_result, detected_patterns, processed_data
-                )
-            
-            # Create enhanced result
-            result = ClassificationResult(
-                column_name=column_name,
-                classification_level=ai_result["classification_level"],
-                regulation=ai_result["regulation"],
-                justification=ai_result["justification"],
-                confidence_score=ai_result["confidence_score"],
-                risk_score=risk_score,
-                sample_values=sample_values[:options.sample_size],
-                patterns_detected=detected_patterns,
-                ai_provider=ai_result["provider"],
-                model_used=ai_result["model"],
-                processing_time=time.time() - start_time,
-                explanation=ai_result.get("explanation"),
-                recommendations=ai_result.get("recommendations", []),
-                compliance_notes=ai_result.get("compliance_notes", [])
+        else:
+            ai_result = await self._classify_with_cascade(
+                column_name, sample_values, processed_data, detected_patterns, options, rule_match, budget
+            )
+        
+        # Risk scoring
+        risk_score = 0.0
+        if options.enable_risk_scoring:
+            risk_score = await self._calculate_risk_score(
+                ai_result, detected_patterns, processed_data
             )
+        
+        # Create enhanced result
+        result = ClassificationResult(
+            column_name=column_name,
+            classification_level=ai_result["classification_level"],
+            regulation=ai_result["regulation"],
+            justification=ai_result["justification"],
+            confidence_score=ai_result["confidence_score"],
+            risk_score=risk_score,
+            sample_values=sample_values[:options.sample_size],
+            patterns_detected=detected_patterns,
+            ai_provider=ai_result["provider"],
+            model_used=ai_result["model"],
+            processing_time=time.time() - start_time,
+            explanation=ai_result.get("explanation"),
+            recommendations=ai_result.get("recommendations", []),
+            compliance_notes=ai_result.get("compliance_notes", []),
+            decided_by_tier=ai_result.get("decided_by_tier", ai_result["provider"])
+        )
+        
+        return result
+    
+    async def _classify_with_cascade(
+        self,
+        column_name: str,
+        sample_values: List[Any],
+        processed_data: Dict[str, Any],
+        detected_patterns: List[str],
+        options: ClassificationOptions,
+        rule_match: Optional[Dict[str, Any]] = None,
+        budget: Optional[UploadTokenBudget] = None
+    ) -> Dict[str, Any]:
+        """Try cheaper tiers first and escalate only while confidence is below threshold
+        
+        If no tier is confident enough, the answer of the last tier that responded wins.
+        """
+        
+        decided = None
+        if rule_match:
+            decided = {
+                "classification_level": rule_match["classification_level"],
+                "regulation": rule_match["regulation"],
+                "justification": rule_match["justification"],
+                "confidence_score": rule_match.get("confidence_score", 0.95),
+                "explanation": f"Matched custom rule: {rule_match.get('rule_applied', 'unknown')}",
+                "provider": "rules_engine",
+                "model": rule_match.get("rule_applied", "custom_rule"),
+                "decided_by_tier": "rules"
+            }
+        
+        for tier, provider, model in self.cascade_tiers:
+            if provider is None:
+                continue  # rule matches are resolved before the cascade
             
-            # Cache result
-            await self.cache_manager.set(cache_key, result, expire=3600)
+            start_time = time.time()
+            try:
+                async with self.rate_limits[provider]:
+                    result = await self._call_ai_provider(
+                        provider, column_name, sample_values,
+                        processed_data, detected_patterns, options, model, budget
+                    )
+            except Exception as e:
+                logger.warning(f"Cascade tier {tier} failed for {column_name}: {str(e)}")
+                continue
+            finally:
+                CLASSIFICATION_TIER_DURATION.labels(tier=tier).observe(time.time() - start_time)
             
-            return result
+            result["provider"] = provider.value
+            result["decided_by_tier"] = tier
+            decided = result
             
-        except Exception as e:
-            logger.error(f"Enhanced classification failed for {column_name}: {str(e)}")
-            return self._create_fallback_result(column_name, sample_values, options)
+            if result["confidence_score"] >= options.confidence_threshold:
+                break
+            CLASSIFICATION_TIER_ESCALATIONS.labels(tier=tier).inc()
+        
+        if decided is None:
+            logger.error(f"All cascade tiers failed for {column_name}")
+            decided = self._create_ai_fallback_result(
+                column_name, sample_values, detected_patterns, options
+            )
+            decided["decided_by_tier"] = "fallback"
+        
+        CLASSIFICATION_TIER_DECISIONS.labels(tier=decided["decided_by_tier"]).inc()
+        return decided
     
     async def _classify_with_ai_fallback(
         self,
@@ -242,7 +452,8 @@ class EnhancedClassificationService:
         sample_values: List[Any],
         processed_data: Dict[str, Any],
         detected_patterns: List[str],
-        options: ClassificationOptions
+        options: ClassificationOptions,
+        budget: Optional[UploadTokenBudget] = None
     ) -> Dict[str, Any]:
         """Classify with AI using fallback providers"""
         
@@ -261,7 +472,7 @@ class EnhancedClassificationService:
                 async with self.rate_limits[provider]:
                     result = await self._call_ai_provider(
                         provider, column_name, sample_values, 
-                        processed_data, detected_patterns, options
+                        processed_data, detected_patterns, options, budget=budget
                     )
                     result["provider"] = provider.value
                     return result
@@ -284,7 +495,9 @@ class EnhancedClassificationService:
         sample_values: List[Any],
         processed_data: Dict[str, Any],
         detected_patterns: List[str],
-        options: ClassificationOptions
+        options: ClassificationOptions,
+        model: Optional[str] = None,
+        budget: Optional[UploadTokenBudget] = None
     ) -> Dict[str, Any]:
         """Call specific AI provider for classification"""
         
@@ -301,14 +514,23 @@ class EnhancedClassificationService:
             column_name, sample_values, processed_data, detected_patterns, options
         )
         
-        # Select best model for provider
-        model = options.model_name or config["models"][0]
+        # Cascade tiers pin a model; otherwise use the requested or the provider's best model
+        model = model or options.model_name or config["models"][0]
+        
+        # Output tokens dominate latency, so cap them at what the requested fields need
+        max_tokens = self._max_output_tokens(self._response_fields(options))
+        
+        # Reserve the worst case up front; settled against reported usage below
+        input_estimate = estimate_tokens(prompt)
+        reserved = input_estimate + max_tokens
+        if budget is not None:
+            await budget.reserve(reserved)
         
         # Prepare request
         if provider == AIProvider.ANTHROPIC:
             payload = {
                 "model": model,
-                "max_tokens": 2000,
+                "max_tokens": max_tokens,
                 "messages": [{"role": "user", "content": prompt}],
                 "temperature": 0.1
             }
@@ -318,26 +540,41 @@ class EnhancedClassificationService:
                 "messages": [{"role": "user", "content": prompt}],
                 "response_format": {"type": "json_object"},
                 "temperature": 0.1,
-                "max_tokens": 2000
+                "max_tokens": max_tokens
             }
         
-        # Make API call
-        response = await client.post(
-            config["url"],
-            headers=config["headers"](),
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            raise AIServiceError(f"AI API error: {response.status_code} - {response.text}")
-        
-        result = response.json()
-        
-        # Parse response based on provider
-        if provider == AIProvider.ANTHROPIC:
-            content = result["content"][0]["text"]
-        else:
-            content = result["choices"][0]["message"]["content"]
+        used_tokens = 0
+        try:
+            # Make API call
+            with traced_provider_call(provider.value, model, max_tokens=max_tokens) as span:
+                response = await client.post(
+                    config["url"],
+                    headers=config["headers"](),
+                    json=payload
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                
+                if response.status_code != 200:
+                    raise AIServiceError(f"AI API error: {response.status_code} - {response.text}")
+            
+            result = response.json()
+            
+            # Parse response based on provider
+            if provider == AIProvider.ANTHROPIC:
+                content = result["content"][0]["text"]
+            else:
+                content = result["choices"][0]["message"]["content"]
+            
+            # Anthropic reports input/output tokens, OpenAI-compatible APIs prompt/completion tokens
+            usage = result.get("usage") or {}
+            input_tokens = usage.get("input_tokens", usage.get("prompt_tokens", input_estimate))
+            output_tokens = usage.get("output_tokens", usage.get("completion_tokens", estimate_tokens(content)))
+            used_tokens = input_tokens + output_tokens
+            self.token_budget.record_usage(provider.value, model, input_tokens, output_tokens)
+            
+        finally:
+            if budget is not None:
+                await budget.settle(reserved, used_tokens)
         
         # Parse JSON response
         try:
@@ -349,6 +586,37 @@ class EnhancedClassificationService:
             logger.error(f"Failed to parse AI response: {content}")
             raise AIServiceError(f"Invalid AI response format: {str(e)}")
     
+    async def _classify_with_local_model(
+        self,
+        column_name: str,
+        sample_values: List[Any],
+        processed_data: Dict[str, Any],
+        detected_patterns: List[str],
+        options: ClassificationOptions
+    ) -> Dict[str, Any]:
+        """Classify in-process with the local n-gram model"""
+        
+        if not self.local_classifier.is_ready and not self.local_classifier.load():
+            raise AIServiceError("Local model is not trained")
+        
+        prediction = self.local_classifier.predict(column_name, sample_values[:options.sample_size])
+        alternatives = ", ".join(
+            f"{alt['label']} ({alt['probability']:.2f})" for alt in prediction["alternatives"]
+        )
+        
+        classification = {
+            "classification_level": prediction["classification_level"],
+            "regulation": prediction["regulation"],
+            "confidence_score": prediction["confidence_score"],
+            "justification": "Predicted by the local model from the column name and value shapes, "
+                             "trained on approved classifications",
+            "explanation": f"Alternatives considered: {alternatives}" if alternatives else "",
+            "patterns_identified": detected_patterns,
+            "model": LOCAL_MODEL_NAME
+        }
+        
+        return self._validate_ai_response(classification, column_name, sample_values)
+    
     def _build_enhanced_prompt(
         self,
         column_name: str,
@@ -359,8 +627,8 @@ class EnhancedClassificationService:
     ) -> str:
         """Build enhanced classification prompt with context and patterns"""
         
-        # Convert sample values to strings and limit
-        sample_str = ", ".join([str(v) for v in sample_values[:options.sample_size] if v is not None])
+        # Convert sample values to strings, truncating long free text and JSON blobs
+        sample_str, _ = format_sample_values(sample_values[:options.sample_size])
         
         # Build context information
         context_info = []
@@ -372,7 +640,8 @@ class EnhancedClassificationService:
         
         if processed_data.get("statistics"):
             stats = processed_data["statistics"]
-            context_info.append(f"Statistics: {stats}")
+            stats_str, _ = truncate_value(stats, settings.PROMPT_MAX_VALUE_CHARS * 2)
+            context_info.append(f"Statistics: {stats_str}")
         
         context_str = "\n".join(context_info) if context_info else "No additional context available."
         
@@ -386,10 +655,35 @@ class EnhancedClassificationService:
         if options.language != "en":
             language_note = f"\nNote: Data is in {options.language}. Consider cultural and linguistic context."
         
+        # Only ask for the fields the caller enabled
+        fields = self._response_fields(options)
+        field_names = {name for name, _, _ in fields}
+        response_format = "{\n" + ",\n".join(
+            f'    "{name}": {example}' for name, example, _ in fields
+        ) + "\n}"
+        
+        analysis_requirements = ["Classification: Choose the level and the single most relevant regulation"]
+        if options.enable_explanation:
+            analysis_requirements.append("Pattern Recognition: Identify data patterns (formats, structures, common values)")
+            analysis_requirements.append("Explanation: Provide clear reasoning for classification decision")
+        if options.enable_risk_scoring:
+            analysis_requirements.append("Risk Assessment: Evaluate potential risks of data exposure")
+        if options.enable_recommendations:
+            analysis_requirements.append("Compliance Mapping: Map to specific regulation articles/requirements")
+            analysis_requirements.append("Recommendations: Provide actionable security and handling recommendations")
+        requirements_str = "\n".join(
+            f"{i}. {requirement}" for i, requirement in enumerate(analysis_requirements, 1)
+        )
+        
+        list_note = ""
+        if field_names & {"patterns_identified", "compliance_requirements", "recommendations",
+                          "compliance_notes", "data_handling_requirements"}:
+            list_note = "\n- List fields hold at most 3 items of under 15 words each"
+        
         prompt = f"""
 You are a world-class data governance expert specializing in data classification according to international regulations and privacy laws.
 
-TASK: Classify the following data column with the highest accuracy and provide comprehensive analysis.
+TASK: Classify the following data column accurately.
 
 COLUMN INFORMATION:
 - Column Name: {column_name}
@@ -413,28 +707,11 @@ REGULATIONS TO CONSIDER:
 
 {regulation_guidance}
 
-ENHANCED ANALYSIS REQUIREMENTS:
-1. Pattern Recognition: Identify data patterns (formats, structures, common values)
-2. Risk Assessment: Evaluate potential risks of data exposure
-3. Compliance Mapping: Map to specific regulation articles/requirements
-4. Recommendations: Provide actionable security and handling recommendations
-5. Explanation: Provide clear reasoning for classification decision
+ANALYSIS REQUIREMENTS:
+{requirements_str}
 
-RESPONSE FORMAT (JSON only):
-{{
-    "column_name": "{column_name}",
-    "classification_level": "Top Secret|Confidential|Internal|Public",
-    "regulation": "NDMO|PDPL|GDPR|NCA|DAMA|CCPA|HIPAA",
-    "justification": "Detailed explanation referencing specific regulation articles and requirements",
-    "confidence_score": 0.95,
-    "risk_score": 0.85,
-    "patterns_identified": ["pattern1", "pattern2"],
-    "compliance_requirements": ["requirement1", "requirement2"],
-    "recommendations": ["recommendation1", "recommendation2"],
-    "explanation": "Step-by-step reasoning for the classification decision",
-    "compliance_notes": ["note1", "note2"],
-    "data_handling_requirements": ["requirement1", "requirement2"]
-}}
+RESPONSE FORMAT (JSON only, exactly these fields):
+{response_format}
 
 IMPORTANT GUIDELINES:
 - Saudi National ID (10 digits starting with 1 or 2): Top Secret, PDPL
@@ -446,12 +723,27 @@ IMPORTANT GUIDELINES:
 - IP addresses: Internal, GDPR
 - Names: Confidential, GDPR/PDPL
 - Financial data: Top Secret, PDPL/PCI-DSS
-- When in doubt, choose the more restrictive classification
-
-Analyze the column data and provide comprehensive classification:
+- When in doubt, choose the more restrictive classification{list_note}
+- Respond with the JSON object only, without any surrounding text
 """
         return prompt
     
+    def _response_fields(self, options: ClassificationOptions) -> List[Tuple[str, str, int]]:
+        """Response schema fields for the enabled options"""
+        
+        fields = list(CORE_RESPONSE_FIELDS)
+        if options.enable_explanation:
+            fields.extend(EXPLANATION_RESPONSE_FIELDS)
+        if options.enable_risk_scoring:
+            fields.extend(RISK_RESPONSE_FIELDS)
+        if options.enable_recommendations:
+            fields.extend(RECOMMENDATION_RESPONSE_FIELDS)
+        return fields
+    
+    def _max_output_tokens(self, fields: List[Tuple[str, str, int]]) -> int:
+        """Output-token limit sized to the requested response fields"""
+        return sum(budget + RESPONSE_FIELD_OVERHEAD for _, _, budget in fields) + RESPONSE_TOKEN_SLACK
+    
     def _get_regulation_guidance(self, regulation: str) -> str:
         """Get specific guidance for regulation focus"""
         
@@ -559,7 +851,7 @@ HIPAA FOCUS:
         # Pattern-based risk adjustment
         pattern_risk = 0.0
         high_risk_patterns = [
-            "national_id", "ssn", "credit_card", "iban", "biometric", 
+            "national_id", "iqama", "ssn", "credit_card", "iban", "biometric", 
             "medical", "financial", "password", "api_key"
         ]
         
@@ -573,7 +865,7 @@ HIPAA FOCUS:
             quality_risk = 0.1
         
         # Volume risk (more data = higher risk)
-        volume_risk = min(0.1, len(processed_data.get("sample_values", [])) / 1000)
+        volume_risk = min(0.1, processed_data.get("statistics", {}).get("count", 0) / 1000)
         
         # Combine risks
         total_risk = min(1.0, base_risk + pattern_risk + quality_risk + volume_risk)
@@ -624,11 +916,37 @@ HIPAA FOCUS:
             ai_provider="fallback",
             model_used="rule_based",
             processing_time=0.1,
+            decided_by_tier="fallback",
             explanation="Fallback classification using rule-based approach",
             recommendations=["Review classification manually", "Consider AI re-classification"],
             compliance_notes=["Fallback classification - manual review recommended"]
         )
     
+    def _create_ai_fallback_result(
+        self,
+        column_name: str,
+        sample_values: List[Any],
+        detected_patterns: List[str],
+        options: ClassificationOptions
+    ) -> Dict[str, Any]:
+        """Keyword-based classification in AI response form, used when no provider answers"""
+        
+        fallback = self._create_fallback_result(column_name, sample_values, options)
+        
+        return {
+            "classification_level": fallback.classification_level,
+            "regulation": fallback.regulation,
+            "justification": fallback.justification,
+            "confidence_score": fallback.confidence_score,
+            "risk_score": fallback.risk_score,
+            "patterns_identified": detected_patterns,
+            "explanation": fallback.explanation,
+            "recommendations": fallback.recommendations,
+            "compliance_notes": fallback.compliance_notes,
+            "provider": fallback.ai_provider,
+            "model": fallback.model_used
+        }
+    
     def _convert_pre_classified_result(
         self,
         pre_classified: Dict[str, Any],
@@ -650,14 +968,186 @@ HIPAA FOCUS:
             processing_time=0.01,
             explanation=f"Matched custom rule: {pre_classified.get('rule_applied', 'unknown')}",
             recommendations=pre_classified.get("recommendations", []),
-            compliance_notes=pre_classified.get("compliance_notes", [])
+            compliance_notes=pre_classified.get("compliance_notes", []),
+            decided_by_tier="rules"
         )
     
-    def _generate_cache_key(
+    async def _lookup_knowledge(self, fingerprints: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Knowledge base entries for the fingerprints; an unavailable store means no hits"""
+        try:
+            return await self.knowledge_base.lookup_many(fingerprints)
+        except Exception as e:
+            logger.warning(f"Knowledge base lookup failed: {str(e)}")
+            return {}
+    
+    async def _record_knowledge(self, fingerprinted_results: List[Tuple[str, str, ClassificationResult]]) -> None:
+        """Remember confident model decisions, by (fingerprint, owner, result), so recurring columns skip the providers next time"""
+        
+        entries = {}
+        for fingerprint, owner, result in fingerprinted_results:
+            if result.decided_by_tier in ("rules", "knowledge_base", "neighbour", "fallback"):
+                continue
+            entries[fingerprint] = {
+                "classification_level": result.classification_level,
+                "regulation": result.regulation,
+                "justification": result.justification,
+                "confidence_score": result.confidence_score,
+                "risk_score": result.risk_score,
+                "patterns_detected": result.patterns_detected,
+                "decided_by_tier": result.decided_by_tier,
+                "model_used": result.model_used,
+                "owner": owner
+            }
+        
+        try:
+            await self.knowledge_base.record_many(entries)
+        except Exception as e:
+            logger.warning(f"Failed to record knowledge base entries: {str(e)}")
+    
+    def _convert_knowledge_entry(
+        self,
+        entry: Dict[str, Any],
+        column_name: str,
+        sample_values: List[Any],
+        options: ClassificationOptions
+    ) -> ClassificationResult:
+        """Build a result from a knowledge base entry"""
+        
+        origin = "approved classification" if entry["source"] == "approved" else f"{entry['decided_by_tier']} decision"
+        
+        return ClassificationResult(
+            column_name=column_name,
+            classification_level=entry["classification_level"],
+            regulation=entry["regulation"],
+            justification=entry["justification"] or "",
+            confidence_score=entry["confidence_score"] or 0.0,
+            risk_score=entry["risk_score"] or 0.0,
+            sample_values=sample_values[:options.sample_size],
+            patterns_detected=entry["patterns_detected"] or [],
+            ai_provider="knowledge_base",
+            model_used=entry["model_used"] or "knowledge_base",
+            processing_time=0.0,
+            explanation=f"Reused {origin} from the knowledge base (version {entry['kb_version']})",
+            recommendations=[],
+            compliance_notes=[],
+            decided_by_tier="knowledge_base"
+        )
+    
+    def _lookup_neighbours(
         self,
+        columns: List[Tuple[str, List[Any], str]],
+        min_confidence: float = 0.0
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Nearest approved column for each (column_name, sample_values, neighbour_scope); an unusable index means no matches
+        
+        Neighbours whose inherited confidence falls below min_confidence are dropped,
+        so those columns go through the cascade instead.
+        """
+        if not settings.ENABLE_NEIGHBOUR_REUSE or not columns:
+            return [None] * len(columns)
+        try:
+            matches = self.neighbour_index.nearest(columns)
+        except Exception as e:
+            logger.warning(f"Neighbour index lookup failed: {str(e)}")
+            return [None] * len(columns)
+        
+        accepted = []
+        for neighbour in matches:
+            if neighbour and self._neighbour_confidence(neighbour) < min_confidence:
+                CLASSIFICATION_TIER_ESCALATIONS.labels(tier="neighbour").inc()
+                neighbour = None
+            accepted.append(neighbour)
+        return accepted
+    
+    @staticmethod
+    def _neighbour_confidence(neighbour: Dict[str, Any]) -> float:
+        # The approved confidence, discounted by how far the neighbour is
+        return (neighbour["confidence_score"] or 0.0) * (1 - neighbour["distance"])
+    
+    def _convert_neighbour_entry(
+        self,
+        neighbour: Dict[str, Any],
         column_name: str,
         sample_values: List[Any],
         options: ClassificationOptions
+    ) -> ClassificationResult:
+        """Build a result inherited from the nearest approved column"""
+        
+        return ClassificationResult(
+            column_name=column_name,
+            classification_level=neighbour["classification_level"],
+            regulation=neighbour["regulation"],
+            justification=neighbour["justification"] or "",
+            confidence_score=self._neighbour_confidence(neighbour),
+            risk_score=neighbour["risk_score"] or 0.0,
+            sample_values=sample_values[:options.sample_size],
+            patterns_detected=[],
+            ai_provider="neighbour_index",
+            model_used="approved",
+            processing_time=0.0,
+            explanation=(
+                f"Inherited from approved column '{neighbour['column_name']}' "
+                f"(result {neighbour['result_id']}, distance {neighbour['distance']:.3f})"
+            ),
+            recommendations=[],
+            compliance_notes=[],
+            decided_by_tier="neighbour",
+            neighbour={
+                "result_id": neighbour["result_id"],
+                "column_name": neighbour["column_name"],
+                "distance": neighbour["distance"]
+            }
+        )
+    
+    def _expand_duplicates(
+        self,
+        results: List[ClassificationResult],
+        columns_data: Dict[str, List[Any]],
+        duplicates: Dict[str, str],
+        options: ClassificationOptions
+    ) -> List[ClassificationResult]:
+        """Copy each representative's result to its duplicate columns, keeping column order"""
+        
+        by_column = {result.column_name: result for result in results}
+        expanded = []
+        for column_name, sample_values in columns_data.items():
+            if column_name in duplicates:
+                CLASSIFICATION_TIER_DECISIONS.labels(tier="duplicate").inc()
+                expanded.append(replace(
+                    by_column[duplicates[column_name]],
+                    column_name=column_name,
+                    sample_values=sample_values[:options.sample_size],
+                    processing_time=0.0
+                ))
+            else:
+                expanded.append(by_column[column_name])
+        return expanded
+    
+    def _parse_cascade(self, entries: List[str]) -> List[Tuple[str, Optional[AIProvider], Optional[str]]]:
+        """Parse CLASSIFICATION_CASCADE entries into (tier, provider, model)"""
+        
+        tiers = []
+        for entry in entries:
+            if entry == "rules":
+                tiers.append((entry, None, None))
+                continue
+            
+            provider_name, _, model = entry.partition(":")
+            try:
+                provider = AIProvider(provider_name)
+            except ValueError:
+                logger.warning(f"Ignoring unknown classification cascade tier: {entry}")
+                continue
+            tiers.append((entry, provider, model or None))
+        
+        return tiers
+    
+    def _generate_cache_key(
+        self,
+        column_name: str,
+        sample_values: List[Any],
+        options: ClassificationOptions,
+        rule_match: Optional[Dict[str, Any]] = None
     ) -> str:
         """Generate cache key for classification result"""
         
@@ -669,9 +1159,16 @@ HIPAA FOCUS:
         ).hexdigest()[:8]
         
         # Create options hash
-        options_str = f"{options.ai_provider.value}_{options.confidence_threshold}_{options.language}_{options.regulation_focus}"
+        options_str = (
+            f"{options.ai_provider.value}_{options.confidence_threshold}_{options.language}_{options.regulation_focus}"
+            f"_{options.enable_explanation}_{options.enable_risk_scoring}_{options.enable_recommendations}"
+        )
         options_hash = hashlib.md5(options_str.encode()).hexdigest()[:8]
         
+        # A low-confidence rule match seeds the cascade, so it is part of the result's identity
+        if rule_match:
+            options_hash += f":{rule_match.get('rule_applied', 'custom_rule')}"
+        
         return f"classification:{column_name}:{sample_hash}:{options_hash}"
     
     async def health_check(self) -> Dict[str, Any]:
@@ -0,0 +1,205 @@
+"""
+Background job tracking for asynchronous classification
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from core.config import settings
+from core.cache import CacheManager
+from core.exceptions import ValidationError
+from core.schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+class JobCancelledError(Exception):
+    """Raised inside a running job once cancellation has been requested"""
+
+class JobNotRetryableError(Exception):
+    """Raised when an attempt failed after committing work that a retry would repeat"""
+
+# Failures that will not succeed on a second attempt
+NON_RETRYABLE_ERRORS = (ValidationError, PermissionError, JobNotRetryableError)
+
+class JobRetryError(Exception):
+    """Raised when a failed job attempt should be retried"""
+
+    def __init__(self, job_id: str, attempt: int, error: Exception):
+        super().__init__(f"Job {job_id} attempt {attempt} failed: {error}")
+        self.job_id = job_id
+        self.attempt = attempt
+        self.error = error
+
+# Handler signature: (job, progress_callback) -> JSON-serializable result
+ProgressCallback = Callable[[int, str], Awaitable[None]]
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+
+class JobService:
+    """Tracks job state in the shared cache so API processes and workers see the same view"""
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.cache_manager = cache_manager or CacheManager()
+        self.max_retries = settings.JOB_MAX_RETRIES
+        self.result_ttl = settings.JOB_RESULT_TTL
+
+        # In-process worker pool used when JOB_BACKEND == "local"
+        self._local_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_CLASSIFICATIONS)
+        self._local_tasks: Set[asyncio.Task] = set()
+
+    async def create_job(self, user_id: str, job_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Register a new queued job"""
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "user_id": user_id,
+            "status": JobStatus.QUEUED.value,
+            "progress": 0,
+            "stage": "queued",
+            "attempts": 0,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None
+        }
+        await self._save(job)
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job state"""
+        return await self.cache_manager.get(self._job_key(job_id))
+
+    async def update_job(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """Update job fields"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+
+        job.update(fields)
+        job["updated_at"] = datetime.utcnow().isoformat()
+        await self._save(job)
+        return job
+
+    async def queue_length(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return int(await self.cache_manager.get(self._queued_key(), 0) or 0)
+
+    async def is_queue_full(self) -> bool:
+        """Check whether the queue has reached CLASSIFICATION_QUEUE_SIZE"""
+        return await self.queue_length() >= settings.CLASSIFICATION_QUEUE_SIZE
+
+    async def enqueue(self, job: Dict[str, Any], handler: JobHandler, celery_task=None) -> None:
+        """Hand a job to the configured backend"""
+        await self.cache_manager.increment(self._queued_key())
+
+        if settings.JOB_BACKEND == "local" or celery_task is None:
+            task = asyncio.create_task(self._run_local(job["id"], handler))
+            self._local_tasks.add(task)
+            task.add_done_callback(self._local_tasks.discard)
+        else:
+            celery_task.apply_async(args=[job["id"]], queue=settings.JOB_QUEUE_NAME)
+
+    async def cancel_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; queued jobs are cancelled immediately, running jobs at the next stage"""
+        job = await self.get_job(job_id)
+        if job is None or JobStatus(job["status"]) in FINISHED_STATUSES:
+            return job
+
+        await self.cache_manager.set(self._cancel_key(job_id), True, expire=self.result_ttl)
+
+        if job["status"] in (JobStatus.QUEUED.value, JobStatus.RETRYING.value):
+            if job["status"] == JobStatus.QUEUED.value:
+                await self.cache_manager.increment(self._queued_key(), -1)
+            return await self._finish(job_id, JobStatus.CANCELLED, stage="cancelled")
+
+        return job
+
+    async def is_cancelled(self, job_id: str) -> bool:
+        """Check if cancellation has been requested"""
+        return await self.cache_manager.exists(self._cancel_key(job_id))
+
+    async def execute(self, job_id: str, handler: JobHandler) -> Optional[Dict[str, Any]]:
+        """Run one attempt of a job, recording progress and the outcome
+
+        Raises JobRetryError when the attempt failed and retries remain.
+        """
+        job = await self.get_job(job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} not found, skipping")
+            return None
+
+        if job["status"] == JobStatus.QUEUED.value:
+            await self.cache_manager.increment(self._queued_key(), -1)
+
+        if JobStatus(job["status"]) in FINISHED_STATUSES or await self.is_cancelled(job_id):
+            if job["status"] != JobStatus.CANCELLED.value:
+                job = await self._finish(job_id, JobStatus.CANCELLED, stage="cancelled")
+            return job
+
+        attempt = job["attempts"] + 1
+        job = await self.update_job(
+            job_id, status=JobStatus.RUNNING.value, attempts=attempt, stage="started", error=None
+        )
+
+        async def report_progress(progress: int, stage: str) -> None:
+            if await self.is_cancelled(job_id):
+                raise JobCancelledError(job_id)
+            await self.update_job(job_id, progress=max(0, min(100, progress)), stage=stage)
+
+        try:
+            result = await handler(job, report_progress)
+            return await self._finish(job_id, JobStatus.COMPLETED, stage="completed", progress=100, result=result)
+
+        except JobCancelledError:
+            logger.info(f"Job {job_id} cancelled")
+            return await self._finish(job_id, JobStatus.CANCELLED, stage="cancelled")
+
+        except Exception as e:
+            if attempt <= self.max_retries and not isinstance(e, NON_RETRYABLE_ERRORS):
+                logger.warning(f"Job {job_id} attempt {attempt} failed, retrying: {str(e)}")
+                await self.update_job(job_id, status=JobStatus.RETRYING.value, stage="retrying", error=str(e))
+                raise JobRetryError(job_id, attempt, e)
+
+            logger.error(f"Job {job_id} failed after {attempt} attempts: {str(e)}")
+            return await self._finish(job_id, JobStatus.FAILED, stage="failed", error=str(e))
+
+    def retry_delay(self, attempt: int) -> int:
+        """Exponential backoff between attempts"""
+        return settings.JOB_RETRY_BACKOFF * (2 ** (attempt - 1))
+
+    async def _run_local(self, job_id: str, handler: JobHandler) -> None:
+        """In-process worker loop with retry"""
+        async with self._local_semaphore:
+            while True:
+                try:
+                    await self.execute(job_id, handler)
+                    return
+                except JobRetryError as e:
+                    await asyncio.sleep(self.retry_delay(e.attempt))
+                except Exception as e:
+                    logger.error(f"Local job runner error for {job_id}: {str(e)}")
+                    return
+
+    async def _finish(self, job_id: str, status: JobStatus, **fields) -> Optional[Dict[str, Any]]:
+        return await self.update_job(
+            job_id, status=status.value, finished_at=datetime.utcnow().isoformat(), **fields
+        )
+
+    async def _save(self, job: Dict[str, Any]) -> bool:
+        return await self.cache_manager.set(self._job_key(job["id"]), job, expire=self.result_ttl)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def _cancel_key(self, job_id: str) -> str:
+        return f"job:{job_id}:cancel"
+
+    def _queued_key(self) -> str:
+        return "jobs:queued"
@@ -0,0 +1,290 @@
+"""
+Durable classification knowledge base keyed by column fingerprints
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, create_engine, delete, inspect, select, text, update, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from core.config import settings
+from core.database import engine as default_engine
+from core.models import ClassificationKnowledge
+
+logger = logging.getLogger(__name__)
+
+SOURCE_APPROVED = "approved"
+SOURCE_HIGH_CONFIDENCE = "high_confidence"
+
+ENTRY_FIELDS = [
+    "classification_level", "regulation", "justification", "confidence_score",
+    "risk_score", "patterns_detected", "decided_by_tier", "model_used"
+]
+
+def knowledge_base_version() -> str:
+    """Current version: KNOWLEDGE_BASE_VERSION plus a hash of the cascade configuration
+
+    Changing the cascade's models retires unapproved entries automatically, as do
+    rule edits and local model retraining (see KnowledgeBaseService.invalidate);
+    bump KNOWLEDGE_BASE_VERSION for changes none of these show.
+    """
+    cascade = json.dumps(settings.CLASSIFICATION_CASCADE)
+    return f"{settings.KNOWLEDGE_BASE_VERSION}.{hashlib.sha256(cascade.encode()).hexdigest()[:8]}"
+
+def knowledge_key(
+    fingerprint: str,
+    owner: str,
+    regulation_focus: Optional[str] = None,
+    language: str = "en"
+) -> str:
+    """Store key of a column shape fingerprint for one owner and classification profile
+
+    Entries carry justifications written for one owner's data under one regulation
+    focus and language, so they are never served across owners or profiles. The
+    defaults are those of ClassificationOptions.
+    """
+    payload = json.dumps([fingerprint, owner, regulation_focus, language], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class KnowledgeBaseService:
+    """Fingerprint -> classification store in Postgres, or SQLite for local development
+
+    Approved entries are valid in every version; high-confidence model decisions
+    only in the version that produced them. Queries are synchronous and run in a
+    worker thread.
+
+    Each process keeps recently found entries in memory for KNOWLEDGE_BASE_HOT_TTL
+    seconds, and preload_hot() fills that set with the most-hit entries at startup.
+    Hits served from memory are added to hit_count with the next database lookup.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        url = settings.KNOWLEDGE_BASE_URL if url is None else url
+        if url:
+            connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+            self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        else:
+            self.engine = default_engine
+        self.table = ClassificationKnowledge.__table__
+        self.version = knowledge_base_version()
+        self.min_confidence = settings.KNOWLEDGE_BASE_MIN_CONFIDENCE
+        self._schema_ready = False
+        self._hot: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._hot_hits: Counter = Counter()
+
+    async def lookup_many(self, fingerprints: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Best entry per fingerprint, approved entries first"""
+        if not fingerprints:
+            return {}
+        found = self._lookup_hot(fingerprints)
+        missing = [fingerprint for fingerprint in dict.fromkeys(fingerprints) if fingerprint not in found]
+        if missing:
+            hot_hits, self._hot_hits = self._hot_hits, Counter()
+            loaded = await asyncio.to_thread(self._lookup_many, missing, hot_hits)
+            self._remember(loaded.values())
+            found.update(loaded)
+        return found
+
+    async def preload_hot(self, limit: Optional[int] = None) -> int:
+        """Load the most-hit entries of the current version into memory"""
+        entries = await asyncio.to_thread(self._most_hit, limit or settings.CACHE_WARM_MAX_FINGERPRINTS)
+        self._remember(entries)
+        return len(entries)
+
+    async def record_many(self, entries: Dict[str, Dict[str, Any]]) -> int:
+        """Remember high-confidence model decisions; never overwrites approved entries"""
+        entries = {
+            fingerprint: entry for fingerprint, entry in entries.items()
+            if (entry.get("confidence_score") or 0.0) >= self.min_confidence
+        }
+        if not entries:
+            return 0
+        self._forget(entries)
+        return await asyncio.to_thread(self._upsert, entries, SOURCE_HIGH_CONFIDENCE, None)
+
+    async def invalidate(self, owner: Optional[str] = None, decided_by_tier: Optional[str] = None) -> int:
+        """Retire unapproved entries of one owner (after a rule change) or one tier (after retraining)
+
+        Other workers may serve retired entries from memory for up to KNOWLEDGE_BASE_HOT_TTL.
+        """
+        if owner is None and decided_by_tier is None:
+            return 0
+        self._forget([
+            fingerprint for fingerprint, (_, entry) in list(self._hot.items())
+            if entry["source"] != SOURCE_APPROVED
+            and (owner is None or entry.get("owner") == owner)
+            and (decided_by_tier is None or entry.get("decided_by_tier") == decided_by_tier)
+        ])
+        return await asyncio.to_thread(self._delete, owner, decided_by_tier)
+
+    async def approve(self, fingerprint: str, entry: Dict[str, Any], approved_by: str) -> None:
+        """Store a human-approved classification, replacing any model decision for the fingerprint"""
+        self._forget([fingerprint])
+        await asyncio.to_thread(self._upsert, {fingerprint: entry}, SOURCE_APPROVED, approved_by)
+
+    def _lookup_hot(self, fingerprints: List[str]) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        found = {}
+        for fingerprint in fingerprints:
+            cached = self._hot.get(fingerprint)
+            if cached is None:
+                continue
+            if cached[0] <= now:
+                del self._hot[fingerprint]
+                continue
+            entry = cached[1]
+            found[fingerprint] = entry
+            self._hot_hits[(fingerprint, entry["kb_version"])] += 1
+        return found
+
+    def _remember(self, entries) -> None:
+        expires_at = time.monotonic() + settings.KNOWLEDGE_BASE_HOT_TTL
+        for entry in entries:
+            self._hot[entry["fingerprint"]] = (expires_at, entry)
+            self._hot.move_to_end(entry["fingerprint"])
+        while len(self._hot) > settings.KNOWLEDGE_BASE_HOT_SIZE:
+            self._hot.popitem(last=False)
+
+    def _forget(self, fingerprints) -> None:
+        for fingerprint in fingerprints:
+            self._hot.pop(fingerprint, None)
+
+    def _lookup_many(
+        self,
+        fingerprints: List[str],
+        hot_hits: Optional[Dict[Tuple[str, str], int]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        self._ensure_schema()
+        table = self.table
+
+        with self.engine.begin() as conn:
+            if hot_hits:
+                conn.execute(
+                    update(table)
+                    .where(table.c.fingerprint == bindparam("hit_fingerprint"), table.c.kb_version == bindparam("hit_version"))
+                    .values(hit_count=table.c.hit_count + bindparam("hits"), last_used_at=datetime.utcnow()),
+                    [
+                        {"hit_fingerprint": fingerprint, "hit_version": version, "hits": hits}
+                        for (fingerprint, version), hits in hot_hits.items()
+                    ]
+                )
+
+            rows = conn.execute(
+                select(table).where(
+                    table.c.fingerprint.in_(fingerprints),
+                    or_(table.c.kb_version == self.version, table.c.source == SOURCE_APPROVED)
+                )
+            ).mappings().all()
+
+            best: Dict[str, Dict[str, Any]] = {}
+            for row in rows:
+                current = best.get(row["fingerprint"])
+                if current is None or self._rank(row) > self._rank(current):
+                    best[row["fingerprint"]] = dict(row)
+
+            if best:
+                conn.execute(
+                    update(table)
+                    .where(tuple_(table.c.fingerprint, table.c.kb_version).in_(
+                        [(entry["fingerprint"], entry["kb_version"]) for entry in best.values()]
+                    ))
+                    .values(hit_count=table.c.hit_count + 1, last_used_at=datetime.utcnow())
+                )
+
+        return best
+
+    def _most_hit(self, limit: int) -> List[Dict[str, Any]]:
+        self._ensure_schema()
+        table = self.table
+        current = or_(table.c.kb_version == self.version, table.c.source == SOURCE_APPROVED)
+
+        with self.engine.connect() as conn:
+            fingerprints = conn.execute(
+                select(table.c.fingerprint).where(current).order_by(table.c.hit_count.desc()).limit(limit)
+            ).scalars().all()
+            # All candidates of those fingerprints, so a less-hit approved entry still wins
+            rows = conn.execute(
+                select(table).where(table.c.fingerprint.in_(set(fingerprints)), current)
+            ).mappings().all() if fingerprints else []
+
+        best: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            current_best = best.get(row["fingerprint"])
+            if current_best is None or self._rank(row) > self._rank(current_best):
+                best[row["fingerprint"]] = dict(row)
+        return list(best.values())
+
+    def _upsert(self, entries: Dict[str, Dict[str, Any]], source: str, approved_by: Optional[str]) -> int:
+        self._ensure_schema()
+        now = datetime.utcnow()
+        values = [
+            {
+                "fingerprint": fingerprint,
+                "kb_version": self.version,
+                **{field: entry.get(field) for field in ENTRY_FIELDS},
+                "owner": entry.get("owner"),
+                "source": source,
+                "approved_by": approved_by,
+                "hit_count": 0,
+                "created_at": now,
+                "updated_at": now
+            }
+            for fingerprint, entry in entries.items()
+        ]
+
+        insert = sqlite_insert if self.engine.dialect.name == "sqlite" else pg_insert
+        statement = insert(self.table).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=["fingerprint", "kb_version"],
+            set_={
+                **{field: statement.excluded[field] for field in ENTRY_FIELDS},
+                "owner": statement.excluded.owner,
+                "source": statement.excluded.source,
+                "approved_by": statement.excluded.approved_by,
+                "updated_at": statement.excluded.updated_at
+            },
+            where=None if source == SOURCE_APPROVED else self.table.c.source != SOURCE_APPROVED
+        )
+
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+
+        logger.info(f"Stored {len(values)} {source} knowledge base entries (version {self.version})")
+        return len(values)
+
+    def _delete(self, owner: Optional[str], decided_by_tier: Optional[str]) -> int:
+        self._ensure_schema()
+        table = self.table
+        statement = delete(table).where(table.c.source != SOURCE_APPROVED)
+        if owner is not None:
+            statement = statement.where(table.c.owner == owner)
+        if decided_by_tier is not None:
+            statement = statement.where(table.c.decided_by_tier == decided_by_tier)
+
+        with self.engine.begin() as conn:
+            deleted = conn.execute(statement).rowcount
+        logger.info(f"Retired {deleted} knowledge base entries (owner={owner}, tier={decided_by_tier})")
+        return deleted
+
+    def _ensure_schema(self) -> None:
+        # The main database gets the table from migrations; standalone stores create it on first use
+        if not self._schema_ready:
+            if self.engine is not default_engine:
+                self.table.create(self.engine, checkfirst=True)
+                # Standalone stores created before entries recorded their owner (migration 0008)
+                if "owner" not in {column["name"] for column in inspect(self.engine).get_columns(self.table.name)}:
+                    with self.engine.begin() as conn:
+                        conn.execute(text(f"ALTER TABLE {self.table.name} ADD COLUMN owner VARCHAR"))
+            self._schema_ready = True
+
+    @staticmethod
+    def _rank(row: Dict[str, Any]) -> tuple:
+        return (row["source"] == SOURCE_APPROVED, row["updated_at"] or datetime.min)
@@ -0,0 +1,281 @@
+"""
+In-process column classifier: hashed character n-grams with a calibrated linear model
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import ClassificationResult
+from core.security import decrypt_sensitive_data
+from utils.fingerprint import value_shape
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "char-ngram-logreg"
+LABEL_SEPARATOR = "|"
+
+_NAME_SPLIT = re.compile(r"[^0-9a-z؀-ۿ]+")
+
+class LocalColumnClassifier:
+    """Multinomial logistic regression over hashed name and value-shape features"""
+
+    def __init__(self, model_path: Optional[str] = None, hash_dim: Optional[int] = None):
+        self.model_path = model_path or settings.LOCAL_MODEL_PATH
+        self.hash_dim = hash_dim or settings.LOCAL_MODEL_HASH_DIM
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+        self.labels: List[str] = []
+        self.temperature = 1.0
+        self.metadata: Dict[str, Any] = {}
+        self._loaded_mtime: Optional[float] = None
+        self._last_reload_check = 0.0
+
+    @property
+    def is_ready(self) -> bool:
+        return self.weights is not None
+
+    # Feature extraction
+    def extract_features(self, column_name: str, sample_values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """Hashed feature indices and L2-normalised values for one column"""
+        counts: Dict[int, float] = {}
+
+        def add(feature: str, weight: float = 1.0):
+            index = zlib.crc32(feature.encode("utf-8")) % self.hash_dim
+            counts[index] = counts.get(index, 0.0) + weight
+
+        # Column name: whole tokens plus character 2-4 grams
+        name = column_name.lower()
+        for token in _NAME_SPLIT.split(name):
+            if token:
+                add(f"t:{token}", 2.0)
+        padded = f"^{_NAME_SPLIT.sub('_', name)}$"
+        for n in (2, 3, 4):
+            for i in range(len(padded) - n + 1):
+                add(f"n{n}:{padded[i:i + n]}")
+
+        # Values: shape, length bucket and leading characters
+        values = [str(v) for v in sample_values if v is not None and str(v) != ""]
+        if not values:
+            add("v:empty")
+        weight = 1.0 / max(1, len(values))
+        for value in values:
+            add(f"s:{value_shape(value)}", weight)
+            add(f"l:{min(len(value), 64) // 4}", weight)
+            add(f"p:{value_shape(value[:3])}", weight)
+            if "@" in value:
+                add("c:at", weight)
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        data = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        norm = np.linalg.norm(data)
+        if norm > 0:
+            data /= norm
+        return indices, data
+
+    def _feature_matrix(self, columns: List[Tuple[str, List[Any]]]) -> sparse.csr_matrix:
+        indptr, indices, data = [0], [], []
+        for column_name, sample_values in columns:
+            idx, vals = self.extract_features(column_name, sample_values)
+            indices.append(idx)
+            data.append(vals)
+            indptr.append(indptr[-1] + len(idx))
+        return sparse.csr_matrix(
+            (np.concatenate(data), np.concatenate(indices), np.array(indptr)),
+            shape=(len(columns), self.hash_dim)
+        )
+
+    # Inference
+    def predict(self, column_name: str, sample_values: List[Any]) -> Dict[str, Any]:
+        """Classify one column; returns level, regulation and calibrated confidence"""
+        self.reload_if_changed()
+        if not self.is_ready:
+            raise RuntimeError("Local model is not trained")
+
+        indices, values = self.extract_features(column_name, sample_values)
+        logits = values @ self.weights[indices] + self.bias
+        probabilities = self._softmax(logits / self.temperature)
+
+        best = int(np.argmax(probabilities))
+        level, regulation = self.labels[best].split(LABEL_SEPARATOR, 1)
+        return {
+            "classification_level": level,
+            "regulation": regulation,
+            "confidence_score": float(probabilities[best]),
+            "alternatives": [
+                {"label": self.labels[i], "probability": float(probabilities[i])}
+                for i in np.argsort(probabilities)[::-1][1:3]
+            ]
+        }
+
+    # Training
+    def fit(
+        self,
+        columns: List[Tuple[str, List[Any]]],
+        labels: List[str],
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+        validation_fraction: float = 0.2,
+        seed: int = 42
+    ) -> Dict[str, Any]:
+        """Train on (column_name, sample_values) pairs labelled 'level|regulation'
+
+        A held-out split is used to fit the softmax temperature so confidences are calibrated.
+        """
+        label_names = sorted(set(labels))
+        label_index = {label: i for i, label in enumerate(label_names)}
+        y = np.array([label_index[label] for label in labels])
+        X = self._feature_matrix(columns)
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(y))
+        n_validation = int(len(y) * validation_fraction) if len(y) >= 50 else 0
+        validation, train = order[:n_validation], order[n_validation:]
+
+        n_classes = len(label_names)
+        weights = np.zeros((self.hash_dim, n_classes), dtype=np.float32)
+        bias = np.zeros(n_classes, dtype=np.float32)
+        X_train = X[train]
+        Y_train = np.eye(n_classes, dtype=np.float32)[y[train]]
+
+        # Full-batch gradient descent; feature rows are L2-normalised so a fixed step is stable
+        for _ in range(epochs):
+            probabilities = self._softmax(X_train @ weights + bias)
+            error = (probabilities - Y_train) / len(train)
+            weights -= learning_rate * (np.asarray(X_train.T @ error) + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        self.weights, self.bias, self.labels = weights, bias, label_names
+        self.temperature = 1.0
+
+        accuracy = None
+        if n_validation:
+            logits = X[validation] @ weights + bias
+            self.temperature = self._fit_temperature(logits, y[validation])
+            accuracy = float((np.argmax(logits, axis=1) == y[validation]).mean())
+
+        self.metadata = {
+            "model": MODEL_NAME,
+            "trained_at": datetime.utcnow().isoformat(),
+            "samples": len(y),
+            "classes": n_classes,
+            "validation_accuracy": accuracy,
+            "temperature": self.temperature
+        }
+        return self.metadata
+
+    def _fit_temperature(self, logits: np.ndarray, y: np.ndarray) -> float:
+        """Temperature minimising negative log-likelihood on held-out data"""
+        best_temperature, best_nll = 1.0, np.inf
+        for temperature in np.geomspace(0.05, 10.0, 48):
+            probabilities = self._softmax(logits / temperature)
+            nll = -np.mean(np.log(probabilities[np.arange(len(y)), y] + 1e-12))
+            if nll < best_nll:
+                best_temperature, best_nll = float(temperature), nll
+        return best_temperature
+
+    # Persistence
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or self.model_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            temperature=np.array(self.temperature),
+            hash_dim=np.array(self.hash_dim),
+            metadata=np.array(json.dumps(self.metadata))
+        )
+        os.replace(tmp_path, path)  # atomic swap so other workers never read a partial file
+        return path
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.model_path
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                self.weights = archive["weights"]
+                self.bias = archive["bias"]
+                self.labels = [str(label) for label in archive["labels"]]
+                self.temperature = float(archive["temperature"])
+                self.hash_dim = int(archive["hash_dim"])
+                self.metadata = json.loads(str(archive["metadata"]))
+            self._loaded_mtime = os.path.getmtime(path)
+            logger.info(f"Loaded local classifier ({len(self.labels)} classes) from {path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load local classifier from {path}: {str(e)}")
+            return False
+
+    def reload_if_changed(self, interval: float = 60.0) -> None:
+        """Pick up a model retrained by another process"""
+        now = time.monotonic()
+        if self.is_ready and now - self._last_reload_check < interval:
+            return
+        self._last_reload_check = now
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        shifted = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(shifted)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+async def train_local_classifier(db: AsyncSession, classifier: LocalColumnClassifier) -> Dict[str, Any]:
+    """Retrain from approved classification results and publish the model if it is accurate enough"""
+    rows = (await db.execute(
+        select(
+            ClassificationResult.column_name,
+            ClassificationResult.sample_values,
+            ClassificationResult.classification_level,
+            ClassificationResult.regulation
+        ).where(ClassificationResult.is_approved == True)
+    )).all()
+
+    if len(rows) < settings.MIN_TRAINING_SAMPLES:
+        return {"status": "skipped", "reason": f"only {len(rows)} approved results"}
+
+    # Decrypting every row and fitting are CPU-bound, so they run off the event loop
+    candidate = LocalColumnClassifier(classifier.model_path, classifier.hash_dim)
+    metadata = await asyncio.to_thread(_fit_candidate, candidate, rows)
+
+    accuracy = metadata["validation_accuracy"]
+    if accuracy is not None and accuracy < settings.MODEL_ACCURACY_THRESHOLD:
+        logger.warning(f"Local classifier accuracy {accuracy:.3f} below threshold, keeping current model")
+        return {"status": "rejected", **metadata}
+
+    await asyncio.to_thread(candidate.save)
+    classifier.load()
+    return {"status": "trained", **metadata}
+
+def _fit_candidate(candidate: LocalColumnClassifier, rows: List[Any]) -> Dict[str, Any]:
+    columns, labels = [], []
+    for row in rows:
+        try:
+            samples = decrypt_sensitive_data(row.sample_values) if row.sample_values else []
+        except Exception:
+            samples = []
+        columns.append((row.column_name, samples if isinstance(samples, list) else [samples]))
+        labels.append(f"{row.classification_level}{LABEL_SEPARATOR}{row.regulation}")
+    return candidate.fit(columns, labels)
@@ -0,0 +1,288 @@
+"""
+Nearest-neighbour index over embeddings of approved columns
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.models import ClassificationResult
+from core.security import decrypt_sensitive_data
+from utils.fingerprint import normalize_column_name, value_shape
+
+logger = logging.getLogger(__name__)
+
+ENTRY_FIELDS = [
+    "classification_level", "regulation", "justification", "confidence_score", "risk_score", "decided_by_tier"
+]
+
+_REPEATS = re.compile(r"(.)\1+")
+
+def neighbour_scope(owner: str, regulation_focus: Optional[str] = None, language: str = "en") -> str:
+    """Columns only inherit from approved columns of the same owner and classification profile"""
+    return json.dumps([owner, regulation_focus, language])
+
+def _hashed(vector: np.ndarray, feature: str, weight: float) -> None:
+    # Signed feature hashing: collisions cancel out on average instead of piling up
+    digest = zlib.crc32(feature.encode("utf-8"))
+    vector[digest % len(vector)] += weight if digest & 0x80000000 else -weight
+
+def _normalized(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def embed_column(column_name: str, sample_values: List[Any], dim: Optional[int] = None) -> np.ndarray:
+    """Unit vector of name tokens and n-grams (first half) and value-shape features (second half)
+
+    The halves are normalised separately and weighted by NEIGHBOUR_NAME_WEIGHT, so the
+    cosine similarity of two columns is the weighted mean of name and value similarity.
+    """
+    dim = dim or settings.NEIGHBOUR_EMBEDDING_DIM
+    name_vector = np.zeros(dim // 2, dtype=np.float32)
+    value_vector = np.zeros(dim - dim // 2, dtype=np.float32)
+
+    name = normalize_column_name(column_name)
+    for token in name.split("_"):
+        if token:
+            _hashed(name_vector, f"t:{token}", 2.0)
+    padded = f"^{name}$"
+    for i in range(len(padded) - 2):
+        _hashed(name_vector, f"n3:{padded[i:i + 3]}", 1.0)
+
+    values = [str(value).strip() for value in sample_values if value is not None and str(value).strip()]
+    if not values:
+        _hashed(value_vector, "v:empty", 1.0)
+    weight = 1.0 / max(1, len(values))
+    for value in values:
+        shape = value_shape(value, max_length=64)
+        collapsed = _REPEATS.sub(r"\1", shape)
+        _hashed(value_vector, f"s:{collapsed}", weight)
+        _hashed(value_vector, f"p:{shape[:4]}", weight)
+        _hashed(value_vector, f"l:{min(len(value), 64) // 4}", weight)
+        if "@" in value:
+            _hashed(value_vector, "c:at", weight)
+
+    name_weight = settings.NEIGHBOUR_NAME_WEIGHT
+    return np.concatenate([
+        _normalized(name_vector) * np.sqrt(name_weight),
+        _normalized(value_vector) * np.sqrt(1 - name_weight)
+    ]).astype(np.float32)
+
+class ColumnNeighbourIndex:
+    """Flat cosine index of approved columns, persisted next to the local model
+
+    Each entry carries the neighbour_scope it was approved under and only matches
+    queries from the same scope. Every process keeps the index in memory and picks
+    up changes made by other processes from the file's mtime. Writes reload, modify and atomically replace
+    the file under an exclusive lock, so concurrent approvals are not lost.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, dim: Optional[int] = None):
+        self.index_path = index_path or settings.NEIGHBOUR_INDEX_PATH
+        self.dim = dim or settings.NEIGHBOUR_EMBEDDING_DIM
+        self.vectors = np.empty((0, self.dim), dtype=np.float32)
+        self.result_ids = np.empty(0, dtype=np.int64)
+        self.column_names: List[str] = []
+        self.entries: List[Dict[str, Any]] = []
+        self.scopes: List[str] = []
+        self._loaded_mtime: Optional[float] = None
+        self._last_reload_check = 0.0
+
+    def __len__(self) -> int:
+        return len(self.result_ids)
+
+    # Queries
+    def nearest(self, columns: List[Tuple[str, List[Any], str]]) -> List[Optional[Dict[str, Any]]]:
+        """Closest approved column in the same scope for each (column_name, sample_values, scope)
+
+        None when nothing in the scope is within the distance threshold.
+        """
+        self.reload_if_changed()
+        if not len(self) or not columns:
+            return [None] * len(columns)
+
+        queries = np.stack([embed_column(name, samples, self.dim) for name, samples, _ in columns])
+        same_scope = np.array([scope for _, _, scope in columns])[:, None] == np.array(self.scopes)[None, :]
+        similarities = np.where(same_scope, queries @ self.vectors.T, -np.inf)
+        best = np.argmax(similarities, axis=1)
+        distances = 1.0 - similarities[np.arange(len(columns)), best]
+
+        matches = []
+        for position, distance in zip(best, distances):
+            if distance > settings.NEIGHBOUR_MAX_DISTANCE:
+                matches.append(None)
+                continue
+            matches.append({
+                **self.entries[position],
+                "result_id": int(self.result_ids[position]),
+                "column_name": self.column_names[position],
+                "distance": round(max(0.0, float(distance)), 4)
+            })
+        return matches
+
+    # Updates
+    async def add(
+        self,
+        result_id: int,
+        column_name: str,
+        sample_values: List[Any],
+        entry: Dict[str, Any],
+        scope: str
+    ) -> None:
+        """Add or replace an approved column and publish the index to other processes"""
+        vector = embed_column(column_name, sample_values, self.dim)
+        fields = {field: entry.get(field) for field in ENTRY_FIELDS}
+        await asyncio.to_thread(self._locked_update, [(result_id, column_name, vector, fields, scope)])
+
+    def _locked_update(self, items: List[Tuple[int, str, np.ndarray, Dict[str, Any], str]]) -> None:
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with open(f"{self.index_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.index_path):
+                self.load()
+
+            replaced = {item[0] for item in items}
+            keep = [i for i, result_id in enumerate(self.result_ids) if int(result_id) not in replaced]
+            self.vectors = np.concatenate([self.vectors[keep], np.stack([item[2] for item in items])])
+            self.result_ids = np.concatenate([self.result_ids[keep], [item[0] for item in items]]).astype(np.int64)
+            self.column_names = [self.column_names[i] for i in keep] + [item[1] for item in items]
+            self.entries = [self.entries[i] for i in keep] + [item[3] for item in items]
+            self.scopes = [self.scopes[i] for i in keep] + [item[4] for item in items]
+            self.save()
+
+    def replace_all(self, items: List[Tuple[int, str, List[Any], Dict[str, Any], str]]) -> None:
+        """Rebuild from (result_id, column_name, sample_values, entry, scope) of every approved column"""
+        self.vectors = (
+            np.stack([embed_column(item[1], item[2], self.dim) for item in items])
+            if items else np.empty((0, self.dim), dtype=np.float32)
+        )
+        self.result_ids = np.array([item[0] for item in items], dtype=np.int64)
+        self.column_names = [item[1] for item in items]
+        self.entries = [{field: item[3].get(field) for field in ENTRY_FIELDS} for item in items]
+        self.scopes = [item[4] for item in items]
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        with open(f"{self.index_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.save()
+
+    # Persistence
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or self.index_path
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vectors=self.vectors,
+            result_ids=self.result_ids,
+            column_names=np.array(self.column_names, dtype=str),
+            entries=np.array(json.dumps(self.entries)),
+            scopes=np.array(self.scopes, dtype=str),
+            dim=np.array(self.dim)
+        )
+        os.replace(tmp_path, path)  # atomic swap so other workers never read a partial file
+        self._loaded_mtime = os.path.getmtime(path)
+        return path
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.index_path
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                if int(archive["dim"]) != self.dim:
+                    logger.warning(f"Ignoring neighbour index {path}: built for dimension {int(archive['dim'])}")
+                    return False
+                if "scopes" not in archive.files:
+                    logger.warning(f"Ignoring neighbour index {path}: built without owner scopes, rebuild it")
+                    return False
+                self.vectors = archive["vectors"]
+                self.result_ids = archive["result_ids"]
+                self.column_names = [str(name) for name in archive["column_names"]]
+                self.entries = json.loads(str(archive["entries"]))
+                self.scopes = [str(scope) for scope in archive["scopes"]]
+            self._loaded_mtime = os.path.getmtime(path)
+            logger.info(f"Loaded neighbour index ({len(self)} approved columns) from {path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to load neighbour index from {path}: {str(e)}")
+            return False
+
+    def reload_if_changed(self, interval: float = 60.0) -> None:
+        """Pick up approvals published by another process"""
+        now = time.monotonic()
+        if now - self._last_reload_check < interval:
+            return
+        self._last_reload_check = now
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self.load()
+
+async def rebuild_neighbour_index(db: AsyncSession, index: ColumnNeighbourIndex) -> Dict[str, Any]:
+    """Rebuild the index from every approved classification result"""
+    started = time.time()
+    rows = (await db.execute(
+        select(
+            ClassificationResult.id,
+            ClassificationResult.column_name,
+            ClassificationResult.sample_values,
+            ClassificationResult.user_id,
+            *[getattr(ClassificationResult, field) for field in ENTRY_FIELDS]
+        ).where(ClassificationResult.is_approved == True)
+    )).all()
+
+    # Decrypting and embedding every approved column is CPU-bound, so it runs off the event loop
+    columns = await asyncio.to_thread(_rebuild, index, rows)
+    logger.info(f"Rebuilt neighbour index with {columns} approved columns")
+    return {"status": "rebuilt", "columns": columns, "duration_seconds": round(time.time() - started, 1)}
+
+def _rebuild(index: ColumnNeighbourIndex, rows: List[Any]) -> int:
+    items = []
+    for row in rows:
+        try:
+            samples = decrypt_sensitive_data(row.sample_values) if row.sample_values else []
+        except Exception:
+            samples = []
+        items.append((
+            row.id,
+            row.column_name,
+            samples if isinstance(samples, list) else [samples],
+            {field: getattr(row, field) for field in ENTRY_FIELDS},
+            # Classification options are not stored with results, so approvals cover the owner's default profile
+            neighbour_scope(row.user_id)
+        ))
+    index.replace_all(items)
+    return len(items)
+
+async def seed_neighbour_index(index: ColumnNeighbourIndex) -> None:
+    """Build the index file once per host if it is missing or unusable
+
+    Runs in the background after startup. The first worker to take the seed lock
+    builds the file; the others skip and pick it up through reload_if_changed.
+    """
+    os.makedirs(os.path.dirname(index.index_path) or ".", exist_ok=True)
+    with open(f"{index.index_path}.seed.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        if os.path.exists(index.index_path) and index.load():
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                await rebuild_neighbour_index(db, index)
+        except Exception as e:
+            logger.warning(f"Neighbour index seeding failed: {str(e)}")
@@ -0,0 +1,165 @@
+"""
+Bulk persistence of data sources and classification results
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import DataSource, ClassificationResult
+from core.security import encrypt_sensitive_data
+from utils.fingerprint import column_fingerprint
+
+logger = logging.getLogger(__name__)
+
+class ClassificationPersistenceService:
+    """Writes a data source and all of its classification results in one transaction"""
+
+    def __init__(self, compliance_service, rollup_service):
+        self.compliance_service = compliance_service
+        self.rollup_service = rollup_service
+        self.batch_size = settings.BULK_INSERT_BATCH_SIZE
+
+    async def persist_classification_results(
+        self,
+        db: AsyncSession,
+        data_source_fields: Dict[str, Any],
+        results: List[Dict[str, Any]],
+        user_id: str,
+        organization_id: Optional[str] = None
+    ) -> DataSource:
+        """Persist a data source and its results with multi-row INSERTs"""
+        rows = await self._prepare_rows(results, user_id, organization_id)
+
+        try:
+            data_source = DataSource(**data_source_fields)
+            db.add(data_source)
+            await db.flush()  # assigns data_source.id without committing
+
+            await self._insert_rows(db, data_source.id, rows)
+            await db.commit()
+
+        except Exception:
+            await db.rollback()
+            raise
+
+        await db.refresh(data_source)
+        logger.info(f"Persisted {len(rows)} classification results for data source {data_source.id}")
+
+        return data_source
+
+    async def append_results(
+        self,
+        db: AsyncSession,
+        data_source: DataSource,
+        results: List[Dict[str, Any]],
+        user_id: str,
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add a new set of results to an existing data source, e.g. after a rescan"""
+        rows = await self._prepare_rows(results, user_id, organization_id)
+
+        try:
+            # The results being replaced stop counting towards the dashboard rollups
+            superseded = await self._latest_results(db, data_source.id, [row["column_name"] for row in rows])
+            await self._insert_rows(db, data_source.id, rows, superseded)
+            data_source.last_scanned = datetime.utcnow()
+            await db.commit()
+
+        except Exception:
+            await db.rollback()
+            raise
+
+        logger.info(f"Appended {len(rows)} classification results to data source {data_source.id}")
+        return len(rows)
+
+    async def _prepare_rows(
+        self,
+        results: List[Dict[str, Any]],
+        user_id: str,
+        organization_id: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Build insert rows; data_source_id is filled in at insert time"""
+
+        # Compliance mappings are independent per column, so compute them concurrently
+        compliance_mappings = await asyncio.gather(*[
+            self.compliance_service.generate_compliance_mapping(result, organization_id)
+            for result in results
+        ])
+
+        # Encryption is CPU-bound; do the whole batch off the event loop
+        encrypted_samples = await asyncio.to_thread(
+            self._encrypt_batch, [result["sample_values"] for result in results]
+        )
+        # Samples are stored encrypted, so keep a fingerprint to group identical columns without decrypting
+        fingerprints = [column_fingerprint(result["column_name"], result["sample_values"]) for result in results]
+
+        now = datetime.utcnow()
+        return [
+            {
+                "column_name": result["column_name"],
+                "classification_level": result["classification_level"],
+                "regulation": result["regulation"],
+                "justification": result["justification"],
+                "confidence_score": result["confidence_score"],
+                "sample_values": samples,
+                "fingerprint": fingerprint,
+                "compliance_mapping": mapping,
+                "risk_score": result.get("risk_score", 0.0),
+                "decided_by_tier": result.get("decided_by_tier"),
+                "neighbour": result.get("neighbour"),
+                "is_approved": False,
+                "user_id": user_id,
+                "created_at": now,
+                "updated_at": now
+            }
+            for result, samples, fingerprint, mapping in zip(
+                results, encrypted_samples, fingerprints, compliance_mappings
+            )
+        ]
+
+    async def _latest_results(
+        self,
+        db: AsyncSession,
+        data_source_id: int,
+        column_names: List[str]
+    ) -> List[ClassificationResult]:
+        """Current (highest id) result of each named column of a data source"""
+        if not column_names:
+            return []
+        latest_ids = (
+            select(func.max(ClassificationResult.id))
+            .where(
+                ClassificationResult.data_source_id == data_source_id,
+                ClassificationResult.column_name.in_(set(column_names))
+            )
+            .group_by(ClassificationResult.column_name)
+        )
+        return (await db.execute(
+            select(ClassificationResult).where(ClassificationResult.id.in_(latest_ids))
+        )).scalars().all()
+
+    async def _insert_rows(
+        self,
+        db: AsyncSession,
+        data_source_id: int,
+        rows: List[Dict[str, Any]],
+        superseded: Sequence[ClassificationResult] = ()
+    ) -> None:
+        for row in rows:
+            row["data_source_id"] = data_source_id
+
+        for i in range(0, len(rows), self.batch_size):
+            await db.execute(insert(ClassificationResult).values(rows[i:i + self.batch_size]))
+
+        # Dashboard rollups commit atomically with the rows they count
+        await self.rollup_service.apply_results(db, rows, superseded)
+
+    def _encrypt_batch(self, sample_batches: List[List[Any]]) -> List[Any]:
+        """Encrypt sample values for every column"""
+        return [encrypt_sensitive_data(samples) for samples in sample_batches]
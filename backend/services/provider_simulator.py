@@ -0,0 +1,355 @@
+"""
+Offline OpenAI/Anthropic-compatible provider simulator for tests and benchmarks
+"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import uuid
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (name keywords, classification level, regulation) checked in order
+_KEYWORD_LABELS = [
+    (("national", "iqama", "passport", "ssn", "iban", "card", "account", "password"), "Top Secret", "PDPL"),
+    (("medical", "diagnosis", "health", "blood", "patient"), "Top Secret", "HIPAA"),
+    (("email", "phone", "mobile", "address", "contact"), "Confidential", "PDPL"),
+    (("name", "birth", "gender", "age", "nationality"), "Confidential", "GDPR"),
+    (("salary", "employee", "department", "ip", "internal"), "Internal", "NDMO"),
+]
+_SMALL_MODEL_MARKERS = ("llama", "3.5", "sonnet", "haiku", "mini")
+
+_COLUMN_NAME = re.compile(r"Column Name: (.*)")
+_RESPONSE_FIELD = re.compile(r'^\s+"(\w+)":', re.MULTILINE)
+_ANTHROPIC_BATCH = re.compile(r"/v1/messages/batches(?:/([^/]+))?(?:/(results|cancel))?$")
+_OPENAI_BATCH = re.compile(r"/v1/batches(?:/([^/]+))?(?:/(cancel))?$")
+_OPENAI_FILE = re.compile(r"/v1/files(?:/([^/]+)/content)?$")
+
+class SimulatedProviderTransport(httpx.AsyncBaseTransport):
+    """httpx transport answering chat/messages requests locally
+
+    Latency is a base delay from the configured distribution plus a per-output-token
+    cost, so lean prompts are measurably faster. Server errors, 429s and malformed
+    JSON are injected at the configured rates.
+
+    The Anthropic message-batch and OpenAI files/batches endpoints are simulated too:
+    a batch ends SIMULATOR_BATCH_LATENCY seconds after submission, and its items fail
+    or come back malformed at the same rates as interactive calls.
+    """
+
+    def __init__(
+        self,
+        latency_distribution: Optional[str] = None,
+        latency_median: Optional[float] = None,
+        latency_sigma: Optional[float] = None,
+        seconds_per_output_token: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        rate_limit_rate: Optional[float] = None,
+        malformed_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+        batch_latency: Optional[float] = None
+    ):
+        self.latency_distribution = latency_distribution or settings.SIMULATOR_LATENCY_DISTRIBUTION
+        self.latency_median = settings.SIMULATOR_LATENCY_MEDIAN if latency_median is None else latency_median
+        self.latency_sigma = settings.SIMULATOR_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.seconds_per_output_token = (
+            settings.SIMULATOR_SECONDS_PER_OUTPUT_TOKEN if seconds_per_output_token is None
+            else seconds_per_output_token
+        )
+        self.error_rate = settings.SIMULATOR_ERROR_RATE if error_rate is None else error_rate
+        self.rate_limit_rate = settings.SIMULATOR_RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate
+        self.malformed_rate = settings.SIMULATOR_MALFORMED_RATE if malformed_rate is None else malformed_rate
+        self.batch_latency = settings.SIMULATOR_BATCH_LATENCY if batch_latency is None else batch_latency
+        self.random = random.Random(settings.SIMULATOR_SEED if seed is None else seed)
+
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, bytes] = {}
+
+        self.stats = {
+            "requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "malformed": 0,
+            "batches": 0, "batch_items": 0
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        path = request.url.path
+        await request.aread()
+
+        anthropic_batch = _ANTHROPIC_BATCH.search(path)
+        if anthropic_batch:
+            return self._handle_anthropic_batch(request, *anthropic_batch.groups())
+        openai_batch = _OPENAI_BATCH.search(path)
+        if openai_batch:
+            return self._handle_openai_batch(request, *openai_batch.groups())
+        openai_file = _OPENAI_FILE.search(path)
+        if openai_file:
+            return self._handle_openai_file(request, openai_file.group(1))
+
+        if request.method == "GET" and path.endswith("/models"):
+            return self._response(200, {"data": [{"id": "simulated"}]}, request)
+        if request.method != "POST" or not path.endswith(("/chat/completions", "/messages")):
+            return self._response(404, {"error": {"message": f"Unknown endpoint {path}"}}, request)
+
+        body = json.loads(request.content or b"{}")
+        anthropic = path.endswith("/messages")
+
+        # Failures arrive quickly, like real rejections
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            await asyncio.sleep(self._base_latency() * 0.1)
+            self.stats["rate_limited"] += 1
+            return self._response(
+                429, {"error": {"type": "rate_limit_error", "message": "Simulated rate limit"}},
+                request, headers={"retry-after": "1"}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            await asyncio.sleep(self._base_latency() * 0.5)
+            self.stats["errors"] += 1
+            return self._response(
+                500, {"error": {"type": "api_error", "message": "Simulated server error"}}, request
+            )
+
+        return await self.complete(body, anthropic, request)
+
+    async def complete(self, body: Dict[str, Any], anthropic: bool, request: Optional[httpx.Request] = None) -> httpx.Response:
+        """Successful (possibly malformed) completion in the provider's wire format"""
+        completion = self._generate(body, anthropic)
+        usage = completion["usage"]
+        output_tokens = usage.get("output_tokens", usage.get("completion_tokens", 0))
+        await asyncio.sleep(self._base_latency() + output_tokens * self.seconds_per_output_token)
+
+        return self._response(200, completion, request)
+
+    def _generate(self, body: Dict[str, Any], anthropic: bool) -> Dict[str, Any]:
+        prompt = "\n".join(
+            message["content"] for message in body.get("messages", []) if isinstance(message.get("content"), str)
+        )
+        model = body.get("model", "simulated")
+        content = json.dumps(self._classify(prompt, model))
+
+        if self.random.random() < self.malformed_rate:
+            self.stats["malformed"] += 1
+            content = content[:len(content) // 2]
+        else:
+            self.stats["ok"] += 1
+
+        input_tokens = max(1, len(prompt) // 4)
+        output_tokens = min(max(1, len(content) // 4), body.get("max_tokens") or 4096)
+        return self.wrap(content, model, anthropic, input_tokens, output_tokens)
+
+    def wrap(self, content: str, model: str, anthropic: bool, input_tokens: int, output_tokens: int) -> Dict[str, Any]:
+        """Wrap generated content in an OpenAI or Anthropic response body"""
+        if anthropic:
+            return {
+                "type": "message",
+                "model": model,
+                "content": [{"type": "text", "text": content}],
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+            }
+        return {
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens}
+        }
+
+    # Batch APIs
+    def _handle_anthropic_batch(
+        self, request: httpx.Request, batch_id: Optional[str], action: Optional[str]
+    ) -> httpx.Response:
+        if request.method == "POST" and batch_id is None:
+            body = json.loads(request.content or b"{}")
+            batch = self._create_batch(
+                [(item["custom_id"], item["params"]) for item in body.get("requests", [])], anthropic=True
+            )
+            return self._response(200, self._anthropic_batch_status(batch, request), request)
+
+        batch = self.batches.get(batch_id or "")
+        if batch is None:
+            return self._response(404, {"error": {"type": "not_found_error", "message": "Unknown batch"}}, request)
+
+        if action == "cancel":
+            batch["cancelled"] = True
+        if action == "results":
+            lines = []
+            for custom_id, outcome in self._batch_results(batch):
+                if outcome is None:
+                    result = {"type": "errored", "error": {"type": "api_error", "message": "Simulated item error"}}
+                else:
+                    result = {"type": "succeeded", "message": outcome}
+                lines.append({"custom_id": custom_id, "result": result})
+            return self._jsonl_response(lines, request)
+        return self._response(200, self._anthropic_batch_status(batch, request), request)
+
+    def _handle_openai_batch(
+        self, request: httpx.Request, batch_id: Optional[str], action: Optional[str]
+    ) -> httpx.Response:
+        if request.method == "POST" and batch_id is None:
+            body = json.loads(request.content or b"{}")
+            content = self.files.get(body.get("input_file_id", ""))
+            if content is None:
+                return self._response(400, {"error": {"message": "Unknown input_file_id"}}, request)
+            lines = [json.loads(line) for line in content.splitlines() if line.strip()]
+            batch = self._create_batch([(line["custom_id"], line["body"]) for line in lines], anthropic=False)
+            return self._response(200, self._openai_batch_status(batch), request)
+
+        batch = self.batches.get(batch_id or "")
+        if batch is None:
+            return self._response(404, {"error": {"message": "Unknown batch"}}, request)
+
+        if action == "cancel":
+            batch["cancelled"] = True
+        return self._response(200, self._openai_batch_status(batch), request)
+
+    def _handle_openai_file(self, request: httpx.Request, file_id: Optional[str]) -> httpx.Response:
+        if request.method == "POST" and file_id is None:
+            # Only the JSONL lines of the multipart upload matter here
+            content = b"\n".join(
+                line for line in request.content.splitlines() if line.startswith(b'{"custom_id"')
+            )
+            file_id = f"file-{uuid.uuid4().hex[:24]}"
+            self.files[file_id] = content
+            return self._response(200, {"id": file_id, "object": "file", "purpose": "batch"}, request)
+
+        content = self.files.get(file_id or "")
+        if content is None:
+            return self._response(404, {"error": {"message": "Unknown file"}}, request)
+        return self._raw_response(200, content, request, "application/jsonl")
+
+    def _create_batch(self, requests: List[Tuple[str, Dict[str, Any]]], anthropic: bool) -> Dict[str, Any]:
+        batch = {
+            "id": f"{'msgbatch' if anthropic else 'batch'}_{uuid.uuid4().hex[:24]}",
+            "requests": requests,
+            "anthropic": anthropic,
+            "created": time.monotonic(),
+            "cancelled": False,
+            "results": None
+        }
+        self.batches[batch["id"]] = batch
+        self.stats["batches"] += 1
+        self.stats["batch_items"] += len(requests)
+        return batch
+
+    def _batch_ended(self, batch: Dict[str, Any]) -> bool:
+        return batch["cancelled"] or time.monotonic() - batch["created"] >= self.batch_latency
+
+    def _batch_results(self, batch: Dict[str, Any]) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Per-item completions, generated once so repeated downloads agree; None marks a failed item"""
+        if batch["results"] is None:
+            results = []
+            for custom_id, body in batch["requests"]:
+                if batch["cancelled"] or self.random.random() < self.error_rate:
+                    self.stats["errors"] += 1
+                    results.append((custom_id, None))
+                else:
+                    results.append((custom_id, self._generate(body, batch["anthropic"])))
+            batch["results"] = results
+        return batch["results"]
+
+    def _anthropic_batch_status(self, batch: Dict[str, Any], request: httpx.Request) -> Dict[str, Any]:
+        status = {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "in_progress",
+            "results_url": None
+        }
+        if self._batch_ended(batch):
+            status["processing_status"] = "ended"
+            status["results_url"] = str(request.url.copy_with(path=f"/v1/messages/batches/{batch['id']}/results"))
+        return status
+
+    def _openai_batch_status(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        status = {"id": batch["id"], "object": "batch", "status": "in_progress", "output_file_id": None}
+        if self._batch_ended(batch):
+            lines = []
+            for custom_id, outcome in self._batch_results(batch):
+                if outcome is None:
+                    lines.append({"custom_id": custom_id, "response": None,
+                                  "error": {"code": "server_error", "message": "Simulated item error"}})
+                else:
+                    lines.append({"custom_id": custom_id, "response": {"status_code": 200, "body": outcome},
+                                  "error": None})
+            output_file_id = f"file-{batch['id']}"
+            self.files[output_file_id] = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+            status["status"] = "cancelled" if batch["cancelled"] else "completed"
+            status["output_file_id"] = output_file_id
+        return status
+
+    def _classify(self, prompt: str, model: str) -> Dict[str, Any]:
+        """Deterministic keyword classification with the fields the prompt asks for"""
+        match = _COLUMN_NAME.search(prompt)
+        column_name = match.group(1).strip() if match else "column"
+        level, regulation = self._label(column_name)
+
+        # Stable per column; smaller models are less sure, so the cascade escalates some columns
+        confidence = 0.6 + 0.39 * (zlib.crc32(column_name.encode("utf-8")) % 1000) / 1000
+        if any(marker in model.lower() for marker in _SMALL_MODEL_MARKERS):
+            confidence -= 0.15
+
+        requested = _RESPONSE_FIELD.findall(prompt.split("RESPONSE FORMAT", 1)[-1]) or [
+            "classification_level", "regulation", "justification", "confidence_score"
+        ]
+        values = {
+            "classification_level": level,
+            "regulation": regulation,
+            "justification": f"Simulated: '{column_name}' treated as {level.lower()} data under {regulation}",
+            "confidence_score": round(confidence, 2),
+            "risk_score": {"Top Secret": 0.9, "Confidential": 0.7, "Internal": 0.4}.get(level, 0.1),
+            "explanation": " ".join(["Simulated reasoning step."] * 20),
+        }
+        return {field: values.get(field, ["simulated item 1", "simulated item 2"]) for field in requested}
+
+    def _label(self, column_name: str) -> Tuple[str, str]:
+        lowered = column_name.lower()
+        for keywords, level, regulation in _KEYWORD_LABELS:
+            if any(keyword in lowered for keyword in keywords):
+                return level, regulation
+        return "Internal", "DAMA"
+
+    def _response(
+        self,
+        status_code: int,
+        payload: Dict[str, Any],
+        request: Optional[httpx.Request],
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        return self._raw_response(
+            status_code, json.dumps(payload).encode("utf-8"), request, "application/json", headers
+        )
+
+    def _jsonl_response(self, lines: List[Dict[str, Any]], request: httpx.Request) -> httpx.Response:
+        content = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+        return self._raw_response(200, content, request, "application/x-jsonl")
+
+    def _raw_response(
+        self,
+        status_code: int,
+        content: bytes,
+        request: Optional[httpx.Request],
+        content_type: str,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        # A streamed body lets the client time the response, so response.elapsed works
+        return httpx.Response(
+            status_code,
+            headers={"content-type": content_type, **(headers or {})},
+            stream=httpx.ByteStream(content),
+            request=request
+        )
+
+    def _base_latency(self) -> float:
+        if self.latency_distribution == "fixed":
+            return self.latency_median
+        if self.latency_distribution == "exponential":
+            return self.random.expovariate(1 / self.latency_median) if self.latency_median else 0.0
+        # lognormal: median latency with a long right tail
+        return self.latency_median * self.random.lognormvariate(0, self.latency_sigma)
@@ -0,0 +1,261 @@
+"""
+Incremental reclassification of stored results after custom rule changes
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.models import DataSource, ClassificationResult, CustomRule
+from core.security import decrypt_sensitive_data
+from services.classification_service import ClassificationOptions
+from services.job_service import ProgressCallback
+from services.persistence_service import ClassificationPersistenceService
+from services.rules_engine import pattern_matches_name, pattern_matches_values
+
+logger = logging.getLogger(__name__)
+
+# Rule fields that change which columns match or what they are classified as
+RULE_FIELDS = ["pattern", "classification_level", "regulation", "is_active"]
+
+# Samples are fetched and decrypted in chunks of this many rows
+SAMPLE_CHUNK_SIZE = 1000
+
+def rule_state(rule: CustomRule) -> Dict[str, Any]:
+    """The fields of a rule that decide its effect on stored results"""
+    return {field: getattr(rule, field) for field in RULE_FIELDS}
+
+async def _no_progress(progress: int, stage: str) -> None:
+    pass
+
+def _matches(matcher, pattern: Optional[str], target: Any) -> bool:
+    if pattern is None:
+        return False
+    try:
+        return matcher(pattern, target)
+    except re.error:
+        return False
+
+class RuleReclassificationService:
+    """Re-scores only the stored columns that a custom rule change could affect
+
+    A column is affected when the new version of the rule matches it, or when the
+    old version matched it and the column was decided by rules. Column names are
+    checked first. Samples are decrypted only for columns the name does not settle,
+    and only once per fingerprint. Affected columns go back through the rules and
+    the classification cascade in batches, and the new results are appended to
+    their data sources. Approved results are never touched.
+    """
+
+    def __init__(
+        self,
+        classification_service,
+        rules_engine,
+        persistence_service: ClassificationPersistenceService
+    ):
+        self.classification_service = classification_service
+        self.rules_engine = rules_engine
+        self.persistence_service = persistence_service
+
+    async def reclassify(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        previous: Optional[Dict[str, Any]],
+        current: Optional[Dict[str, Any]],
+        report_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """Re-score the user's latest results affected by a rule going from `previous` to `current`
+
+        Both are rule_state() dicts; `previous` is None for a new rule.
+        """
+        report_progress = report_progress or _no_progress
+        started = datetime.utcnow()
+        old_pattern = previous["pattern"] if previous and previous.get("is_active", True) else None
+        new_pattern = current["pattern"] if current and current.get("is_active", True) else None
+        if previous == current:
+            old_pattern = new_pattern = None  # only the name or description changed
+
+        summary = {
+            "candidates": 0, "skipped_approved": 0, "affected": 0, "decrypted": 0,
+            "changed": 0, "data_sources": 0
+        }
+        if old_pattern is None and new_pattern is None:
+            return summary
+
+        await report_progress(2, "finding_affected_columns")
+        latest_ids = (
+            select(func.max(ClassificationResult.id))
+            .where(ClassificationResult.user_id == user_id)
+            .group_by(ClassificationResult.data_source_id, ClassificationResult.column_name)
+        )
+        rows = (await db.execute(
+            select(
+                ClassificationResult.id,
+                ClassificationResult.data_source_id,
+                ClassificationResult.column_name,
+                ClassificationResult.classification_level,
+                ClassificationResult.decided_by_tier,
+                ClassificationResult.is_approved,
+                ClassificationResult.fingerprint
+            ).where(ClassificationResult.id.in_(latest_ids))
+        )).all()
+        summary["candidates"] = len(rows)
+
+        affected = []
+        by_values = []
+        for row in rows:
+            if row.is_approved:
+                summary["skipped_approved"] += 1
+                continue
+            decided_by_old = old_pattern if row.decided_by_tier == "rules" else None
+            if (
+                _matches(pattern_matches_name, new_pattern, row.column_name)
+                or _matches(pattern_matches_name, decided_by_old, row.column_name)
+            ):
+                affected.append(row)
+            elif new_pattern is not None or decided_by_old is not None:
+                by_values.append(row)
+
+        # Identical columns (same fingerprint) are decrypted and matched once
+        samples = await self._load_samples(db, by_values, report_progress)
+        for row in by_values:
+            values = samples.get(self._group(row), [])
+            decided_by_old = old_pattern if row.decided_by_tier == "rules" else None
+            if (
+                _matches(pattern_matches_values, new_pattern, values)
+                or _matches(pattern_matches_values, decided_by_old, values)
+            ):
+                affected.append(row)
+
+        samples.update(await self._load_samples(
+            db, [row for row in affected if self._group(row) not in samples], report_progress
+        ))
+        summary["decrypted"] = len(samples)
+        summary["affected"] = len(affected)
+        logger.info(
+            f"Rule change affects {len(affected)} of {len(rows)} columns for user {user_id} "
+            f"({len(samples)} sample sets decrypted)"
+        )
+        if not affected:
+            summary["duration_seconds"] = round((datetime.utcnow() - started).total_seconds(), 1)
+            return summary
+
+        rules = (await db.execute(
+            select(CustomRule).where(CustomRule.user_id == user_id, CustomRule.is_active == True)
+        )).scalars().all()
+        source_ids = sorted({row.data_source_id for row in affected})
+        sources = {
+            source.id: source for source in (await db.execute(
+                select(DataSource).where(DataSource.id.in_(source_ids))
+            )).scalars().all()
+        }
+        summary["data_sources"] = len(sources)
+
+        affected.sort(key=lambda row: (row.data_source_id, row.id))
+        batch_size = settings.RECLASSIFICATION_BATCH_SIZE
+        batches = [affected[i:i + batch_size] for i in range(0, len(affected), batch_size)]
+        for number, batch in enumerate(batches):
+            await report_progress(10 + 85 * number // len(batches), f"batch_{number + 1}_of_{len(batches)}")
+            outcomes = await self._rescore_batch(batch, samples, rules, user_id)
+
+            for source_id, results in outcomes:
+                previous_levels = {
+                    row.column_name: row.classification_level for row in batch if row.data_source_id == source_id
+                }
+                summary["changed"] += sum(
+                    1 for result in results
+                    if result.classification_level != previous_levels.get(result.column_name)
+                )
+                if source_id in sources:
+                    await self.persistence_service.append_results(
+                        db, sources[source_id], [asdict(result) for result in results], user_id
+                    )
+
+        summary["duration_seconds"] = round((datetime.utcnow() - started).total_seconds(), 1)
+        logger.info(
+            f"Re-scored {summary['affected']} columns in {summary['data_sources']} data sources, "
+            f"{summary['changed']} changed level"
+        )
+        return summary
+
+    async def _rescore_batch(
+        self,
+        batch: List[Any],
+        samples: Dict[str, List[Any]],
+        rules: List[CustomRule],
+        user_id: str
+    ) -> List[Tuple[int, List[Any]]]:
+        """Classify a batch's columns, several data sources at a time"""
+        columns_by_source: Dict[int, Dict[str, List[Any]]] = {}
+        for row in batch:
+            columns_by_source.setdefault(row.data_source_id, {})[row.column_name] = samples.get(self._group(row), [])
+
+        # Re-scoring needs the decision itself, not explanations or recommendations
+        options = ClassificationOptions(
+            enable_ml_enhancement=False,
+            enable_explanation=False,
+            enable_recommendations=False
+        )
+        semaphore = asyncio.Semaphore(settings.RECLASSIFICATION_CONCURRENCY)
+
+        async def rescore(source_id: int, columns_data: Dict[str, List[Any]]) -> Tuple[int, List[Any]]:
+            async with semaphore:
+                pre_classified = await self.rules_engine.apply_rules_enhanced(columns_data, rules)
+                return source_id, await self.classification_service.classify_columns_enhanced(
+                    columns_data, pre_classified, user_id, options
+                )
+
+        return await asyncio.gather(*[
+            rescore(source_id, columns_data) for source_id, columns_data in columns_by_source.items()
+        ])
+
+    async def _load_samples(
+        self,
+        db: AsyncSession,
+        rows: List[Any],
+        report_progress: ProgressCallback
+    ) -> Dict[str, List[Any]]:
+        """Decrypted samples per fingerprint group, fetching one representative row per group"""
+        representatives: Dict[str, int] = {}
+        for row in rows:
+            representatives.setdefault(self._group(row), row.id)
+        if not representatives:
+            return {}
+
+        groups = {result_id: group for group, result_id in representatives.items()}
+        ids = list(groups)
+        samples: Dict[str, List[Any]] = {}
+        for start in range(0, len(ids), SAMPLE_CHUNK_SIZE):
+            chunk = (await db.execute(
+                select(ClassificationResult.id, ClassificationResult.sample_values)
+                .where(ClassificationResult.id.in_(ids[start:start + SAMPLE_CHUNK_SIZE]))
+            )).all()
+            decrypted = await asyncio.to_thread(self._decrypt_batch, [row.sample_values for row in chunk])
+            for row, values in zip(chunk, decrypted):
+                samples[groups[row.id]] = values
+            await report_progress(2 + 8 * min(len(ids), start + SAMPLE_CHUNK_SIZE) // len(ids), "loading_samples")
+        return samples
+
+    @staticmethod
+    def _group(row: Any) -> str:
+        # Rows stored before fingerprints existed are their own group
+        return row.fingerprint or f"result:{row.id}"
+
+    def _decrypt_batch(self, encrypted_samples: List[Any]) -> List[List[Any]]:
+        """Decrypt stored sample values; unreadable samples become empty lists"""
+        decrypted = []
+        for encrypted in encrypted_samples:
+            try:
+                values = decrypt_sensitive_data(encrypted) if encrypted else []
+            except Exception:
+                values = []
+            decrypted.append(values if isinstance(values, list) else [values])
+        return decrypted
@@ -0,0 +1,172 @@
+"""
+Retention maintenance for classification results
+"""
+
+import logging
+import re
+import zlib
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE = "classification_results"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# Postgres advisory lock key held while one process runs maintenance
+MAINTENANCE_LOCK_KEY = zlib.crc32(b"classification_results_retention")
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+class RetentionService:
+    """Purges expired classification results and keeps monthly partitions ahead of time"""
+
+    def __init__(self):
+        self.retention_days = settings.CLASSIFICATION_RESULT_RETENTION_DAYS
+        self.precreate_months = settings.PARTITION_PRECREATE_MONTHS
+        self.delete_batch_size = settings.RETENTION_DELETE_BATCH_SIZE
+
+    async def run_maintenance(self, db: AsyncSession) -> dict:
+        """Create upcoming partitions and purge expired results, in one process at a time
+
+        Every API worker schedules maintenance. On Postgres the first to take the
+        advisory lock runs it and the others skip this round instead of racing on
+        partition DDL and purges. The lock is held on its own connection because
+        purging commits, which hands the session's connection back to the pool.
+        """
+        if db.bind.dialect.name != "postgresql":
+            return await self._run_maintenance(db)
+
+        async with db.bind.connect() as lock_connection:
+            locked = (await lock_connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                logger.info("Retention maintenance is running in another process, skipping")
+                return {"skipped": True}
+            try:
+                return await self._run_maintenance(db)
+            finally:
+                await lock_connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+
+    async def _run_maintenance(self, db: AsyncSession) -> dict:
+        created = []
+        if await self.is_partitioned(db):
+            created = await self.ensure_future_partitions(db)
+        purged = await self.purge_expired_results(db)
+        return {"partitions_created": created, **purged}
+
+    async def is_partitioned(self, db: AsyncSession) -> bool:
+        """Check whether classification_results is range partitioned"""
+        if db.bind.dialect.name != "postgresql":
+            return False
+        result = await db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table"
+        ), {"table": TABLE})
+        return result.scalar() is not None
+
+    async def list_partitions(self, db: AsyncSession) -> List[Tuple[str, date]]:
+        """Monthly partitions as (name, first day of month), oldest first"""
+        result = await db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table"
+        ), {"table": TABLE})
+
+        partitions = []
+        for (name,) in result.all():
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    async def ensure_future_partitions(self, db: AsyncSession) -> List[str]:
+        """Create partitions for the current month and PARTITION_PRECREATE_MONTHS ahead"""
+        existing = {name for name, _ in await self.list_partitions(db)}
+        current = datetime.utcnow().date().replace(day=1)
+        created = []
+
+        for offset in range(self.precreate_months + 1):
+            month = _add_months(current, offset)
+            name = f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+            if name in existing:
+                continue
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+
+        await db.commit()
+        if created:
+            logger.info(f"Created classification result partitions: {', '.join(created)}")
+        return created
+
+    async def purge_expired_results(self, db: AsyncSession) -> dict:
+        """Remove results older than CLASSIFICATION_RESULT_RETENTION_DAYS
+
+        Partitioned tables drop whole months once every row in them has
+        expired, so the partially expired month is kept until it ages out.
+        Unpartitioned tables fall back to batched row deletes.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+
+        if await self.is_partitioned(db):
+            dropped = await self._drop_expired_partitions(db, cutoff)
+            return {"partitions_dropped": dropped, "rows_deleted": 0}
+
+        return {"partitions_dropped": [], "rows_deleted": await self._delete_expired_rows(db, cutoff)}
+
+    async def _drop_expired_partitions(self, db: AsyncSession, cutoff: datetime) -> List[str]:
+        dropped = []
+
+        for name, month in await self.list_partitions(db):
+            if datetime.combine(_add_months(month, 1), datetime.min.time()) > cutoff:
+                break
+
+            # access_policies no longer has a foreign key to partitioned results
+            await db.execute(text(
+                f"DELETE FROM access_policies WHERE classification_result_id IN (SELECT id FROM {name})"
+            ))
+            await db.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+            await db.execute(text(f"DROP TABLE {name}"))
+            await db.commit()
+            dropped.append(name)
+
+        if dropped:
+            logger.info(f"Dropped expired classification result partitions: {', '.join(dropped)}")
+        return dropped
+
+    async def _delete_expired_rows(self, db: AsyncSession, cutoff: datetime) -> int:
+        total = 0
+
+        while True:
+            expired_ids = (
+                f"SELECT id FROM {TABLE} WHERE created_at < :cutoff ORDER BY id LIMIT :limit"
+            )
+            params = {"cutoff": cutoff, "limit": self.delete_batch_size}
+            await db.execute(text(
+                f"DELETE FROM access_policies WHERE classification_result_id IN ({expired_ids})"
+            ), params)
+            result = await db.execute(text(f"DELETE FROM {TABLE} WHERE id IN ({expired_ids})"), params)
+            await db.commit()
+
+            total += result.rowcount
+            if result.rowcount < self.delete_batch_size:
+                break
+
+        if total:
+            logger.info(f"Deleted {total} expired classification results")
+        return total
@@ -0,0 +1,171 @@
+"""
+Incrementally maintained dashboard rollups
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import DashboardStatsRollup
+
+logger = logging.getLogger(__name__)
+
+HIGH_RISK_LEVELS = ["Top Secret", "Confidential"]
+
+class DashboardRollupService:
+    """Keeps per user/day/level/regulation counters in step with classification results"""
+
+    async def apply_results(
+        self,
+        db: AsyncSession,
+        rows: List[Dict[str, Any]],
+        superseded: Sequence[Any] = ()
+    ) -> None:
+        """Add freshly inserted result rows to the rollups, less the older rows they supersede
+
+        superseded are the previous latest results (rows or ClassificationResult objects)
+        for the same columns, so a rescan moves a column rather than counting it twice.
+        Runs in the caller's transaction so rollups commit together with the results.
+        """
+        if not rows and not superseded:
+            return
+
+        buckets: Dict[tuple, Dict[str, Any]] = defaultdict(
+            lambda: {"column_count": 0, "confidence_sum": 0.0, "risk_sum": 0.0, "last_classified_at": None}
+        )
+        for row in rows:
+            created_at = row["created_at"]
+            bucket = buckets[(row["user_id"], created_at.date(), row["classification_level"], row["regulation"])]
+            bucket["column_count"] += 1
+            bucket["confidence_sum"] += row.get("confidence_score") or 0.0
+            bucket["risk_sum"] += row.get("risk_score") or 0.0
+            if bucket["last_classified_at"] is None or created_at > bucket["last_classified_at"]:
+                bucket["last_classified_at"] = created_at
+        for row in superseded:
+            bucket = buckets[(row.user_id, row.created_at.date(), row.classification_level, row.regulation)]
+            bucket["column_count"] -= 1
+            bucket["confidence_sum"] -= row.confidence_score or 0.0
+            bucket["risk_sum"] -= row.risk_score or 0.0
+
+        values = [
+            {
+                "user_id": user_id,
+                "day": day,
+                "classification_level": level,
+                "regulation": regulation,
+                **bucket
+            }
+            for (user_id, day, level, regulation), bucket in buckets.items()
+        ]
+
+        insert = sqlite_insert if db.bind.dialect.name == "sqlite" else pg_insert
+        statement = insert(DashboardStatsRollup).values(values)
+        table = DashboardStatsRollup.__table__
+        # Buckets that only lose rows carry no timestamp; keep the stored one
+        last_classified_at = func.coalesce(statement.excluded.last_classified_at, table.c.last_classified_at)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "day", "classification_level", "regulation"],
+            set_={
+                "column_count": table.c.column_count + statement.excluded.column_count,
+                "confidence_sum": table.c.confidence_sum + statement.excluded.confidence_sum,
+                "risk_sum": table.c.risk_sum + statement.excluded.risk_sum,
+                "last_classified_at": func.greatest(
+                    table.c.last_classified_at, last_classified_at
+                ) if insert is pg_insert else func.max(
+                    table.c.last_classified_at, last_classified_at
+                )
+            }
+        )
+        await db.execute(statement)
+
+    async def get_dashboard_stats(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        start_date: datetime,
+        end_date: datetime
+    ) -> Dict[str, Any]:
+        """Dashboard statistics for a time range, read from rollups only
+
+        Rollups are kept per day, so the range starts at the beginning of start_date's day.
+        """
+        rows = (await db.execute(
+            select(
+                DashboardStatsRollup.day,
+                DashboardStatsRollup.classification_level,
+                DashboardStatsRollup.regulation,
+                DashboardStatsRollup.column_count,
+                DashboardStatsRollup.confidence_sum,
+                DashboardStatsRollup.risk_sum,
+                DashboardStatsRollup.last_classified_at
+            ).where(
+                DashboardStatsRollup.user_id == user_id,
+                DashboardStatsRollup.day >= start_date.date(),
+                DashboardStatsRollup.day <= end_date.date()
+            )
+        )).all()
+
+        total_columns = 0
+        confidence_sum = 0.0
+        risk_sum = 0.0
+        high_risk_fields = 0
+        last_classification_date = None
+        distribution: Dict[str, int] = defaultdict(int)
+        by_regulation: Dict[str, int] = defaultdict(int)
+        risk_by_level: Dict[str, float] = defaultdict(float)
+        daily: Dict[date, Dict[str, int]] = {}
+
+        for row in rows:
+            total_columns += row.column_count
+            confidence_sum += row.confidence_sum
+            risk_sum += row.risk_sum
+            distribution[row.classification_level] += row.column_count
+            by_regulation[row.regulation] += row.column_count
+            risk_by_level[row.classification_level] += row.risk_sum
+            if row.classification_level in HIGH_RISK_LEVELS:
+                high_risk_fields += row.column_count
+            if row.last_classified_at and (
+                last_classification_date is None or row.last_classified_at > last_classification_date
+            ):
+                last_classification_date = row.last_classified_at
+
+            day_stats = daily.setdefault(row.day, {"total": 0, "high_risk": 0})
+            day_stats["total"] += row.column_count
+            if row.classification_level in HIGH_RISK_LEVELS:
+                day_stats["high_risk"] += row.column_count
+
+        # Zero-fill so the trend has one point per day
+        daily_trend = []
+        day = start_date.date()
+        while day <= end_date.date():
+            day_stats = daily.get(day, {"total": 0, "high_risk": 0})
+            daily_trend.append({"date": day.isoformat(), **day_stats})
+            day += timedelta(days=1)
+
+        return {
+            "total_columns": total_columns,
+            "high_risk_fields": high_risk_fields,
+            "last_classification_date": last_classification_date,
+            "classification_distribution": dict(distribution),
+            "compliance_percentages": {
+                regulation: round(count / total_columns * 100, 2)
+                for regulation, count in by_regulation.items()
+            } if total_columns else {},
+            "average_confidence": round(confidence_sum / total_columns, 4) if total_columns else 0.0,
+            "weekly_trend": daily_trend[-7:],
+            "daily_trend": daily_trend,
+            "risk_assessment": {
+                "average_risk_score": round(risk_sum / total_columns, 4) if total_columns else 0.0,
+                "high_risk_columns": high_risk_fields,
+                "average_risk_by_level": {
+                    level: round(risk_by_level[level] / count, 4)
+                    for level, count in distribution.items() if count
+                }
+            }
+        }
@@ -4,11 +4,60 @@ Custom rules engine for pattern-based classification
 
 import re
 import logging
-from typing import Dict, List, Any
+from typing import Dict, Iterable, List, Any, Pattern, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
 from core.models import CustomRule
 
 logger = logging.getLogger(__name__)
 
+# Compiled rule patterns keyed by (pattern, flags); re's own cache is too small to hold every user's rules
+_compiled_patterns: Dict[Tuple[str, int], Pattern] = {}
+
+def compiled_pattern(pattern: str, flags: int = 0) -> Pattern:
+    """Compiled form of a rule pattern, kept for the life of the process; raises re.error if invalid"""
+    key = (pattern, flags)
+    compiled = _compiled_patterns.get(key)
+    if compiled is None:
+        compiled = re.compile(pattern, flags)
+        if len(_compiled_patterns) >= settings.RULE_PATTERN_CACHE_SIZE:
+            _compiled_patterns.pop(next(iter(_compiled_patterns), None), None)
+        _compiled_patterns[key] = compiled
+    return compiled
+
+def pattern_matches_name(pattern: str, column_name: str) -> bool:
+    """Rule patterns match column names case-insensitively"""
+    return compiled_pattern(pattern, re.IGNORECASE).search(column_name) is not None
+
+def pattern_matches_values(pattern: str, sample_values: List[Any]) -> bool:
+    """Rule patterns match sample values case-sensitively"""
+    compiled = compiled_pattern(pattern)
+    return any(value is not None and compiled.search(str(value)) for value in sample_values)
+
+def rule_set_cache_key(user_id: str) -> str:
+    return f"rules:{user_id}"
+
+async def load_active_rules(db: AsyncSession, user_id: str) -> List[CustomRule]:
+    """A user's active custom rules, in the order they are applied"""
+    return (await db.execute(
+        select(CustomRule).where(CustomRule.user_id == user_id, CustomRule.is_active == True)
+    )).scalars().all()
+
+def compile_rule_patterns(patterns: Iterable[str]) -> int:
+    """Compile patterns with the flags the matchers use, ahead of first use; returns how many are valid"""
+    compiled = 0
+    for pattern in patterns:
+        try:
+            compiled_pattern(pattern, re.IGNORECASE)
+            compiled_pattern(pattern)
+            compiled += 1
+        except (re.error, TypeError):
+            continue
+    return compiled
+
 class RulesEngine:
     def __init__(self):
         self.built_in_rules = self._load_built_in_rules()
@@ -81,16 +130,7 @@ class RulesEngine:
         """Check if pattern matches column name or sample values"""
         
         try:
-            # Check column name
-            if re.search(pattern, column_name, re.IGNORECASE):
-                return True
-            
-            # Check sample values
-            for value in sample_values:
-                if value is not None and re.search(pattern, str(value)):
-                    return True
-            
-            return False
+            return pattern_matches_name(pattern, column_name) or pattern_matches_values(pattern, sample_values)
             
         except re.error as e:
             logger.error(f"Invalid regex pattern '{pattern}': {str(e)}")
@@ -0,0 +1,172 @@
+"""
+Prompt token estimation, sample-value truncation and token budgets
+"""
+
+import json
+import logging
+import math
+import re
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from core.config import settings
+from core.cache import CacheManager
+from core.exceptions import AIServiceError
+from core.metrics import AI_TOKENS, AI_ESTIMATED_COST, PROMPT_VALUE_TRUNCATIONS, TOKEN_BUDGET_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# USD per million (input, output) tokens; the longest key contained in the model name wins
+MODEL_PRICES = {
+    "claude-3-opus": (15.0, 75.0),
+    "claude-3-sonnet": (3.0, 15.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "llama-3-70b": (0.59, 0.79),
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count: ~4 characters per token for ASCII, ~2 for other scripts"""
+    if not text:
+        return 0
+    extra_bytes = len(text.encode("utf-8")) - len(text)
+    return math.ceil((len(text) - extra_bytes) / 4 + extra_bytes / 2)
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, batch: bool = False) -> float:
+    """Estimated USD cost of one call, 0.0 for unknown models"""
+    match = max((name for name in MODEL_PRICES if name in model), key=len, default=None)
+    if match is None:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[match]
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return cost * settings.BATCH_PRICE_DISCOUNT if batch else cost
+
+def truncate_value(value: Any, max_chars: int) -> Tuple[str, bool]:
+    """Render one sample value for a prompt, collapsing whitespace and cutting it at max_chars"""
+    if isinstance(value, (dict, list)):
+        text = json.dumps(value, ensure_ascii=False, default=str)
+    else:
+        text = str(value)
+    text = _WHITESPACE.sub(" ", text).strip()
+
+    if len(text) <= max_chars:
+        return text, False
+    return text[:max_chars - 1] + "…", True
+
+def format_sample_values(
+    values: List[Any],
+    max_value_chars: Optional[int] = None,
+    max_total_chars: Optional[int] = None
+) -> Tuple[str, int]:
+    """Join sample values for a prompt; returns the text and the number of truncated or dropped values"""
+    max_value_chars = max_value_chars or settings.PROMPT_MAX_VALUE_CHARS
+    max_total_chars = max_total_chars or settings.PROMPT_MAX_SAMPLES_CHARS
+
+    parts = []
+    total = 0
+    truncated = 0
+    present = [value for value in values if value is not None]
+
+    for i, value in enumerate(present):
+        text, was_truncated = truncate_value(value, max_value_chars)
+        if parts and total + len(text) > max_total_chars:
+            truncated += len(present) - i
+            break
+        parts.append(text)
+        total += len(text) + 2
+        truncated += was_truncated
+
+    if truncated:
+        PROMPT_VALUE_TRUNCATIONS.inc(truncated)
+    return ", ".join(parts), truncated
+
+class TokenBudgetExceededError(AIServiceError):
+    """Raised when a provider call would exceed the upload or user token budget"""
+
+class UploadTokenBudget:
+    """Token allowance for one upload, drawn from the user's daily allowance as it is used"""
+
+    def __init__(self, service: "TokenBudgetService", user_id: str):
+        self.service = service
+        self.user_id = user_id
+        self.limit = settings.UPLOAD_TOKEN_BUDGET
+        self.used = 0
+
+    async def reserve(self, tokens: int) -> None:
+        """Reserve tokens for a call before it is made"""
+        # Count first so concurrent columns cannot overshoot the limit together
+        self.used += tokens
+        if self.limit and self.used > self.limit:
+            self.used -= tokens
+            TOKEN_BUDGET_REJECTIONS.labels(scope="upload").inc()
+            raise TokenBudgetExceededError(f"Upload token budget of {self.limit} tokens exhausted")
+
+        try:
+            await self.service.reserve_user_tokens(self.user_id, tokens)
+        except TokenBudgetExceededError:
+            self.used -= tokens
+            raise
+
+    async def settle(self, reserved: int, actual: int) -> None:
+        """Replace a reservation with the tokens actually used"""
+        delta = actual - reserved
+        if delta:
+            self.used += delta
+            await self.service.adjust_user_tokens(self.user_id, delta)
+
+class TokenBudgetService:
+    """Per-user daily token budgets shared across processes through the cache, plus usage metrics"""
+
+    def __init__(self, cache_manager: Optional[CacheManager] = None):
+        self.cache_manager = cache_manager or CacheManager()
+        self.user_limit = settings.USER_DAILY_TOKEN_BUDGET
+
+    def for_upload(self, user_id: str) -> UploadTokenBudget:
+        """Start a budget for one upload"""
+        return UploadTokenBudget(self, user_id)
+
+    async def reserve_user_tokens(self, user_id: str, tokens: int) -> None:
+        """Draw tokens from the user's daily budget"""
+        if not self.user_limit:
+            return
+
+        key = self._user_key(user_id)
+        used = await self.cache_manager.increment(key, tokens)
+        if used == tokens:
+            await self.cache_manager.expire(key, 2 * 86400)
+
+        if used > self.user_limit:
+            await self.cache_manager.increment(key, -tokens)
+            TOKEN_BUDGET_REJECTIONS.labels(scope="user").inc()
+            raise TokenBudgetExceededError(f"Daily token budget of {self.user_limit} tokens exhausted")
+
+    async def adjust_user_tokens(self, user_id: str, delta: int) -> None:
+        """Correct the user's usage once actual token counts are known"""
+        if self.user_limit and delta:
+            await self.cache_manager.increment(self._user_key(user_id), delta)
+
+    async def get_user_usage(self, user_id: str) -> int:
+        """Tokens used by the user today"""
+        return int(await self.cache_manager.get(self._user_key(user_id), 0) or 0)
+
+    def record_usage(
+        self,
+        provider: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        batch: bool = False
+    ) -> float:
+        """Record token usage and estimated cost for one call"""
+        AI_TOKENS.labels(provider=provider, model=model, direction="input").inc(input_tokens)
+        AI_TOKENS.labels(provider=provider, model=model, direction="output").inc(output_tokens)
+        cost = estimate_cost(model, input_tokens, output_tokens, batch)
+        if cost:
+            AI_ESTIMATED_COST.labels(provider=provider, model=model).inc(cost)
+        return cost
+
+    def _user_key(self, user_id: str) -> str:
+        return f"token_budget:{user_id}:{datetime.utcnow():%Y%m%d}"
@@ -0,0 +1,61 @@
+"""
+Stable column fingerprints for de-duplicating classification work
+"""
+
+import hashlib
+import json
+import re
+import statistics
+from typing import Any, Dict, List
+
+_SEPARATORS = re.compile(r"[^0-9a-z؀-ۿ]+")
+_REPEATS = re.compile(r"(.)\1+")
+
+def normalize_column_name(column_name: str) -> str:
+    """Lowercase and collapse separators, so 'Email_Address' and 'email address' match"""
+    return _SEPARATORS.sub("_", column_name.lower()).strip("_")
+
+def value_shape(value: str, max_length: int = 24) -> str:
+    """Collapse a value into its character-class shape, e.g. 'SA03 80' -> 'AA99 99'"""
+    shape = []
+    for char in value[:max_length]:
+        if char.isdigit():
+            shape.append("9")
+        elif "؀" <= char <= "ۿ":
+            shape.append("ع")
+        elif char.isalpha():
+            shape.append("A" if char.isupper() else "a")
+        else:
+            shape.append(char)
+    return "".join(shape)
+
+def column_fingerprint(column_name: str, sample_values: List[Any]) -> str:
+    """Hash of the normalized column name and the distinct sample values, independent of order"""
+    samples = sorted({str(value).strip() for value in sample_values if value is not None} - {""})
+    payload = json.dumps([normalize_column_name(column_name), samples], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _length_bucket(lengths: List[int]) -> int:
+    # Power-of-two bucket of the median length (1, 2-3, 4-7, 8-15, ...), stable across samples
+    return int(statistics.median(lengths)).bit_length()
+
+def column_shape_fingerprint(column_name: str, sample_values: List[Any]) -> str:
+    """Hash of the normalized column name, the dominant value shape and its typical length
+
+    Unlike column_fingerprint it ignores the values themselves, so the same
+    column in next month's export maps to the same fingerprint. The collapsed
+    shape alone maps every all-digit column to "9", so the length bucket of the
+    values with that shape is part of the fingerprint too: a 3-digit id and a
+    10-digit phone number no longer share an entry.
+    """
+    lengths: Dict[str, List[int]] = {}
+    for value in sample_values:
+        text = str(value).strip() if value is not None else ""
+        if text:
+            lengths.setdefault(_REPEATS.sub(r"\1", value_shape(text, max_length=64)), []).append(len(text))
+    dominant, length_bucket = "", 0
+    if lengths:
+        dominant = max(lengths.items(), key=lambda item: (len(item[1]), item[0]))[0]
+        length_bucket = _length_bucket(lengths[dominant])
+    payload = json.dumps([normalize_column_name(column_name), dominant, length_bucket], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
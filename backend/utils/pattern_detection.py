@@ -0,0 +1,251 @@
+"""
+Vectorized detection of sensitive value patterns with checksum validation
+"""
+
+import ipaddress
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PATTERN_NAMES = [
+    "saudi_national_id", "iqama_number", "credit_card", "iban",
+    "saudi_phone", "email", "ip_address", "date"
+]
+
+# Longer values are free text, not identifiers; rows are processed in chunks to bound memory
+MAX_VALUE_LENGTH = 96
+CHUNK_SIZE = 65536
+
+_ZERO, _NINE = ord("0"), ord("9")
+_SEPARATORS = [ord(c) for c in " -.()+"]  # characters people put inside numbers, phones and IBANs
+_DATE_SEPARATORS = [ord(c) for c in "-/."]
+_HEX = [ord(c) for c in "0123456789abcdefABCDEF:."]
+
+def _text(value: Any) -> str:
+    # Spreadsheets hand over long numbers as floats: 1012345678.0
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _codepoints(values: np.ndarray, width: int) -> np.ndarray:
+    """(n, width) matrix of the first `width` code points of each string, 0-padded"""
+    fixed = np.ascontiguousarray(values.astype(f"<U{width}"))
+    return np.frombuffer(fixed.tobytes(), dtype=np.uint32).reshape(len(values), width).astype(np.int32)
+
+def _starts_with(chars: np.ndarray, prefix: str) -> np.ndarray:
+    return np.all(chars[:, :len(prefix)] == [ord(c) for c in prefix], axis=1)
+
+def _luhn_valid(digits: np.ndarray) -> np.ndarray:
+    """Luhn check over a (n, length) digit matrix"""
+    length = digits.shape[1]
+    doubled = (length - 1 - np.arange(length)) % 2 == 1  # every second digit from the right
+    weighted = np.where(doubled, digits * 2, digits)
+    weighted = np.where(weighted > 9, weighted - 9, weighted)
+    return weighted.sum(axis=1) % 10 == 0
+
+def _iban_valid(chars: np.ndarray) -> np.ndarray:
+    """ISO 13616 mod-97 check over an upper-case (n, length) IBAN code-point matrix"""
+    chars = np.roll(chars, -4, axis=1)  # country code and check digits move to the end
+    is_digit = chars <= _NINE
+    numbers = np.where(is_digit, chars - _ZERO, chars - ord("A") + 10)
+
+    remainder = np.zeros(len(chars), dtype=np.int64)
+    for column in range(chars.shape[1]):
+        scale = np.where(is_digit[:, column], 10, 100)  # letters expand to two digits
+        remainder = (remainder * scale + numbers[:, column]) % 97
+    return remainder == 1
+
+class PatternDetector:
+    """Share of a column's values matching each sensitive pattern
+
+    Values are turned into one code-point matrix and every check is an array
+    operation over it. Check digits (Saudi ID/Iqama, Luhn, IBAN mod-97) reject
+    look-alike numbers that would otherwise be reported and pushed to an AI provider.
+    """
+
+    def __init__(self, min_match_fraction: Optional[float] = None):
+        self.min_match_fraction = (
+            settings.PATTERN_MIN_MATCH_FRACTION if min_match_fraction is None else min_match_fraction
+        )
+
+    async def detect_patterns(self, column_name: str, values: List[Any]) -> List[str]:
+        """Patterns matched by at least min_match_fraction of the non-empty values, strongest first"""
+        fractions = self.match_fractions(values)
+        detected = sorted(
+            (name for name, fraction in fractions.items() if fraction >= self.min_match_fraction),
+            key=lambda name: -fractions[name]
+        )
+        if detected:
+            logger.debug(f"Patterns in {column_name}: {', '.join(f'{n}={fractions[n]:.2f}' for n in detected)}")
+        return detected
+
+    def match_fractions(self, values: List[Any]) -> Dict[str, float]:
+        """Fraction of non-empty values matching each pattern in PATTERN_NAMES"""
+        strings = np.array([_text(value) for value in values if value is not None], dtype=str)
+        if strings.size:
+            strings = strings[np.char.str_len(strings) > 0]
+        if not strings.size:
+            return {name: 0.0 for name in PATTERN_NAMES}
+
+        counts = dict.fromkeys(PATTERN_NAMES, 0)
+        for start in range(0, len(strings), CHUNK_SIZE):
+            for name, mask in self.match_masks(strings[start:start + CHUNK_SIZE]).items():
+                counts[name] += int(mask.sum())
+        return {name: count / len(strings) for name, count in counts.items()}
+
+    def match_masks(self, strings: np.ndarray) -> Dict[str, np.ndarray]:
+        """Boolean match mask per pattern for an array of non-empty strings"""
+        lengths = np.char.str_len(strings)
+        width = int(min(max(16, lengths.max(initial=0)), MAX_VALUE_LENGTH))
+        chars = _codepoints(strings, width)
+        fits = lengths <= width
+
+        compact, compact_lengths = self._compact(chars)
+        numeric = fits & (compact_lengths > 0) & np.all(
+            ((compact >= _ZERO) & (compact <= _NINE)) | (compact == 0), axis=1
+        )
+
+        national_id, iqama = self._saudi_ids(compact, compact_lengths, numeric)
+        return {
+            "saudi_national_id": national_id,
+            "iqama_number": iqama,
+            "credit_card": self._cards(compact, compact_lengths, numeric),
+            "iban": self._ibans(compact, compact_lengths, fits),
+            "saudi_phone": self._saudi_phones(compact, compact_lengths, numeric),
+            "email": self._emails(chars, lengths, fits),
+            "ip_address": self._ip_addresses(strings, chars, lengths),
+            "date": self._dates(chars, lengths),
+        }
+
+    def _compact(self, chars: np.ndarray):
+        """Code points with separators removed and the rest shifted left, plus new lengths"""
+        keep = (chars != 0) & ~np.isin(chars, _SEPARATORS)
+        rows, cols = np.nonzero(keep)
+        positions = np.cumsum(keep, axis=1) - 1
+        compact = np.zeros_like(chars)
+        compact[rows, positions[rows, cols]] = chars[rows, cols]
+        return compact, keep.sum(axis=1)
+
+    def _saudi_ids(self, compact: np.ndarray, lengths: np.ndarray, numeric: np.ndarray):
+        # 10 digits, 1 for citizens and 2 for residents, Luhn check digit
+        national_id = np.zeros(len(compact), dtype=bool)
+        iqama = np.zeros(len(compact), dtype=bool)
+        rows = np.flatnonzero(numeric & (lengths == 10))
+        if rows.size:
+            digits = compact[rows, :10] - _ZERO
+            valid = _luhn_valid(digits)
+            national_id[rows] = valid & (digits[:, 0] == 1)
+            iqama[rows] = valid & (digits[:, 0] == 2)
+        return national_id, iqama
+
+    def _cards(self, compact: np.ndarray, lengths: np.ndarray, numeric: np.ndarray) -> np.ndarray:
+        # 13-19 digits with a card network prefix (2-6) and a Luhn check digit
+        matched = np.zeros(len(compact), dtype=bool)
+        candidates = (
+            numeric & (lengths >= 13) & (lengths <= 19)
+            & (compact[:, 0] >= ord("2")) & (compact[:, 0] <= ord("6"))
+        )
+        for length in np.unique(lengths[candidates]):
+            rows = np.flatnonzero(candidates & (lengths == length))
+            matched[rows] = _luhn_valid(compact[rows, :length] - _ZERO)
+        return matched
+
+    def _ibans(self, compact: np.ndarray, lengths: np.ndarray, fits: np.ndarray) -> np.ndarray:
+        # Country code, two check digits, then up to 30 alphanumerics
+        matched = np.zeros(len(compact), dtype=bool)
+        upper = np.where((compact >= ord("a")) & (compact <= ord("z")), compact - 32, compact)
+        letter = (upper >= ord("A")) & (upper <= ord("Z"))
+        digit = (upper >= _ZERO) & (upper <= _NINE)
+        candidates = (
+            fits & (lengths >= 15) & (lengths <= 34)
+            & letter[:, 0] & letter[:, 1] & digit[:, 2] & digit[:, 3]
+            & np.all(letter | digit | (upper == 0), axis=1)
+        )
+        for length in np.unique(lengths[candidates]):
+            rows = np.flatnonzero(candidates & (lengths == length))
+            matched[rows] = _iban_valid(upper[rows, :length])
+        return matched
+
+    def _saudi_phones(self, compact: np.ndarray, lengths: np.ndarray, numeric: np.ndarray) -> np.ndarray:
+        # Mobiles 05XXXXXXXX and landlines 01[1-7]XXXXXXX, with 966 or 00966 in place of the 0
+        prefix_length = np.select(
+            [_starts_with(compact, "00966"), _starts_with(compact, "966"), _starts_with(compact, "0")],
+            [5, 3, 1],
+            default=0
+        )
+        rows = np.flatnonzero(numeric & (prefix_length > 0) & (lengths - prefix_length == 9))
+        matched = np.zeros(len(compact), dtype=bool)
+        if rows.size:
+            first = compact[rows, prefix_length[rows]]
+            second = compact[rows, prefix_length[rows] + 1]
+            mobile = first == ord("5")
+            landline = (first == ord("1")) & (second >= ord("1")) & (second <= ord("7"))
+            matched[rows] = mobile | landline
+        return matched
+
+    def _emails(self, chars: np.ndarray, lengths: np.ndarray, fits: np.ndarray) -> np.ndarray:
+        at = chars == ord("@")
+        at_position = np.argmax(at, axis=1)
+        columns = np.arange(chars.shape[1])
+        last = chars[np.arange(len(chars)), np.minimum(lengths, chars.shape[1]) - 1]
+        return (
+            fits
+            & (at.sum(axis=1) == 1)
+            & (at_position > 0)
+            & np.any((chars == ord(".")) & (columns > at_position[:, None] + 1), axis=1)
+            & (last != ord("."))
+            & ~np.any(chars == ord(" "), axis=1)
+        )
+
+    def _ip_addresses(self, strings: np.ndarray, chars: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        # Shape filter over the matrix, exact parsing only for the candidates
+        dots = (chars == ord(".")).sum(axis=1)
+        digits_and_dots = np.all(((chars >= _ZERO) & (chars <= _NINE)) | (chars == ord(".")) | (chars == 0), axis=1)
+        ipv4 = (dots == 3) & digits_and_dots & (lengths <= 15)
+        ipv6 = ((chars == ord(":")).sum(axis=1) >= 2) & np.all(np.isin(chars, _HEX) | (chars == 0), axis=1) & (lengths <= 45)
+
+        matched = np.zeros(len(strings), dtype=bool)
+        for row in np.flatnonzero(ipv4 | ipv6):
+            try:
+                ipaddress.ip_address(str(strings[row]))
+                matched[row] = True
+            except ValueError:
+                pass
+        return matched
+
+    def _dates(self, chars: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        # YYYY-MM-DD (Gregorian or Hijri) or DD/MM/YYYY, optionally followed by a time
+        chars = chars[:, :11]
+        digits = chars - _ZERO
+        is_digit = (digits >= 0) & (digits <= 9)
+        separator = np.isin(chars, _DATE_SEPARATORS)
+        terminated = (lengths == 10) | ((lengths > 10) & np.isin(chars[:, 10], [ord(" "), ord("T")]))
+
+        def number(start: int, width: int) -> np.ndarray:
+            value = np.zeros(len(chars), dtype=np.int32)
+            for offset in range(width):
+                value = value * 10 + digits[:, start + offset]
+            return value
+
+        def valid(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+            return (
+                (((year >= 1900) & (year <= 2100)) | ((year >= 1300) & (year <= 1500)))
+                & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+            )
+
+        year_first = (
+            np.all(is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9]], axis=1)
+            & separator[:, 4] & (chars[:, 4] == chars[:, 7])
+            & valid(number(0, 4), number(5, 2), number(8, 2))
+        )
+        day_first = (
+            np.all(is_digit[:, [0, 1, 3, 4, 6, 7, 8, 9]], axis=1)
+            & separator[:, 2] & (chars[:, 2] == chars[:, 5])
+            & valid(number(6, 4), number(3, 2), number(0, 2))
+        )
+        return terminated & (year_first | day_first)
@@ -0,0 +1,496 @@
+"""
+Mergeable column sketches for full-file statistics at constant memory
+"""
+
+import base64
+import logging
+import os
+import zlib
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from core.config import settings
+from utils.text_processing import ColumnValues, to_arrow
+
+logger = logging.getLogger(__name__)
+
+SKETCH_VERSION = 1
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+# Heavy-hitter candidates kept per top-k slot; more candidates survive skew between chunks
+CANDIDATE_FACTOR = 3
+MAX_VALUE_LENGTH = 100
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+_MASK_32 = np.uint64(0xFFFFFFFF)
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(np.ascontiguousarray(array).tobytes())).decode("ascii")
+
+def _decode(data: str, dtype) -> np.ndarray:
+    return np.frombuffer(zlib.decompress(base64.b64decode(data)), dtype=dtype).copy()
+
+def _mix64(hashes: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads FNV's weak low bits over the whole word"""
+    hashes = (hashes ^ (hashes >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    hashes = (hashes ^ (hashes >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return hashes ^ (hashes >> np.uint64(31))
+
+def hash_strings(text: pa.Array) -> np.ndarray:
+    """64-bit hash of each value of a string array, stable across processes and machines
+
+    FNV-1a over the UTF-8 bytes, read straight from the Arrow buffers. Rows are
+    ordered by length so each byte position only touches the rows still that long.
+    """
+    if isinstance(text, pa.ChunkedArray):
+        text = pa.concat_arrays(text.chunks) if text.num_chunks else pa.array([], pa.string())
+    if pa.types.is_large_string(text.type):
+        text = text.cast(pa.string())
+    if not len(text):
+        return np.empty(0, dtype=np.uint64)
+
+    _, offsets, data = text.buffers()
+    bounds = np.frombuffer(offsets, dtype=np.int32)[text.offset:text.offset + len(text) + 1].astype(np.int64)
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.empty(0, dtype=np.uint8)
+    starts, lengths = bounds[:-1], np.diff(bounds)
+
+    order = np.argsort(-lengths, kind="stable")
+    starts, lengths = starts[order], lengths[order]
+    hashes = np.full(len(text), _FNV_OFFSET, dtype=np.uint64)
+    active = len(text)
+    for position in range(int(lengths[0])):
+        while lengths[active - 1] <= position:
+            active -= 1
+        hashes[:active] = (hashes[:active] ^ data[starts[:active] + position]) * _FNV_PRIME
+
+    hashes = _mix64(hashes ^ lengths.astype(np.uint64))
+    unordered = np.empty_like(hashes)
+    unordered[order] = hashes
+    return unordered
+
+class HyperLogLog:
+    """Distinct count estimate; relative error about 1.04 / sqrt(2 ** precision)"""
+
+    def __init__(self, precision: Optional[int] = None):
+        self.precision = precision or settings.SKETCH_HLL_PRECISION
+        if not 11 <= self.precision <= 18:
+            # Below 11 the rank bits no longer fit a float64 mantissa exactly
+            raise ValueError("HyperLogLog precision must be between 11 and 18")
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray) -> None:
+        if not hashes.size:
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        rank = np.full(hashes.size, bits + 1, dtype=np.uint8)  # rest == 0
+        nonzero = rest > 0
+        rank[nonzero] = bits - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog precision {other.precision} into {self.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": _encode(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(data["precision"])
+        sketch.registers = _decode(data["registers"], np.uint8)
+        return sketch
+
+class CountMinSketch:
+    """Frequency estimates with a bounded set of heavy-hitter candidates for top-k
+
+    Estimates never undercount; they overcount by at most e / width of the total
+    with probability 1 - e ** -depth.
+    """
+
+    def __init__(self, width: Optional[int] = None, depth: Optional[int] = None, top_k: Optional[int] = None):
+        self.width = width or settings.SKETCH_CMS_WIDTH
+        self.depth = depth or settings.SKETCH_CMS_DEPTH
+        self.top_k = top_k or settings.SKETCH_TOP_K
+        self.table = np.zeros((self.depth, self.width), dtype=np.uint32)
+        self.candidates: Dict[int, str] = {}
+
+    def _indexes(self, hashes: np.ndarray) -> List[np.ndarray]:
+        # Row i probes h1 + i * h2 (Kirsch-Mitzenmacher), one hash for all rows
+        h1 = hashes & _MASK_32
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        width = np.uint64(self.width)
+        return [((h1 + np.uint64(row) * h2) % width).astype(np.intp) for row in range(self.depth)]
+
+    def update(self, hashes: np.ndarray, values: pa.Array) -> None:
+        if not hashes.size:
+            return
+        unique, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+        for row, index in enumerate(self._indexes(unique)):
+            self.table[row] += np.bincount(index, weights=counts, minlength=self.width).astype(np.uint32)
+
+        pool = self.top_k * CANDIDATE_FACTOR
+        for position in np.argsort(-counts, kind="stable")[:pool]:
+            key = int(unique[position])
+            if key not in self.candidates:
+                self.candidates[key] = str(values[int(first[position])].as_py())[:MAX_VALUE_LENGTH]
+        self._prune()
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if other.table.shape != self.table.shape:
+            raise ValueError(f"Cannot merge count-min {other.table.shape} into {self.table.shape}")
+        self.table += other.table
+        for key, value in other.candidates.items():
+            self.candidates.setdefault(key, value)
+        self._prune()
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        if not hashes.size:
+            return np.empty(0, dtype=np.uint32)
+        return np.min([self.table[row, index] for row, index in enumerate(self._indexes(hashes))], axis=0)
+
+    def _ranked(self):
+        keys = np.fromiter(self.candidates, dtype=np.uint64, count=len(self.candidates))
+        counts = self.estimate(keys)
+        order = np.argsort(-counts.astype(np.int64), kind="stable")
+        return keys[order], counts[order]
+
+    def _prune(self) -> None:
+        pool = self.top_k * CANDIDATE_FACTOR
+        if len(self.candidates) <= pool:
+            return
+        keys, _ = self._ranked()
+        self.candidates = {int(key): self.candidates[int(key)] for key in keys[:pool]}
+
+    def top(self) -> List[Dict[str, Any]]:
+        """Most frequent values with their estimated counts"""
+        if not self.candidates:
+            return []
+        keys, counts = self._ranked()
+        return [
+            {"value": self.candidates[int(key)], "count": int(count)}
+            for key, count in zip(keys[:self.top_k], counts[:self.top_k])
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "top_k": self.top_k,
+            "table": _encode(self.table),
+            # uint64 keys do not survive JSON numbers
+            "candidates": [[str(key), value] for key, value in self.candidates.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(data["width"], data["depth"], data["top_k"])
+        sketch.table = _decode(data["table"], np.uint32).reshape(sketch.depth, sketch.width)
+        sketch.candidates = {int(key): value for key, value in data["candidates"]}
+        return sketch
+
+class TDigest:
+    """Quantile estimates, most accurate in the tails
+
+    Values are sorted into centroids whose size is bounded by the k1 scale
+    function; merging concatenates centroids and compresses again.
+    """
+
+    def __init__(self, compression: Optional[int] = None):
+        self.compression = compression or settings.SKETCH_TDIGEST_COMPRESSION
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return int(self.weights.sum())
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sum += float(values.sum())
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(values.size)]))
+
+    def merge(self, other: "TDigest") -> None:
+        if not other.weights.size:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        quantiles = (cumulative - weights / 2) / cumulative[-1]
+        # Every centroid covers at most one unit of k = compression / 2pi * asin(2q - 1)
+        bins = np.floor(self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * quantiles - 1, -1, 1)))
+        starts = np.flatnonzero(np.concatenate([[True], bins[1:] != bins[:-1]]))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.weights.size:
+            return None
+        total = self.weights.sum()
+        positions = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(
+            q * total,
+            np.concatenate([[0.0], positions, [total]]),
+            np.concatenate([[self.min], self.means, [self.max]])
+        ))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "means": _encode(self.means),
+            "weights": _encode(self.weights),
+            "min": self.min if self.weights.size else None,
+            "max": self.max if self.weights.size else None,
+            "sum": self.sum,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        sketch = cls(data["compression"])
+        sketch.means = _decode(data["means"], np.float64)
+        sketch.weights = _decode(data["weights"], np.float64)
+        if sketch.weights.size:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.sum = data["sum"]
+        return sketch
+
+class ColumnSketch:
+    """Row and null counts, distinct count, frequent values and numeric quantiles of one column
+
+    Values are compared as trimmed text, so a value hashes the same whichever
+    reader or worker produced the chunk. The t-digest is dropped as soon as a
+    chunk holds a non-numeric value.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.nulls = 0
+        self.distinct = HyperLogLog()
+        self.frequent = CountMinSketch()
+        self.numeric: Optional[TDigest] = TDigest()
+
+    def update(self, values: ColumnValues) -> None:
+        array = to_arrow(values)
+        if isinstance(array, pa.ChunkedArray):
+            array = pa.concat_arrays(array.chunks) if array.num_chunks else pa.array([], pa.string())
+        self.rows += len(array)
+
+        if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+            text = pc.utf8_trim_whitespace(array)
+            text = pc.filter(text, pc.not_equal(text, ""))
+        else:
+            text = pc.cast(pc.drop_null(array), pa.string())
+        self.nulls += len(array) - len(text)
+        if not len(text):
+            return
+
+        hashes = hash_strings(text)
+        self.distinct.update(hashes)
+        self.frequent.update(hashes, text)
+
+        if self.numeric is not None:
+            numeric = self._numeric(array, text)
+            if numeric is None:
+                self.numeric = None
+            else:
+                self.numeric.update(numeric)
+
+    def _numeric(self, array: pa.Array, text: pa.Array) -> Optional[np.ndarray]:
+        value_type = array.type
+        if pa.types.is_integer(value_type) or pa.types.is_floating(value_type) or pa.types.is_decimal(value_type):
+            return pc.cast(pc.drop_null(array), pa.float64()).to_numpy(zero_copy_only=False)
+        if not pa.types.is_string(text.type):
+            return None  # dates, timestamps, booleans
+        try:
+            return pc.cast(text, pa.float64()).to_numpy(zero_copy_only=False)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            return None
+
+    def merge(self, other: "ColumnSketch") -> None:
+        self.rows += other.rows
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        if self.numeric is not None and other.numeric is not None:
+            self.numeric.merge(other.numeric)
+        else:
+            self.numeric = None
+
+    def summary(self, include_values: bool = True) -> Dict[str, Any]:
+        """Readable statistics; without values, frequent values are reported by count only
+
+        Numeric statistics are values too (IDs, phone and card numbers parse as
+        numbers), so without values only the count of numeric values is reported.
+        """
+        non_null = self.rows - self.nulls
+        distinct = min(self.distinct.estimate(), non_null)
+        top = self.frequent.top()
+        summary: Dict[str, Any] = {
+            "rows": self.rows,
+            "null_ratio": round(self.nulls / self.rows, 4) if self.rows else 1.0,
+            "distinct": distinct,
+            "distinct_ratio": round(distinct / non_null, 4) if non_null else 0.0,
+            "top_share": round(top[0]["count"] / non_null, 4) if top and non_null else 0.0,
+            "top_counts": [entry["count"] for entry in top],
+        }
+        if include_values:
+            summary["top_values"] = top
+        if self.numeric is not None and self.numeric.count:
+            summary["numeric"] = {"count": self.numeric.count}
+            if include_values:
+                summary["numeric"].update({
+                    "min": self.numeric.min,
+                    "max": self.numeric.max,
+                    "mean": round(self.numeric.sum / self.numeric.count, 4),
+                    "quantiles": {f"p{round(q * 100):02d}": round(self.numeric.quantile(q), 4) for q in QUANTILES},
+                })
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "hll": self.distinct.to_dict(),
+            "cms": self.frequent.to_dict(),
+            "tdigest": self.numeric.to_dict() if self.numeric is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColumnSketch":
+        sketch = cls()
+        sketch.rows, sketch.nulls = data["rows"], data["nulls"]
+        sketch.distinct = HyperLogLog.from_dict(data["hll"])
+        sketch.frequent = CountMinSketch.from_dict(data["cms"])
+        sketch.numeric = TDigest.from_dict(data["tdigest"]) if data["tdigest"] else None
+        return sketch
+
+TableChunk = Union[pa.Table, pa.RecordBatch, Mapping[str, ColumnValues]]
+
+class TableSketch:
+    """Column sketches of a whole table, updated chunk by chunk
+
+    Sketches of the same file built by different workers (row groups, byte
+    ranges) merge into the sketch of the whole file.
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, ColumnSketch] = {}
+
+    def update(self, chunk: TableChunk) -> None:
+        if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+            columns = zip(chunk.schema.names, chunk.columns)
+        else:
+            columns = chunk.items()
+        for name, values in columns:
+            self.columns.setdefault(str(name), ColumnSketch()).update(values)
+
+    def merge(self, other: "TableSketch") -> None:
+        for name, sketch in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(sketch)
+            else:
+                self.columns[name] = sketch
+
+    def summary(self, include_values: bool = True) -> Dict[str, Dict[str, Any]]:
+        return {name: sketch.summary(include_values) for name, sketch in self.columns.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": SKETCH_VERSION,
+            "columns": {name: sketch.to_dict() for name, sketch in self.columns.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TableSketch":
+        if data.get("version") != SKETCH_VERSION:
+            raise ValueError(f"Unsupported sketch version {data.get('version')}")
+        sketch = cls()
+        sketch.columns = {name: ColumnSketch.from_dict(column) for name, column in data["columns"].items()}
+        return sketch
+
+def _csv_batches(file_path: str, chunk_rows: int, delimiter: str):
+    import pyarrow.csv as pv
+
+    # Every column is read as text: a type inferred from the first block can fail further down
+    parse_options = pv.ParseOptions(delimiter=delimiter)
+    with pv.open_csv(file_path, parse_options=parse_options) as reader:
+        names = reader.schema.names
+    convert_options = pv.ConvertOptions(column_types={name: pa.string() for name in names})
+    read_options = pv.ReadOptions(block_size=max(1 << 20, chunk_rows * 64))
+    with pv.open_csv(
+        file_path, read_options=read_options, parse_options=parse_options, convert_options=convert_options
+    ) as reader:
+        yield from reader
+
+def _parquet_batches(file_path: str, chunk_rows: int):
+    import pyarrow.parquet as pq
+
+    yield from pq.ParquetFile(file_path).iter_batches(batch_size=chunk_rows)
+
+def _xlsx_batches(file_path: str, chunk_rows: int):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [str(name) if name is not None else f"column_{i + 1}" for i, name in enumerate(header)]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield {name: [r[i] if i < len(r) else None for r in chunk] for i, name in enumerate(names)}
+                chunk = []
+        if chunk:
+            yield {name: [r[i] if i < len(r) else None for r in chunk] for i, name in enumerate(names)}
+    finally:
+        workbook.close()
+
+def sketch_file(file_path: str, chunk_rows: Optional[int] = None) -> Optional[TableSketch]:
+    """Stream a CSV, TSV, Parquet or XLSX file through column sketches; None for other formats"""
+    chunk_rows = chunk_rows or settings.SKETCH_CHUNK_ROWS
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".csv", ".txt"):
+        batches = _csv_batches(file_path, chunk_rows, ",")
+    elif extension == ".tsv":
+        batches = _csv_batches(file_path, chunk_rows, "\t")
+    elif extension == ".parquet":
+        batches = _parquet_batches(file_path, chunk_rows)
+    elif extension == ".xlsx":
+        batches = _xlsx_batches(file_path, chunk_rows)
+    else:
+        return None
+
+    sketch = TableSketch()
+    for batch in batches:
+        sketch.update(batch)
+    return sketch
@@ -0,0 +1,223 @@
+"""
+Columnar profiling of column values for classification prompts and risk scoring
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+# String columns are typed by the share of values matching each pattern, in order
+TYPE_PATTERNS = [
+    ("integer", r"^[+-]?\d+$"),
+    ("float", r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$"),
+    ("datetime", r"^\d{4}-\d{1,2}-\d{1,2}[ T]\d{1,2}:\d{2}"),
+    ("date", r"^(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{4})$"),
+]
+BOOLEAN_VALUES = ["true", "false", "yes", "no", "y", "n", "t", "f"]
+TYPE_MIN_CONFORMITY = 0.95
+# Types are first tried on an evenly spaced probe; only plausible ones scan the full column
+TYPE_PROBE_SIZE = 1024
+
+# Character classes by UTF-8 byte: ASCII classes, and lead bytes 0xD8-0xDB for U+0600-U+06FF
+CHARACTER_CLASS_BYTES = {
+    "digit": list(range(0x30, 0x3A)),
+    "latin": list(range(0x41, 0x5B)) + list(range(0x61, 0x7B)),
+    "arabic": list(range(0xD8, 0xDC)),
+    "whitespace": [0x09, 0x0A, 0x0B, 0x0C, 0x0D, 0x20],
+}
+UTF8_CONTINUATION_BYTES = slice(0x80, 0xC0)
+
+# Length histogram bucket lower bounds: 0, 1, 2-3, 4-7, ..., 256+
+LENGTH_BUCKETS = np.array([1, 2, 4, 8, 16, 32, 64, 128, 256])
+LENGTH_LABELS = ["0", "1", "2-3", "4-7", "8-15", "16-31", "32-63", "64-127", "128-255", "256+"]
+
+# Low-cardinality string columns with enough rows are reported as categorical
+CATEGORICAL_MIN_ROWS = 50
+CATEGORICAL_MAX_DISTINCT_RATIO = 0.1
+TEXT_MIN_MEAN_LENGTH = 40
+
+ColumnValues = Union[pa.Array, pa.ChunkedArray, np.ndarray, list]
+
+def to_arrow(values: ColumnValues) -> Union[pa.Array, pa.ChunkedArray]:
+    """Arrow array for column values; numeric NumPy buffers are wrapped without copying
+
+    NaN is a missing value, as in pandas and the CSV reader, so it becomes null.
+    """
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed Python types, e.g. ints and strings from a spreadsheet column
+        return pa.array([None if _is_missing(value) else str(value) for value in values], pa.string())
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and value != value)
+
+def profile_column(values: ColumnValues) -> Dict[str, Any]:
+    """Type, null ratio, cardinality, length and character-class histograms and numeric range"""
+    array = to_arrow(values)
+    count = len(array)
+
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        trimmed = pc.utf8_trim_whitespace(array)
+        valid = pc.filter(trimmed, pc.not_equal(trimmed, ""))  # drops nulls and blanks
+        text = valid
+    else:
+        valid = pc.drop_null(array)
+        text = pc.cast(valid, pa.string()) if len(valid) else pa.array([], pa.string())
+
+    non_null = len(valid)
+    statistics: Dict[str, Any] = {
+        "count": count,
+        "null_ratio": round(1 - non_null / count, 4) if count else 1.0,
+        "distinct": pc.count_distinct(valid).as_py() if non_null else 0,
+    }
+    statistics["distinct_ratio"] = round(statistics["distinct"] / non_null, 4) if non_null else 0.0
+
+    profile: Dict[str, Any] = {
+        "data_type": "empty",
+        "statistics": statistics,
+        "char_classes": {},
+        "length_histogram": {},
+        "type_conformity": 1.0,
+        "quality_score": 0.0,
+    }
+    if not non_null:
+        return profile
+
+    # Lengths and character classes
+    lengths = pc.utf8_length(text).to_numpy(zero_copy_only=False)
+    statistics.update({
+        "min_length": int(lengths.min()),
+        "max_length": int(lengths.max()),
+        "mean_length": round(float(lengths.mean()), 2),
+    })
+    buckets = np.bincount(np.searchsorted(LENGTH_BUCKETS, lengths, side="right"), minlength=len(LENGTH_LABELS))
+    profile["length_histogram"] = {label: int(n) for label, n in zip(LENGTH_LABELS, buckets) if n}
+
+    # One histogram over the UTF-8 data buffer instead of a regex pass per class
+    byte_counts = np.bincount(_utf8_bytes(text), minlength=256)
+    total_chars = int(byte_counts.sum() - byte_counts[UTF8_CONTINUATION_BYTES].sum()) or 1
+    char_classes = {
+        name: int(byte_counts[codes].sum()) / total_chars for name, codes in CHARACTER_CLASS_BYTES.items()
+    }
+    char_classes["other"] = max(0.0, 1 - sum(char_classes.values()))
+    profile["char_classes"] = {name: round(share, 4) for name, share in char_classes.items()}
+
+    # Type inference and numeric range
+    data_type, conformity, numeric = _infer_type(valid, text, non_null, statistics)
+    if numeric is not None and len(numeric):
+        min_max = pc.min_max(numeric).as_py()
+        statistics["numeric"] = {
+            "min": min_max["min"],
+            "max": min_max["max"],
+            "mean": round(pc.mean(numeric).as_py(), 4),
+            "std": round(pc.stddev(numeric).as_py() or 0.0, 4),
+        }
+
+    profile["data_type"] = data_type
+    profile["type_conformity"] = round(conformity, 4)
+    profile["quality_score"] = round((1 - statistics["null_ratio"]) * conformity, 4)
+    return profile
+
+def _utf8_bytes(text: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    """The UTF-8 bytes of all values, read straight from the Arrow data buffers"""
+    chunks = text.chunks if isinstance(text, pa.ChunkedArray) else [text]
+    parts = []
+    for chunk in chunks:
+        _, offsets, data = chunk.buffers()
+        if data is None or not len(chunk):
+            continue
+        offset_type = np.int64 if pa.types.is_large_string(chunk.type) else np.int32
+        bounds = np.frombuffer(offsets, dtype=offset_type)[chunk.offset:chunk.offset + len(chunk) + 1]
+        parts.append(np.frombuffer(data, dtype=np.uint8)[bounds[0]:bounds[-1]])
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint8)
+
+def _conformity(text, pattern: str) -> float:
+    return pc.sum(pc.match_substring_regex(text, pattern)).as_py() / len(text)
+
+def _infer_type(valid, text, non_null: int, statistics: Dict[str, Any]):
+    """(data_type, share of values conforming to it, numeric values or None)"""
+    value_type = valid.type
+    if pa.types.is_boolean(value_type):
+        return "boolean", 1.0, pc.cast(valid, pa.int8())
+    if pa.types.is_integer(value_type):
+        return "integer", 1.0, valid
+    if pa.types.is_floating(value_type) or pa.types.is_decimal(value_type):
+        return "float", 1.0, pc.cast(valid, pa.float64())
+    if pa.types.is_timestamp(value_type):
+        return "datetime", 1.0, None
+    if pa.types.is_date(value_type):
+        return "date", 1.0, None
+
+    probe = text
+    if non_null > TYPE_PROBE_SIZE:
+        probe = text.take(pa.array(np.linspace(0, non_null - 1, TYPE_PROBE_SIZE).astype(np.int64)))
+    # A little slack so a probe that just misses does not reject a conforming column
+    plausible = TYPE_MIN_CONFORMITY - 0.05
+
+    for data_type, pattern in TYPE_PATTERNS:
+        if probe is not text and _conformity(probe, pattern) < plausible:
+            continue
+        matches = pc.match_substring_regex(text, pattern)
+        conformity = pc.sum(matches).as_py() / non_null
+        if conformity >= TYPE_MIN_CONFORMITY:
+            numeric = None
+            if data_type in ("integer", "float"):
+                numeric = pc.cast(pc.filter(text, matches), pa.float64())
+            return data_type, conformity, numeric
+
+    booleans = pa.array(BOOLEAN_VALUES)
+    if pc.sum(pc.is_in(pc.utf8_lower(probe), value_set=booleans)).as_py() / len(probe) >= plausible:
+        conformity = pc.sum(pc.is_in(pc.utf8_lower(text), value_set=booleans)).as_py() / non_null
+        if conformity >= TYPE_MIN_CONFORMITY:
+            return "boolean", conformity, None
+    if non_null >= CATEGORICAL_MIN_ROWS and statistics["distinct_ratio"] <= CATEGORICAL_MAX_DISTINCT_RATIO:
+        return "categorical", 1.0, None
+    if statistics["mean_length"] >= TEXT_MIN_MEAN_LENGTH:
+        return "text", 1.0, None
+    return "string", 1.0, None
+
+class TextProcessor:
+    """Column profiles for prompts and risk scoring
+
+    Profiling runs Arrow compute kernels over each column's buffers; whole tables
+    are profiled column-parallel, since the kernels release the GIL.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+
+    async def process_column_data(
+        self,
+        column_name: str,
+        values: ColumnValues,
+        language: str = "en"
+    ) -> Dict[str, Any]:
+        """Profile one column's values"""
+        try:
+            return profile_column(values)
+        except Exception as e:
+            logger.warning(f"Profiling {column_name} failed: {str(e)}")
+            return {"data_type": None, "statistics": {}, "quality_score": 1.0}
+
+    def profile_table(self, table: Union[pa.Table, Mapping[str, ColumnValues]]) -> Dict[str, Dict[str, Any]]:
+        """Profile every column of an Arrow table, DataFrame or column mapping"""
+        if not isinstance(table, (pa.Table, Mapping)):
+            table = pa.Table.from_pandas(table, preserve_index=False)
+        if isinstance(table, pa.Table):
+            columns = {name: table.column(name) for name in table.column_names}
+        else:
+            columns = dict(table)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            profiles = executor.map(profile_column, columns.values())
+            return dict(zip(columns.keys(), profiles))